@@ -1,39 +1,202 @@
-from flask import Flask, request
+import os
+import threading
+from concurrent.futures import TimeoutError
+from flask import Flask, request, jsonify
+from dotenv import load_dotenv
+from twilio.twiml.messaging_response import MessagingResponse
 from .utils.user import User
+from .utils.job_queue import JobQueue, JobWorkerPool
+from .utils.executor import KeyedExecutor
+from .utils.session_store import get_session_store
+from .utils.user_cache import user_cache
+from .utils.scheduler import Scheduler
+from .utils.idle_chat_checker import schedule_idle_checks
+from .utils.transcripts import TranscriptStore, INBOUND, OUTBOUND
+from .model.bot import Outbox
 from .model.conversation import Conversation
+from .model.resources import get_resources
+
+load_dotenv()
 
 app = Flask(__name__) # Initialize Flask application
 
+# When enabled, the webhook only queues the message and returns straight away.
+# Background workers then run the conversation turn.
+ASYNC_WEBHOOK = os.getenv('ASYNC_WEBHOOK', 'false').lower() == 'true'
+CONVERSATION_WORKERS = int(os.getenv('CONVERSATION_WORKERS', 8))
+
+# 'twiml' returns the replies of a turn in the webhook response instead of
+# sending each one through the REST API. A turn that takes longer than
+# TWIML_REPLY_TIMEOUT seconds falls back to REST.
+REPLY_MODE = os.getenv('REPLY_MODE', 'rest').lower()
+TWIML_REPLY_TIMEOUT = float(os.getenv('TWIML_REPLY_TIMEOUT', 10))
+
+# Turns from the same number run one at a time and in order,
+# turns from different numbers run in parallel.
+conversation_executor = KeyedExecutor(num_workers=CONVERSATION_WORKERS)
+
+job_queue = JobQueue(os.getenv('JOB_QUEUE_DB', 'app/data/jobs.db')) if ASYNC_WEBHOOK else None
+worker_pool = None
+
+# Seconds between idle-session sweeps, 0 disables them (e.g. when
+# `python -m app.utils.idle_chat_checker` runs as a separate worker)
+IDLE_CHECK_INTERVAL = float(os.getenv('IDLE_CHECK_INTERVAL', 60))
+scheduler = None
+
+# Every message in and out is appended to the transcript store. Messages
+# older than TRANSCRIPT_RETENTION_DAYS are purged daily, 0 keeps them forever.
+RECORD_TRANSCRIPTS = os.getenv('RECORD_TRANSCRIPTS', 'true').lower() == 'true'
+TRANSCRIPT_RETENTION_DAYS = float(os.getenv('TRANSCRIPT_RETENTION_DAYS', 365))
+transcript_store = None
+
+_started = False
+_startup_lock = threading.Lock()
+
 @app.route('/whatsapp', methods=['POST'])
 def whatsapp_webhook():
+    if not _started:
+        startup()
+
     try:
         # Extract the user's phone number from the request
         user_number = extract_number()
 
-        # Create a User instance with the phone number
-        user = User(user_number)
-
-        # If the user doesn't exist in the database, create a new user
-        if not user.user_exists():
-            user.create_user()
-            print('New User created')
+        if ASYNC_WEBHOOK:
+            payload = {'From': user_number, 'Body': request.form.get('Body', '')}
+            job_queue.enqueue(payload, message_sid=request.form.get('MessageSid'))
+            return "OK", 200
 
-        # Create a Conversation instance, passing in the Bot instance for messaging
-        conv = Conversation(user)
-
-        # Handle the conversation logic
-        conv.handle_conversation()
-        print('Handling conversation')
+        body = request.form.get('Body', '')
+        if REPLY_MODE == 'twiml':
+            return twiml_reply(user_number, body)
 
+        # Wait for our turn behind any message from the same user still being handled
+        future = conversation_executor.submit(user_number, handle_message, user_number, body)
+        future.result()
         return "OK", 200
 
     except Exception as e:
         print(f"Error occurred: {e}")
-        return str(e), 500
+        return "Internal Server Error", 500
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Runtime statistics used to size the worker pools."""
+    stats = {'conversation_executor': conversation_executor.stats()}
+    if job_queue is not None:
+        stats['job_queue'] = {'pending': job_queue.pending_count()}
+    stats['user_cache'] = user_cache.stats()
+    bot = get_resources().bot
+    stats['coalescer'] = bot.coalescer.stats()
+    stats['time_to_first_message'] = bot.first_message_latency.stats()
+    if bot.dispatcher is not None:
+        stats['outbound'] = bot.dispatcher.stats()
+    ai = get_resources().ai
+    if ai.advice_cache is not None:
+        stats['advice_cache'] = ai.advice_cache.stats()
+    if ai.followup_cache is not None:
+        stats['followup_cache'] = ai.followup_cache.stats()
+    if ai.question_store is not None:
+        stats['question_store'] = ai.question_store.stats()
+    if ai.speculation is not None:
+        stats['speculation'] = ai.speculation.stats()
+    if ai.single_flight is not None:
+        stats['single_flight'] = ai.single_flight.stats()
+    stats['llm'] = ai.router.stats()
+    stats['prompts'] = ai.prompt_compiler.stats()
+    if ai.limiter is not None:
+        stats['ai_limiter'] = ai.limiter.stats()
+    return jsonify(stats)
 
 
 def extract_number():
     """Extracts the user's phone number from the incoming request."""
     user_number = request.form.get('From')
     user_number = user_number.split(':')[1]  # Remove the "whatsapp:" prefix
-    return user_number
\ No newline at end of file
+    return user_number
+
+
+def twiml_reply(user_number, body):
+    """Runs the turn and returns its replies as one TwiML response."""
+    outbox = Outbox(user_number, reply_in_response=True)
+    future = conversation_executor.submit(user_number, handle_message, user_number, body, outbox)
+    try:
+        future.result(timeout=TWIML_REPLY_TIMEOUT)
+    except TimeoutError:
+        print(f'Turn for {user_number} is slow, sending its replies over REST')
+    except Exception as e:
+        # Like in REST mode, the replies made before the error still go out
+        print(f"Error occurred in turn for {user_number}: {e}")
+
+    bot = get_resources().bot
+    messages = outbox.release()
+    if messages:
+        bot.record_first_message(outbox)
+    response = MessagingResponse()
+    for message_body in bot.coalescer.coalesce(messages or []):
+        response.message(message_body)
+    return str(response), 200, {'Content-Type': 'text/xml'}
+
+
+def handle_message(user_number, body, outbox=None):
+    """Runs one conversation turn for the given user and message body.
+
+    The replies are collected in `outbox` and sent together when the turn is
+    over, unless the outbox was created to be returned as TwiML.
+    """
+    # Create a User instance with the phone number
+    user = User(user_number)
+
+    # If the user doesn't exist in the database, create a new user
+    if not user.user_exists():
+        user.create_user()
+        print('New User created')
+
+    # Create a Conversation instance, passing in the Bot instance for messaging
+    conv = Conversation(user)
+
+    # Handle the conversation logic
+    stage = user.get_conversation_stage()
+    with conv.bot.collect(outbox or Outbox(user_number)) as outbox:
+        conv.handle_conversation(body)
+    print('Handling conversation')
+
+    if transcript_store is not None:
+        reply_stage = user.get_conversation_stage()
+        transcript_store.append(user_number, [(stage, INBOUND, conv.user_input)] +
+                                [(reply_stage, OUTBOUND, message) for message in outbox.transcript])
+
+
+def process_job(payload):
+    """Job handler used by the background workers."""
+    handle_message(payload['From'], payload['Body'])
+
+
+def startup():
+    """One-time process setup: session store migrations, background workers and the scheduler.
+
+    run.py calls this before serving. Under other WSGI servers the first
+    webhook request runs it.
+    """
+    global _started, worker_pool, scheduler, transcript_store
+    with _startup_lock:
+        if _started:
+            return
+        get_session_store().migrate()
+        if RECORD_TRANSCRIPTS:
+            transcript_store = TranscriptStore(os.getenv('TRANSCRIPTS_DB', 'app/data/transcripts.db'))
+
+        # Start the background job workers if the async webhook mode is enabled
+        if ASYNC_WEBHOOK:
+            worker_pool = JobWorkerPool(job_queue, process_job, conversation_executor)
+            worker_pool.start()
+
+        # Periodic maintenance
+        scheduler = Scheduler()
+        if IDLE_CHECK_INTERVAL > 0:
+            schedule_idle_checks(scheduler, IDLE_CHECK_INTERVAL)
+        if transcript_store is not None and TRANSCRIPT_RETENTION_DAYS > 0:
+            scheduler.call_every(86400, transcript_store.run_retention, TRANSCRIPT_RETENTION_DAYS, first_delay=60)
+        scheduler.start()
+        _started = True
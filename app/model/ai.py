@@ -1,15 +1,55 @@
 import os
 import json
+import time
+import hashlib
 from openai import OpenAI
 from dotenv import load_dotenv
+from app.utils.content import ContentStore
+from app.utils.chunker import SectionChunker
+from app.utils.limiter import INTERACTIVE, PREFETCH, request_priority
+from app.utils.prompt_compiler import PromptCompiler
+from .providers import LLMRouter, OpenAIProvider
 
 load_dotenv() #Loading the environment variables
 
 class AIHandler:
-    def __init__(self) -> None:
-        ai_api_key: str = self.load_openai_api_key()
-        self.client = OpenAI(api_key=ai_api_key)
-        self.prompts = self.load_prompts()
+    def __init__(self, client=None, content=None, advice_cache=None, followup_cache=None, streaming=None,
+                 question_store=None, question_wait=2.0, speculation=None, single_flight=None, router=None,
+                 limiter=None, answer_budget=300) -> None:
+        if router is None:
+            if client is None:
+                ai_api_key: str = self.load_openai_api_key()
+                client = OpenAI(api_key=ai_api_key)
+            # Everything goes to OpenAI unless a router with other providers is given
+            router = LLMRouter({'openai': OpenAIProvider(client)}, limiter=limiter)
+        self.client = client
+        self.router = router
+        self.content = content or ContentStore()
+        # System prompts built once per content version, user answers cut to `answer_budget` tokens
+        self.prompt_compiler = PromptCompiler(self.content, answer_budget)
+        # Serves pre-generated advice when the user didn't add any input, see AdviceCache
+        self.advice_cache = advice_cache
+        # Answers to advice follow-up questions, found again for similar questions, see SemanticCache
+        self.followup_cache = followup_cache
+        # Long answers are streamed and handed over section by section, disabled with AI_STREAMING=false
+        if streaming is None:
+            streaming = os.getenv('AI_STREAMING', 'true').lower() == 'true'
+        self.streaming = streaming
+        # Interview questions adapted to a role ahead of time, see AdaptedQuestionStore
+        self.question_store = question_store
+        # Seconds to wait for an adapted question that isn't ready before asking the original
+        self.question_wait = question_wait
+        # Model calls started ahead of the user's next reply, see Speculation
+        self.speculation = speculation
+        # Identical requests made at the same time share one call, see SingleFlight
+        self.single_flight = single_flight
+        # Bounds the requests in flight and their tokens per minute, see AdaptiveLimiter
+        self.limiter = limiter
+
+    @property
+    def prompts(self):
+        # Always the latest snapshot, so edited prompts apply without a restart
+        return self.content.snapshot().prompts
 
     def load_openai_api_key(self):
         ai_api_key: str = os.getenv('OPENAI_API_KEY')
@@ -17,108 +57,221 @@ class AIHandler:
             raise ValueError("OpenAI API key not found in environment variables.")
         return ai_api_key
 
-    def load_prompts(self):
-        with open('./app/data/prompts.json', 'r') as f:
-            return json.load(f)
-
-    def generate_response(self, messages, model="gpt-4o-mini", max_tokens=230, temperature=0.7):
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            n=1,
-        )
-        raw_message = response.choices[0].message.content.strip()
-        return raw_message
+    def generate_response(self, messages, model="gpt-4o-mini", max_tokens=230, temperature=0.7, on_section=None,
+                          share=True, task='default'):
+        """Return the model's answer to `messages`.
+
+        `task` names the kind of request, which the router uses to pick a
+        provider (see LLMRouter).
+
+        With `on_section`, the answer is streamed and each complete section
+        (see SectionChunker) is passed to `on_section` as soon as it's
+        ready. The whole answer is still returned at the end.
+
+        Unless `share` is False, callers asking for exactly the same
+        completion at the same time get the answer of a single request.
+        Pass share=False when every caller needs an answer of their own.
+        Streamed answers are never shared.
+        """
+        if on_section is not None:
+            if not self.streaming:
+                raw_message = self.generate_response(messages, model, max_tokens, temperature, task=task)
+                on_section(raw_message)
+                return raw_message
+
+            chunker = SectionChunker()
+            parts = []
+            for text in self.stream_response(messages, model, max_tokens, temperature, task):
+                parts.append(text)
+                for section in chunker.feed(text):
+                    on_section(section)
+            for section in chunker.flush():
+                on_section(section)
+            return ''.join(parts).strip()
+
+        if share and self.single_flight is not None:
+            key = self.request_key(messages, model, max_tokens, temperature)
+            return self.single_flight.do(key, lambda: self.generate_response(
+                messages, model, max_tokens, temperature, share=False, task=task))
+
+        prompt_tokens = self.prompt_compiler.record(task, messages)
+        if self.limiter is None:
+            return self.router.complete(task, messages, model, max_tokens, temperature)
+        with self.limiter.slot(prompt_tokens + max_tokens):
+            return self.router.complete(task, messages, model, max_tokens, temperature)
+
+    @staticmethod
+    def request_key(messages, model, max_tokens, temperature):
+        """Hash of everything that determines a completion."""
+        request = json.dumps([model, messages, max_tokens, temperature], sort_keys=True)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def stream_response(self, messages, model="gpt-4o-mini", max_tokens=230, temperature=0.7, task='default'):
+        """Yield the model's answer in pieces as they're generated."""
+        prompt_tokens = self.prompt_compiler.record(task, messages)
+        if self.limiter is None:
+            yield from self.router.stream(task, messages, model, max_tokens, temperature)
+            return
+        # A stream's duration says more about the answer's length than about load
+        with self.limiter.slot(prompt_tokens + max_tokens, measure_latency=False):
+            yield from self.router.stream(task, messages, model, max_tokens, temperature)
 
     def generate_advice(self, category, user_input=None):
         """
         Generates advice based on the selected category.
         """
-        # Get the appropriate prompt for the category
-        prompt_template = self.prompts["advice_prompts"].get(category, {}).get("prompt", "")
+        # The category's prompt with the formatting instructions, built once per content version
+        prompt = self.prompt_compiler.compiled().advice.get(category)
 
-        if not prompt_template:
+        if prompt is None:
             raise ValueError(f'No prompt template found for category: {category}')
-        
-        # Modify the prompt to include formatting instructions
-        formatting_instructions = (
-            "1. Please provide the advice in clear, concise bullet points suitable for a WhatsApp message. "
-            "2.1 Please use emojis to give advice better in this case, either by using it in bullets or heading."
-            "2.2 Format your output in bullet points and headings."
-            "3. Use whatsapp formatting to ensure the advice looks professional and easy to read." 
-            "4. Give advice in sections." 
-            "5. The advice should be concise and less than 200 words. or 15 lines of content"
-            "6. Avoid using Markdown or HTML formatting. Make the advice engaging and easy to read. Can also add emojis that make it look more professional."
-            "7. The final message will be sent to the user and it should be displayed to just show the infomation rather you acknowledging these prompts"
-        )
 
         # Construct the messages
-        prompt = prompt_template + formatting_instructions
-        messages = [{'role': 'system', 'content': prompt}]
+        messages = [{'role': 'system', 'content': prompt.text}]
 
         # If user input is provided, add it to the messages
         if user_input:
-            messages.append({'role': 'user', 'content': user_input})
+            messages.append({'role': 'user', 'content': self.prompt_compiler.fit(user_input)})
 
         # Generate the advice using the generate_response method
-        advice = self.generate_response(messages, model='gpt-4o-mini', max_tokens=200, temperature=0.7)
-        return advice
-
-    def generate_feedback(self, question, user_response):
-        # Get the feedback prompt template
-        feedback_prompt_template = self.prompts["interview_prompts"]["feedback_prompt"]["prompt"]
-        # Modify the prompt to include formatting instructions
-        formatting_instructions = (
-            "1. Please provide the advice in clear, concise bullet points suitable for a WhatsApp message. "
-            "2.1 Please use emojis to give advice better in this case, either by using it in bullets or heading."
-            "2.2 Format your output in bullet points and headings."
-            "3. Use whatsapp formatting to ensure the advice looks professional and easy to read." 
-            "4. Give advice in sections." 
-            "5. The advice should be concise and less than 200 words."
-            "6. Avoid using Markdown or HTML formatting. Make the advice engaging and easy to read. Can also add emojis that make it look more professional."
-            "7. The final message will be sent to the user and it should be displayed to just show the infomation rather you acknowledging these prompts"
-        )
+        generate = lambda: self.generate_response(messages, model='gpt-4o-mini', max_tokens=200, temperature=0.7,
+                                                  task='advice')
+        if self.advice_cache is None or user_input:
+            return generate()
 
-        feedback_prompt = feedback_prompt_template + formatting_instructions
+        # The same prompt every time, so the answer can come from the cache.
+        # Keyed by the prompt too, an edited prompt starts a new pool.
+        return self.advice_cache.get(f'{category}:{prompt.key}', generate)
+
+    def generate_advice_followup(self, last_advice, user_question, category=None):
+        """Answer a question the user asked about the advice they were given."""
+        if self.followup_cache is not None and category:
+            answer = self.followup_cache.lookup(category, user_question)
+            if answer is not None:
+                return answer
+
+        # Construct the messages
+        messages = [
+            {'role': 'system', 'content': (
+                "You are a helpful assistant that provides advice and answers follow-up questions. "
+                "When answering, provide clear and concise information suitable for a WhatsApp message. "
+                "Use simple formatting and avoid Markdown or HTML."
+            )},
+            {'role': 'assistant', 'content': last_advice},
+            {'role': 'user', 'content': self.prompt_compiler.fit(user_question)}
+        ]
+
+        # Generate the response
+        start = time.perf_counter()
+        response = self.generate_response(messages, model='gpt-4o-mini', max_tokens=500, temperature=0.7,
+                                          task='advice_followup')
+        if self.followup_cache is not None and category:
+            self.followup_cache.store(category, user_question, response, cost=time.perf_counter() - start)
+        return response
+
+    def generate_feedback(self, question, user_response, on_section=None):
+        # The feedback prompt with the formatting instructions, built once per content version
+        feedback_prompt = self.prompt_compiler.compiled().feedback.text
 
         # Construct the messages
         messages = [
             {'role': 'system', 'content': feedback_prompt},
-            {'role': 'user', 'content': f"Question: {question}\nUser Response: {user_response}"}
+            {'role': 'user', 'content': f"Question: {question}\nUser Response: {self.prompt_compiler.fit(user_response)}"}
         ]
 
         # Generate the feedback
-        feedback = self.generate_response(messages, model='gpt-4o-mini', max_tokens=500, temperature=0.7)
+        feedback = self.generate_response(messages, model='gpt-4o-mini', max_tokens=500, temperature=0.7,
+                                          on_section=on_section, task='feedback')
         return feedback
 
+    def adapt_interview_question(self, question, interview_type, role):
+        """Rephrase an interview question for the interview type and role."""
+        prompt = (
+            f"You are a professional interviewer conducting a {interview_type} interview for the role/college program of '{role}'. "
+            f"Please rephrase or adapt the following question to make it more relevant and specific to this context:\n\n"
+            f"Original Question: {question}\n\n"
+            f"Adapted Question:"
+            f"Make sure the length of the adapted question isn't long"
+            f"Only reply with the adapted question and nothing else."
+        )
+        return self.generate_response(messages=[{'role' : 'system', 'content' : prompt}], task='adapt_question')
+
+    def prefetch_adapted_questions(self, interview_type, role, questions, first=None):
+        """Start adapting all the questions for a role that was just chosen.
+
+        `first` is the question about to be asked. It's queued ahead of the
+        others, at the priority of a user's request.
+        """
+        if self.question_store is None:
+            return
+        def adapt(question):
+            # Nobody is waiting for the others yet, so users' requests go first
+            with request_priority(INTERACTIVE if question == first else PREFETCH):
+                return self.adapt_interview_question(question, interview_type, role)
+        if first is not None:
+            questions = [first] + [question for question in questions if question != first]
+        self.question_store.prefetch(interview_type, role, questions, adapt)
+
+    def ready_adapted_questions(self, interview_type, role, questions):
+        """The questions whose adapted version can be asked without waiting."""
+        if self.question_store is None:
+            return []
+        return self.question_store.ready(interview_type, role, questions)
+
+    def get_adapted_question(self, question, interview_type, role):
+        """Return the question adapted to the role, or None if it isn't available in time."""
+        if self.question_store is None:
+            try:
+                return self.adapt_interview_question(question, interview_type, role)
+            except Exception as e:
+                print(f"Error generating adapted question: {e}")
+                return None
+        adapt = lambda question: self.adapt_interview_question(question, interview_type, role)
+        return self.question_store.get_or_adapt(interview_type, role, question, adapt, self.question_wait)
+
+    def speculate(self, owner, name, fn, *args):
+        """Run `fn(*args)` next to the current turn, for `owner`'s next turn to pick up."""
+        if self.speculation is not None:
+            self.speculation.start(owner, name, fn, *args)
+
+    def take_speculative(self, owner, name, timeout=0):
+        """Result of a speculative call, or None if there isn't one (in time)."""
+        if self.speculation is None:
+            return None
+        return self.speculation.take(owner, name, timeout)
+
+    def cancel_speculative(self, owner):
+        """Discard the speculative calls of a user who left the flow they were made for."""
+        if self.speculation is not None:
+            self.speculation.cancel(owner)
+
     def generate_follow_up_question(self, user_response, interview_type, role):
         prompt_template = self.prompts['interview_prompts']['follow_up_prompt']['prompt']
         prompt = prompt_template.format(
-            user_response = user_response,
+            user_response = self.prompt_compiler.fit(user_response),
             interview_type = interview_type,
             role = role    
         )
         
         messages = [{'role': 'system', 'content': prompt}]
-        follow_up_question = self.generate_response(messages)
+        follow_up_question = self.generate_response(messages, task='follow_up_question')
         
         return follow_up_question
 
-    def generate_interview_feedback(self, question, user_response, follow_up_question, follow_up_response, interview_type, role):
+    def generate_interview_feedback(self, question, user_response, follow_up_question, follow_up_response, interview_type, role,
+                                    on_section=None):
         prompt_template = self.prompts['interview_prompts']['feedback_prompt']['prompt']
         prompt = prompt_template.format(
             question = question,
-            user_response = user_response,
+            user_response = self.prompt_compiler.fit(user_response),
             follow_up_question = follow_up_question,
-            follow_up_response = follow_up_response,
+            follow_up_response = self.prompt_compiler.fit(follow_up_response),
             interview_type = interview_type,
             role = role
         )
 
         messages = [{'role':'system', 'content': prompt}]
-        feedback = self.generate_response(messages)
+        feedback = self.generate_response(messages, on_section=on_section, task='interview_feedback')
 
         return feedback
         
@@ -131,5 +284,6 @@ class AIHandler:
         messages = [{'role': 'system', 'content': irrelevant_prompt}]
 
         # Generate the response
-        response = self.generate_response(messages, model='gpt-4o-mini', max_tokens=100, temperature=0.7)
+        response = self.generate_response(messages, model='gpt-4o-mini', max_tokens=100, temperature=0.7,
+                                          task='irrelevant_question')
         return response
\ No newline at end of file
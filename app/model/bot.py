@@ -1,14 +1,102 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
 from twilio.rest import Client
 from flask import request
 from dotenv import load_dotenv
+from app.utils.coalescer import MessageCoalescer
+from app.utils.latency import LatencyWindow
 
 load_dotenv() # Loading the environment
 
+class Outbox:
+    """Replies to one user collected during a conversation turn.
+
+    By default the turn sends them when it's over, so consecutive replies
+    can be coalesced. With `reply_in_response` the webhook returns them as
+    TwiML instead. If the webhook stops waiting before the turn is over
+    (see `release`), the turn sends them after all.
+    """
+
+    def __init__(self, to_number: str, reply_in_response: bool = False):
+        self.to_number = to_number
+        self.reply_in_response = reply_in_response
+        self.messages = []
+        self.transcript = []  # Every message of the turn in order, however it was delivered
+        self.started_at = time.monotonic()
+        self.first_message_at = None  # When the first message was handed over for delivery
+        self._lock = threading.Lock()
+        self._released = False
+        self._closed = False
+
+    @property
+    def time_to_first_message(self):
+        """Seconds from the start of the turn to its first delivered message, or None."""
+        if self.first_message_at is None:
+            return None
+        return self.first_message_at - self.started_at
+
+    def _delivered(self, messages):
+        # Called with the lock held
+        if messages and self.first_message_at is None:
+            self.first_message_at = time.monotonic()
+        return messages
+
+    def add(self, message_body: str) -> bool:
+        """Collect a message. Returns False once the outbox has been released."""
+        with self._lock:
+            if self._released:
+                return False
+            self.messages.append(message_body)
+            return True
+
+    def take(self) -> list:
+        """Return and clear the collected messages."""
+        with self._lock:
+            messages, self.messages = self.messages, []
+            return self._delivered(messages)
+
+    def release(self):
+        """Stop collecting.
+
+        Returns the messages if the turn is already over. Otherwise returns
+        None, and the turn sends what it collected itself.
+        """
+        with self._lock:
+            self._released = True
+            if self._closed:
+                messages, self.messages = self.messages, []
+                return self._delivered(messages)
+            return None
+
+    def close(self) -> list:
+        """Mark the turn as over. Returns the messages the turn still has to send."""
+        with self._lock:
+            self._closed = True
+            if self._released or not self.reply_in_response:
+                messages, self.messages = self.messages, []
+                return self._delivered(messages)
+            return []
+
+    @property
+    def streams(self) -> bool:
+        """Whether messages can go out before the turn is over (not when they're returned as TwiML)."""
+        with self._lock:
+            return self._released or not self.reply_in_response
+
+
 class Bot:
-    def __init__(self):
-        self.twilio_client = self.create_twilio_client()
+    def __init__(self, twilio_client=None, dispatcher=None, coalescer=None):
+        self.twilio_client = twilio_client or self.create_twilio_client()
         self.from_number = self.get_from_number()
+        # When set, messages are queued on the OutboundDispatcher instead of sent inline
+        self.dispatcher = dispatcher
+        # Merges short replies and splits long ones before they're sent
+        self.coalescer = coalescer or MessageCoalescer()
+        self._turn = threading.local()  # Outbox of the turn running on this thread
+        # Seconds from the start of a turn until its first message went out
+        self.first_message_latency = LatencyWindow()
 
     @staticmethod
     def create_twilio_client():
@@ -21,8 +109,60 @@ class Bot:
     def get_from_number():
         return os.getenv('TWILIO_FROM_NUMBER')
 
+    @contextmanager
+    def collect(self, outbox: Outbox):
+        """Collect messages to `outbox.to_number` in the outbox instead of sending them."""
+        self._turn.outbox = outbox
+        try:
+            yield outbox
+        finally:
+            self._turn.outbox = None
+            # Unless the webhook replies with them, the turn sends them now
+            self.send_batch(outbox.to_number, outbox.close())
+            self.record_first_message(outbox)
+
+    def record_first_message(self, outbox: Outbox):
+        """Add the turn's time to first message to the stats, once it has one."""
+        if outbox.time_to_first_message is not None:
+            self.first_message_latency.add(outbox.time_to_first_message)
+
     def say(self, to_number : str, message_body : str):
         """Send a message to the specified number."""
+        outbox = getattr(self._turn, 'outbox', None)
+        if outbox is not None and outbox.to_number == to_number:
+            outbox.transcript.append(message_body)
+            if outbox.add(message_body):
+                return
+            # Released: send what was collected first to keep the order
+            self.send_batch(to_number, outbox.take() + [message_body])
+            return
+        self.send_batch(to_number, [message_body])
+
+    def say_now(self, to_number : str, message_body : str):
+        """Send a message without waiting for the end of the turn.
+
+        Used for the sections of a streamed answer. The messages collected
+        before it go out first. When the turn's replies are returned as
+        TwiML it's collected like any other message.
+        """
+        self.say(to_number, message_body)
+        outbox = getattr(self._turn, 'outbox', None)
+        if outbox is not None and outbox.to_number == to_number and outbox.streams:
+            self.send_batch(to_number, outbox.take())
+
+    def send_batch(self, to_number : str, message_list : list):
+        """Coalesce consecutive messages to one number and send the result."""
+        if not message_list:
+            return
+        for message_body in self.coalescer.coalesce(message_list):
+            self.send(to_number, message_body)
+
+    def send(self, to_number : str, message_body : str):
+        """Send a message right away through the Twilio REST API."""
+        if self.dispatcher is not None:
+            self.dispatcher.send('whatsapp:' + self.from_number, 'whatsapp:' + to_number, message_body)
+            return
+
         message = self.twilio_client.messages.create(
             from_='whatsapp:' + self.from_number,
             to='whatsapp:' + to_number,
@@ -39,5 +179,9 @@ class Bot:
 
     def send_sequence_to(self, to_number : str, message_list : list):
         """Send a sequence of messages to the user."""
+        outbox = getattr(self._turn, 'outbox', None)
+        if outbox is None or outbox.to_number != to_number:
+            self.send_batch(to_number, message_list)
+            return
         for message in message_list:
             self.say(to_number, message)
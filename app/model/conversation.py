@@ -1,129 +1,160 @@
 from flask import request
-from .bot import Bot
-from .ai import AIHandler
-from app.utils.commands import CommandHandler
-import json
+from .resources import get_resources
+from app.utils.commands import COMMAND_TRANSITIONS, COMMAND_WORDS
+from app.utils.stages import Stage
+from app.utils.state_machine import Intent, StateMachine, Transition, normalize
 import random
 from dotenv import load_dotenv
 
 load_dotenv()
 
+ADVICE_CATEGORIES = {
+    '1': 'general_tips',
+    '2': 'pre_interview_preparation',
+    '3': 'behavioral_interview_tips',
+    '4': 'virtual_phone_interview_advice',
+    '5': 'post_interview_tips'
+}
+
+# The replies that mean each intent, compared in lower case
+INTENT_WORDS = {
+    Intent.YES: ('yes', 'y'),
+    Intent.NO: ('no', 'n'),
+    Intent.INTERVIEW: ('1', 'interview preparation', 'interview practice'),
+    Intent.ADVICE: ('2', 'general advice'),
+    Intent.COLLEGE: ('college',),
+    Intent.JOB: ('job',),
+    Intent.CATEGORY: tuple(ADVICE_CATEGORIES),
+    **COMMAND_WORDS,
+}
+
+# (stage, intent of the reply, Conversation method to run, next stage).
+# A next stage of None keeps the user where they are. A method may return
+# a stage to go to instead.
+TRANSITIONS = [
+    # Onboarding
+    Transition(Stage.INITIAL, Intent.OTHER, 'onboarding', Stage.AWAITING_NAME),
+    Transition(Stage.AWAITING_NAME, Intent.OTHER, 'save_name', Stage.AWAITING_PURPOSE),
+    Transition(Stage.ONBOARDED, Intent.OTHER, 'welcome_back', Stage.AWAITING_PURPOSE),
+    Transition(Stage.UNKNOWN, Intent.OTHER, 'welcome_back', Stage.AWAITING_PURPOSE),
+    Transition(Stage.AWAITING_PURPOSE, Intent.INTERVIEW, 'ask_interview_type', Stage.AWAITING_INTERVIEW_TYPE),
+    Transition(Stage.AWAITING_PURPOSE, Intent.ADVICE, 'ask_advice_category', Stage.AWAITING_ADVICE_CATEGORY),
+    Transition(Stage.AWAITING_PURPOSE, Intent.OTHER, 'purpose_not_understood', None),
+
+    # Interview preparation
+    Transition(Stage.AWAITING_INTERVIEW_TYPE, Intent.COLLEGE, 'get_interview_type', Stage.AWAITING_INTERVIEW_ROLE),
+    Transition(Stage.AWAITING_INTERVIEW_TYPE, Intent.JOB, 'get_interview_type', Stage.AWAITING_INTERVIEW_ROLE),
+    Transition(Stage.AWAITING_INTERVIEW_TYPE, Intent.OTHER, None, None),
+    Transition(Stage.AWAITING_INTERVIEW_ROLE, Intent.OTHER, 'get_interview_role',
+               Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE),
+    Transition(Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE, Intent.OTHER, 'capture_interview_response',
+               Stage.AWAITING_FOLLOW_UP_RESPONSE),
+    Transition(Stage.AWAITING_FOLLOW_UP_RESPONSE, Intent.OTHER, 'capture_follow_up_response',
+               Stage.AWAITING_MORE_INTERVIEW),
+    Transition(Stage.AWAITING_MORE_INTERVIEW, Intent.YES, 'next_interview_question',
+               Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE),
+    Transition(Stage.AWAITING_MORE_INTERVIEW, Intent.NO, 'end_interview', Stage.ONBOARDED),
+    Transition(Stage.AWAITING_MORE_INTERVIEW, Intent.OTHER, 'yes_or_no', None),
+
+    # General advice
+    Transition(Stage.AWAITING_ADVICE_CATEGORY, Intent.CATEGORY, 'define_advice_category', Stage.AWAITING_ADVICE_FOLLOWUP),
+    Transition(Stage.AWAITING_ADVICE_CATEGORY, Intent.OTHER, 'category_not_understood', None),
+    Transition(Stage.AWAITING_ADVICE_FOLLOWUP, Intent.NO, 'offer_more_advice', Stage.AWAITING_MORE_ADVICE),
+    Transition(Stage.AWAITING_ADVICE_FOLLOWUP, Intent.OTHER, 'handle_advice_followup', Stage.AWAITING_MORE_ADVICE_FOLLOWUP),
+    Transition(Stage.AWAITING_MORE_ADVICE_FOLLOWUP, Intent.YES, 'ask_followup_question', Stage.AWAITING_ADVICE_FOLLOWUP),
+    Transition(Stage.AWAITING_MORE_ADVICE_FOLLOWUP, Intent.NO, 'offer_more_advice', Stage.AWAITING_MORE_ADVICE),
+    Transition(Stage.AWAITING_MORE_ADVICE_FOLLOWUP, Intent.OTHER, 'yes_or_no', None),
+    Transition(Stage.AWAITING_MORE_ADVICE, Intent.YES, 'ask_advice_category', Stage.AWAITING_ADVICE_CATEGORY),
+    Transition(Stage.AWAITING_MORE_ADVICE, Intent.NO, 'close_advice', Stage.ONBOARDED),
+    Transition(Stage.AWAITING_MORE_ADVICE, Intent.OTHER, 'yes_or_no', None),
+] + COMMAND_TRANSITIONS
+
+# Checked and compiled once, when the module is imported
+STATE_MACHINE = StateMachine(TRANSITIONS, INTENT_WORDS)
+
 class Conversation:
-    def __init__(self, user):
-        self.messages = self.load_messages()
-        self.interview_questions = self.load_interview_questions()
-        self.bot = Bot()
+    def __init__(self, user, resources=None):
+        # Content and clients are shared by all turns, see Resources.
+        # The content snapshot is read-only and stays the same for the whole turn.
+        resources = resources or get_resources()
+        content = resources.content.snapshot()
+        self.messages = content.messages
+        self.interview_questions = content.interview_questions
+        self.bot = resources.bot
         self.user = user
-        self.ai = AIHandler()
-        self.command_handler = CommandHandler(self.bot, self.user)
-
-    @staticmethod
-    def load_messages():
-        """Load messages from JSON."""
-        with open('./app/data/messages.json') as f:
-            data = json.load(f)
-            return data  # Return the entire messages dictionary
-
-
-    @staticmethod
-    def load_interview_questions():
-        with open('./app/data/questions.json') as f:
-            data = json.load(f)
-            # Extract the list of questions
-            interview_questions = [item['question'] for item in data['behavioral_questions']]
-            return interview_questions
-
-
-    def handle_conversation(self):
-        """Main method to handle conversation flow."""
-        user_input = request.form.get('Body', '').strip()  # Read reply
-
-        # Getting the last interation
-        last_interaction = self.user.get_last_interaction()
-
+        self.ai = resources.ai
+        self.command_handler = resources.command_handler
+        self.user_input = ''
+
+    def handle_conversation(self, user_input=None):
+        """Main method to handle conversation flow.
+
+        `user_input` is passed in by background workers, which run outside
+        of a Flask request. When it's missing the reply is read from the request.
+        """
+        if user_input is None:
+            user_input = request.form.get('Body', '')
+        user_input = user_input.strip()  # Read reply
+        self.user_input = user_input
+
+        # All user writes of the turn go out as one UPDATE when it's over
+        with self.user.unit_of_work():
+            self.handle_turn(user_input)
+
+    def handle_turn(self, user_input):
+        """Run the transition for the reply at the user's current stage, see TRANSITIONS."""
         # Update last interaction
         self.user.update_last_interaction()
-        
-        command = self.command_handler.check_for_commands(user_input)
-        if command:
-            print(f'Command: {command} detected in reply. Handling it.')
-            self.command_handler.handle_command(command)
-            return  # Exit after handling the command
-        
-        else:
-            current_stage = self.user.get_conversation_stage()
-            print(f"Handling conversation at stage: {current_stage}")
-            
-            # Initiating the conversation
-            if current_stage in ['initial', 'awaiting_name']:
-                self.onboarding(self.user)
-            elif current_stage == 'onboarded':
-                self.welcome_back(self.user)
-            elif current_stage == 'awaiting_purpose':
-                self.define_purpose(self.user)
-
-            # Handle Interview Sessions
-            elif current_stage == 'awaiting_interview_type':
-                self.get_interview_type(self.user)
-            elif current_stage == 'awaiting_interview_role':
-                self.get_interview_role(self.user)
-            elif current_stage == 'awaiting_interview_question_response':
-                self.capture_interview_response(self.user)
-            elif current_stage == 'awaiting_follow_up_response':
-                self.capture_follow_up_response(self.user)
-            elif current_stage == 'awaiting_more_interview':
-                self.handle_more_interview(self.user)
-
-            # Handle General Advice Sessions
-            elif current_stage == 'awaiting_advice_category':
-                self.define_advice_category(self.user)
-            elif current_stage == 'awaiting_advice_followup':
-                self.handle_advice_followup(self.user)
-            elif current_stage == 'awaiting_more_advice_followup':
-                self.handle_more_advice_followup(self.user)
-            elif current_stage == 'awaiting_more_advice':
-                self.handle_more_advice(self.user)
-
-            # Handle unkown sessions    
-            else:
-                # Reset to onboarded stage in case of an unknown stage
-                self.user.set_conversation_stage('onboarded')
-                self.welcome_back(self.user)
 
+        current_stage = Stage.of(self.user.get_conversation_stage())
+        transition = STATE_MACHINE.dispatch(current_stage, user_input)
+        print(f"Handling conversation at stage: {current_stage.label} ({transition.intent.name.lower()} reply)")
+
+        next_stage = None
+        if transition.handler is not None:
+            next_stage = getattr(self, transition.handler)(self.user)
+        if next_stage is None:
+            next_stage = transition.next_stage if transition.next_stage is not None else current_stage
+        if next_stage != current_stage:
+            self.user.set_conversation_stage(next_stage)
+
+    def run_command(self, user):
+        """Handle one of the commands, see app/utils/commands.py."""
+        command = normalize(self.user_input)
+        print(f'Command: {command} detected in reply. Handling it.')
+        # Whatever was prepared for the user's next reply won't be needed
+        self.ai.cancel_speculative(user.get_user_number())
+        self.command_handler.handle_command(command, user)
 
     def onboarding(self, user):
-        """Onboarding sequence for new users."""
+        """Start onboarding a new user."""
         to_number = user.get_user_number()
-        current_stage = user.get_conversation_stage()
-
         onboarding_msgs = self.messages['onboarding']
 
-        if current_stage == 'initial':
-            print('Starting onboarding')
-            welcome_message = onboarding_msgs['welcome']
-            ask_name_message = onboarding_msgs['ask_name']
-            
-            # Use the Bot class to send messages
-            print('Sending onboarding message to user: %s' % welcome_message)
-            self.bot.say(to_number, welcome_message)
-            self.bot.say(to_number, ask_name_message)
+        print('Starting onboarding')
+        welcome_message = onboarding_msgs['welcome']
+        ask_name_message = onboarding_msgs['ask_name']
 
-            user.set_conversation_stage('awaiting_name')
+        # Use the Bot class to send messages
+        print('Sending onboarding message to user: %s' % welcome_message)
+        self.bot.say(to_number, welcome_message)
+        self.bot.say(to_number, ask_name_message)
 
-        elif current_stage == 'awaiting_name':
-            user_reply = request.form.get('Body').strip()
-            user_name = user_reply  # Optionally, add name validation
+    def save_name(self, user):
+        """Finish onboarding with the name the user replied with."""
+        to_number = user.get_user_number()
+        onboarding_msgs = self.messages['onboarding']
+
+        user_name = self.user_input  # Optionally, add name validation
 
-            # Update the user's name
-            user.update_user_name(user_name)
+        # Update the user's name
+        user.update_user_name(user_name)
 
-            confirm_name_message = onboarding_msgs['confirm_name'].format(name=user_name)
-            self.bot.say(to_number, confirm_name_message)
-            print('Finished onboarding %s' % user_name)
+        confirm_name_message = onboarding_msgs['confirm_name'].format(name=user_name)
+        self.bot.say(to_number, confirm_name_message)
+        print('Finished onboarding %s' % user_name)
 
-            # Updates the user's conversation_stage
-            user.set_conversation_stage('onboarded')
-            self.ask_purpose(self.user)
+        self.ask_purpose(user)
 
     def welcome_back(self, user):
         """Handle the welcome back sequence for returning users."""
@@ -133,15 +164,13 @@ class Conversation:
         user_info = user.get_user_info()
         if not user_info:
             self.bot.say(to_number, "We couldn't find your information. Please start by saying 'Hello'.")
-            return
+            return Stage.ONBOARDED
 
         user_name = user.get_user_name()
         greeting_message = welcome_back_msgs['greeting'].format(name=user_name)
 
         self.bot.say(to_number, greeting_message)
-        # Update conversation stage to 'onboarded'
-        user.set_conversation_stage('onboarded')
-        self.ask_purpose(user)    
+        self.ask_purpose(user)
 
     def ask_purpose(self, user):
         """Ask user for their purpose (e.g., interview preparation, general advice)."""
@@ -152,24 +181,10 @@ class Conversation:
         # Use the Bot class to send the options message
         self.bot.say(to_number, options_message)
 
-        # Update the user's conversation stage
-        user.set_conversation_stage('awaiting_purpose')
-
-    def define_purpose(self, user):
-        """Determine the user's purpose based on their reply."""
+    def purpose_not_understood(self, user):
         to_number = user.get_user_number()
-        reply = request.form.get('Body', '').strip().lower()
-
-        if reply in ['1', 'interview preparation', 'interview practice']:
-            user.set_conversation_stage('awaiting_interview_type')
-            self.ask_interview_type(user)
-        elif reply in ['2', 'general advice']:
-            user.set_conversation_stage('awaiting_advice_category')
-            self.ask_advice_category(user)
-        else:
-            body = "Sorry, I couldn't understand your selection. Please reply with 1 for Interview Preparation or 2 for General Advice."
-            self.bot.say(to_number, body)
-            # Remain in the same stage
+        body = "Sorry, I couldn't understand your selection. Please reply with 1 for Interview Preparation or 2 for General Advice."
+        self.bot.say(to_number, body)
 
     #################################
     # Interview Preparation Methods # 
@@ -178,15 +193,10 @@ class Conversation:
         to_number = user.get_user_number()
         message = "Are you preparing for a college interview or a job interview? Please reply with 'college' or 'job'."
         self.bot.say(to_number, message)
-        user.set_conversation_stage('awaiting_interview_type')
 
     def get_interview_type(self, user):
-        interview_type = request.form.get('Body', '').strip().lower()
-
-        if interview_type in ['college', 'job']:
-            user.set_interview_type(interview_type)
-
-            self.ask_interview_role(user)
+        user.set_interview_type(normalize(self.user_input))
+        self.ask_interview_role(user)
 
     def ask_interview_role(self, user):
         to_number = user.get_user_number()
@@ -197,16 +207,20 @@ class Conversation:
         else:  # 'job'
             message = "Please specify the job role you're applying for so I can tailor the interview questions accordingly."
         self.bot.say(to_number, message)
-        user.set_conversation_stage('awaiting_interview_role')
 
 
     def get_interview_role(self, user):
         to_number = user.get_user_number()
 
-        role = request.form.get('Body', '').strip().upper()
+        role = self.user_input.upper()
         user.set_interview_role(role)
 
         interview_type = user.get_interview_type()
+        question = self.pick_interview_question(interview_type, role, user.get_last_interview_question())
+        # Adapt the questions for this role while the user answers the first one.
+        # The one asked now goes first, so it doesn't wait behind the others.
+        self.ai.prefetch_adapted_questions(interview_type, role, self.interview_questions, first=question)
+
         if interview_type == 'college':
             message = f"Great! Let's start the interview for {role}."
 
@@ -214,48 +228,50 @@ class Conversation:
             message = f"Great! Let's start the interview for a {role} position."
             
         self.bot.say(to_number, message)
-        self.ask_interview_question(user)
+        self.ask_interview_question(user, (question, self.adapt_interview_question(question, interview_type, role)))
 
-    def ask_interview_question(self, user):
-        to_number = user.get_user_number()
-        interview_type = user.get_interview_type()
-        interview_role = user.get_interview_role()
-        last_interview_question = user.get_last_interview_question()
+    def ask_interview_question(self, user, prepared=None):
+        """Ask an interview question, `prepared` if it was already prepared.
 
-        question = random.choice(self.interview_questions)
-        attempts = 0
-        max_attempts = 5
-        
-        while question == last_interview_question and attempts < max_attempts:
-            question = random.choice(self.interview_questions)
-            attempts += 1
-
-        prompt = (
-            f"You are a professional interviewer conducting a {interview_type} interview for the role/college program of '{interview_role}'. "
-            f"Please rephrase or adapt the following question to make it more relevant and specific to this context:\n\n"
-            f"Original Question: {question}\n\n"
-            f"Adapted Question:"
-            f"Make sure the length of the adapted question isn't long"
-            f"Only reply with the adapted question and nothing else."
-        )
-
-        try:
-            adapted_question = self.ai.generate_response(
-                messages=[{'role' : 'system', 'content' : prompt}]
-            )
-        except Exception as e:
-            print(f"Error generating adapted question: {e}")
-            self.bot.say(to_number, "Sorry, I'm having trouble generating a question right now.")
-            return
+        `prepared` is the (question, adapted question) pair returned by
+        prepare_interview_question.
+        """
+        to_number = user.get_user_number()
+        if prepared is None:
+            prepared = self.prepare_interview_question(
+                user.get_interview_type(), user.get_interview_role(), user.get_last_interview_question())
+        question, adapted = prepared
 
+        # The original question to not repeat it, and the question as the user saw it for the feedback
         user.set_last_interview_question(question)
+        user.set_last_adapted_question(adapted)
 
         # Ask the question
-        self.bot.say(to_number, question)
-        user.set_conversation_stage('awaiting_interview_question_response')
+        self.bot.say(to_number, adapted)
+
+    def pick_interview_question(self, interview_type, interview_role, last_interview_question):
+        """Pick the next question, never the one asked last."""
+        # Prefer a question that is already adapted to the role, so there's nothing to wait for
+        ready = self.ai.ready_adapted_questions(interview_type, interview_role, self.interview_questions)
+        candidates = ready if len(ready) > 1 else self.interview_questions
+
+        candidates = [question for question in candidates if question != last_interview_question] or candidates
+        return random.choice(candidates)
+
+    def adapt_interview_question(self, question, interview_type, interview_role):
+        # Falls back to the original question if the adapted one isn't ready in time
+        return self.ai.get_adapted_question(question, interview_type, interview_role) or question
+
+    def prepare_interview_question(self, interview_type, interview_role, last_interview_question):
+        """Pick the next question and adapt it to the role. Returns both.
+
+        Doesn't touch the user, so it can run ahead of time (see provide_feedback).
+        """
+        question = self.pick_interview_question(interview_type, interview_role, last_interview_question)
+        return question, self.adapt_interview_question(question, interview_type, interview_role)
 
     def capture_interview_response(self, user):
-        user_reponse = request.form.get('Body', '').strip()
+        user_reponse = self.user_input
         user.set_interview_response(user_reponse)
 
         # Generate a follow up
@@ -271,12 +287,10 @@ class Conversation:
         
         to_number = user.get_user_number()
         self.bot.say(to_number, follow_up_question)
-        
-        user.set_conversation_stage('awaiting_follow_up_response')
 
     def capture_follow_up_response(self, user):
         to_number = user.get_user_number()
-        follow_up_response = request.form.get('Body', '').strip()
+        follow_up_response = self.user_input
         
         user.set_follow_up_response(follow_up_response)
 
@@ -284,51 +298,39 @@ class Conversation:
 
     def provide_feedback(self, user):
         to_number = user.get_user_number()
-        question = user.get_last_interview_question()
+        last_question = user.get_last_interview_question()
+        # The question as the user saw it
+        question = user.get_last_adapted_question() or last_question
         user_response = user.get_last_interview_response()
         follow_up_question = user.get_last_follow_up_question()
         follow_up_response = user.get_last_follow_up_response()
         interview_type = user.get_interview_type()
         role = user.get_interview_role()
         print(f'Successfully got background for feedback')
-        
-        feedback = self.ai.generate_interview_feedback(question,user_response, follow_up_question, follow_up_response, interview_type, role)
 
-        self.bot.say(to_number, feedback)
+        # Most users practice another question, so prepare it while the feedback is generated
+        self.ai.speculate(to_number, 'next_question', self.prepare_interview_question, interview_type, role, last_question)
+
+        # The feedback is long, so each section goes out as soon as it's generated
+        self.ai.generate_interview_feedback(question,user_response, follow_up_question, follow_up_response, interview_type, role,
+                                            on_section=lambda section: self.bot.say_now(to_number, section))
 
         self.bot.say(to_number, "Would you like to practice another question? Reply 'yes' or 'no'.")
-        user.set_conversation_stage('awaiting_more_interview')
 
-    def handle_more_interview(self, user):
+    def next_interview_question(self, user):
         to_number = user.get_user_number()
-        reply = request.form.get('Body', '').strip().lower()
-
-        if reply in ['yes', 'y']:
-            self.ask_interview_question(user)
-        elif reply in ['no', 'n']:
-            self.bot.say(to_number, "Thank you for practicing. Start another conversation by sending another message.")
-            user.set_conversation_stage('onboarded')
-        else:
-            error_message = "Sorry, I didn't understand that. Please reply with 'yes' or 'no'."
-            self.bot.say(to_number, error_message)
-            # Remain in the same stage
-
-    def start_interview(self, user):
-        """Initiate interview preparation."""
-        to_number = user.get_user_number()
-        interview_message = "Let's start your interview preparation. Please tell me the role you're applying for."
-        self.bot.say(to_number, interview_message)
-        # Further logic for interview preparation can be added here
+        prepared = self.ai.take_speculative(to_number, 'next_question', timeout=self.ai.question_wait)
+        self.ask_interview_question(user, prepared)
 
-    def handle_interview(self, user):
-        """Handle interview preparation logic."""
+    def end_interview(self, user):
         to_number = user.get_user_number()
-        # Implement logic to handle interview input from the user
-        # For simplicity, we'll reset the conversation here
-        self.bot.say(to_number, "Interview preparation is under development.")
-        # Reset to onboarded stage
-        user.set_conversation_stage('onboarded')
-        self.ask_purpose(user)
+        self.ai.cancel_speculative(to_number)
+        self.bot.say(to_number, "Thank you for practicing. Start another conversation by sending another message.")
+
+    def yes_or_no(self, user):
+        """Reply to an answer that isn't 'yes' or 'no'. The user stays at the stage."""
+        error_message = "Sorry, I didn't understand that. Please reply with 'yes' or 'no'."
+        self.bot.say(user.get_user_number(), error_message)
 
     ##########################
     # General Advice Methods #
@@ -340,33 +342,14 @@ class Conversation:
 
         # Send the select_category_msg to confirm what advice?
         self.bot.say(to_number, select_category_msg)
-        user.set_conversation_stage('awaiting_advice_category')
 
     def define_advice_category(self, user):
-        to_number = user.get_user_number()
+        # Give advice based on the selected category
+        self.give_advice(user, ADVICE_CATEGORIES[normalize(self.user_input)])
 
-        # Get the user reply
-        reply = request.form.get('Body', '').strip().lower()
-
-        # Mapping the advice_categories
-        advice_categories = {
-            '1': 'general_tips',
-            '2': 'pre_interview_preparation',
-            '3': 'behavioral_interview_tips',
-            '4': 'virtual_phone_interview_advice',
-            '5': 'post_interview_tips'
-        }
-        if reply in advice_categories:
-            # Get the corresponding category
-            category = advice_categories[reply]
-
-            # Give advice based on the selected category
-            self.give_advice(user, category)
-        else:
-            # Handle invalid input
-            error_message = "Sorry, I didn't understand that. Please reply with a number between 1 and 5."
-            self.bot.say(to_number, error_message)
-            # Remain in the same stage
+    def category_not_understood(self, user):
+        error_message = "Sorry, I didn't understand that. Please reply with a number between 1 and 5."
+        self.bot.say(user.get_user_number(), error_message)
 
     def give_advice(self, user, category):
         """Handle general advice logic."""
@@ -376,78 +359,34 @@ class Conversation:
         
         # Store the last advice given for follow-up questions
         user.set_last_advice(advice_message)
+        user.set_advice_category(category)
         
         # Ask if the user has any questions about the advice
         follow_up_message = "Do you have any questions about this advice? Please feel free to ask or reply 'no' to continue."
         self.bot.say(to_number, follow_up_message)
-        
-        # Update the conversation stage to await user's follow-up question
-        user.set_conversation_stage('awaiting_advice_followup')
 
 
     def handle_advice_followup(self, user):
         to_number = user.get_user_number()
-        user_question = request.form.get('Body', '').strip()
-
-        if user_question.lower() in ['no', 'n']:
-            # User does not have any questions, ask if they need advice on another topic
-            self.bot.say(to_number, "Would you like advice on another topic? Reply 'yes' or 'no'.")
-            user.set_conversation_stage('awaiting_more_advice')
-        else:
-            # User has a question, generate a response
-            # Retrieve the last advice given
-            last_advice = user.get_last_advice()
-            
-            # Construct the messages
-            messages = [
-                {'role': 'system', 'content': (
-                    "You are a helpful assistant that provides advice and answers follow-up questions. "
-                    "When answering, provide clear and concise information suitable for a WhatsApp message. "
-                    "Use simple formatting and avoid Markdown or HTML."
-                )},
-                {'role': 'assistant', 'content': last_advice},
-                {'role': 'user', 'content': user_question}
-            ]
-            
-            # Generate the response
-            response = self.ai.generate_response(messages, model='gpt-4o-mini', max_tokens=500, temperature=0.7)
-            self.bot.say(to_number, response)
-            
-            # Ask if the user has more questions
-            self.bot.say(to_number, "Do you have any more questions about this advice? Reply 'yes' or 'no'.")
-            user.set_conversation_stage('awaiting_more_advice_followup')
+        user_question = self.user_input
 
+        # Retrieve the last advice given
+        last_advice = user.get_last_advice()
 
-    def handle_more_advice(self, user):
-        to_number = user.get_user_number()
-        reply = request.form.get('Body', '').strip().lower()
-        
-        if reply in ['yes', 'y']:
-            self.ask_advice_category(user)
-        elif reply in ['no', 'n']:
-            closing_message = "Thank you for using our service! If you need anything else, just send a message."
-            self.bot.say(to_number, closing_message)
-            # Reset conversation stage to onboarded
-            user.set_conversation_stage('onboarded')
-        else:
-            error_message = "Sorry, I didn't understand that. Please reply with 'yes' or 'no'."
-            self.bot.say(to_number, error_message)
-            # Remain in the same stage
-
-    def handle_more_advice_followup(self, user):
-        to_number = user.get_user_number()
-        reply = request.form.get('Body', '').strip().lower()
-        
-        if reply in ['yes', 'y']:
-            # User has more questions
-            self.bot.say(to_number, "Please ask your question.")
-            user.set_conversation_stage('awaiting_advice_followup')
-        elif reply in ['no', 'n']:
-            # Ask if they need advice on another topic
-            self.bot.say(to_number, "Would you like advice on another topic? Reply 'yes' or 'no'.")
-            user.set_conversation_stage('awaiting_more_advice')
-        else:
-            error_message = "Sorry, I didn't understand that. Please reply with 'yes' or 'no'."
-            self.bot.say(to_number, error_message)
-            # Remain in the same stage
+        # Similar questions about the same category are answered from the cache
+        response = self.ai.generate_advice_followup(last_advice, user_question, user.get_advice_category())
+        self.bot.say(to_number, response)
+
+        # Ask if the user has more questions
+        self.bot.say(to_number, "Do you have any more questions about this advice? Reply 'yes' or 'no'.")
+
+    def ask_followup_question(self, user):
+        self.bot.say(user.get_user_number(), "Please ask your question.")
+
+    def offer_more_advice(self, user):
+        # No (more) questions, ask if they need advice on another topic
+        self.bot.say(user.get_user_number(), "Would you like advice on another topic? Reply 'yes' or 'no'.")
 
+    def close_advice(self, user):
+        closing_message = "Thank you for using our service! If you need anything else, just send a message."
+        self.bot.say(user.get_user_number(), closing_message)
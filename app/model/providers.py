@@ -0,0 +1,268 @@
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from app.utils.circuit_breaker import OPEN, CircuitBreaker
+from app.utils.latency import LatencyWindow
+from app.utils.limiter import current_priority
+from app.utils.prompt_compiler import PromptCompiler
+
+
+class LLMProvider(ABC):
+    """A chat model AIHandler can send its requests to.
+
+    `model` is the model AIHandler asked for. Providers that run a model
+    of their own ignore it.
+    """
+
+    @abstractmethod
+    def complete(self, messages, model, max_tokens, temperature) -> str:
+        """Return the whole answer to `messages`."""
+
+    def stream(self, messages, model, max_tokens, temperature):
+        """Yield the answer in pieces. By default it's a single piece."""
+        yield self.complete(messages, model, max_tokens, temperature)
+
+
+class OpenAIProvider(LLMProvider):
+    """The hosted OpenAI chat completions API."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, messages, model, max_tokens, temperature) -> str:
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            n=1,
+        )
+        return response.choices[0].message.content.strip()
+
+    def stream(self, messages, model, max_tokens, temperature):
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            n=1,
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class OllamaProvider(LLMProvider):
+    """A local model served by Ollama, as the training scripts use it."""
+
+    def __init__(self, model: str = 'llama3.1', base_url: str = None):
+        # Only needed when a local model is configured
+        from langchain_ollama import OllamaLLM
+        self._llm_class = OllamaLLM
+        self.model = model
+        self.base_url = base_url
+        self._llms = {}  # (max_tokens, temperature) -> OllamaLLM
+        self._lock = threading.Lock()
+
+    def _llm(self, max_tokens, temperature):
+        with self._lock:
+            llm = self._llms.get((max_tokens, temperature))
+            if llm is None:
+                options = {'base_url': self.base_url} if self.base_url else {}
+                llm = self._llms[(max_tokens, temperature)] = self._llm_class(
+                    model=self.model, num_predict=max_tokens, temperature=temperature, **options)
+            return llm
+
+    @staticmethod
+    def prompt(messages) -> str:
+        return '\n\n'.join(f"{message['role']}: {message['content']}" for message in messages) + '\n\nassistant:'
+
+    def complete(self, messages, model, max_tokens, temperature) -> str:
+        return self._llm(max_tokens, temperature).invoke(self.prompt(messages)).strip()
+
+    def stream(self, messages, model, max_tokens, temperature):
+        yield from self._llm(max_tokens, temperature).stream(self.prompt(messages))
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic in-process model for tests and offline load tests.
+
+    The answer only depends on the messages. Every call takes `latency`
+    seconds, and raises while `failing` is set.
+    """
+
+    def __init__(self, reply=None, latency: float = 0.0):
+        self.reply = reply
+        self.latency = latency
+        self.failing = False
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, max_tokens, temperature) -> str:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failing:
+            raise RuntimeError('Fake provider is failing')
+        if self.reply is not None:
+            return self.reply(messages) if callable(self.reply) else self.reply
+        digest = hashlib.sha1(repr(messages).encode('utf-8')).hexdigest()[:8]
+        return f'Answer {digest}'
+
+
+class LLMRouter:
+    """Sends each request to the providers its task is routed to.
+
+    `routes` maps a task (e.g. 'follow_up_question') to provider names in
+    order of preference; other tasks use `default`. A provider that
+    fails, or whose CircuitBreaker is open, is skipped for the next one.
+    When a request takes longer than the provider's p95 latency (measured
+    over its last calls, once it has `min_samples`) the same request is
+    also sent to the next provider and the first answer wins. Only hedged
+    requests go through the thread pool, and the backup request takes a
+    slot of its own from `limiter`.
+    """
+
+    def __init__(self, providers: dict, routes: dict = None, default: list = None, hedge: bool = True,
+                 min_samples: int = 20, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 workers: int = None, limiter=None):
+        self.providers = providers
+        self.routes = routes or {}
+        self.default = default or list(providers)[:1]
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout) for name in providers}
+        self.latency = {name: LatencyWindow(size=200) for name in providers}
+        self.limiter = limiter
+        if workers is None:
+            # A hedged request and its backup for every request the limiter lets through
+            workers = 2 * int(limiter.max_limit) if limiter is not None else 64
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-hedge')
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'fallbacks': 0, 'hedges': 0, 'hedge_wins': 0, 'rejected': 0}
+
+    def route(self, task: str) -> list:
+        return self.routes.get(task, self.default)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _call(self, name, messages, model, max_tokens, temperature):
+        start = time.monotonic()
+        try:
+            text = self.providers[name].complete(messages, model, max_tokens, temperature)
+        except Exception:
+            self.breakers[name].record_failure()
+            raise
+        self.breakers[name].record_success()
+        self.latency[name].add(time.monotonic() - start)
+        return text
+
+    def _call_backup(self, name, priority, messages, model, max_tokens, temperature):
+        """The second request of a hedge, which the limiter has to count as well."""
+        if self.limiter is None:
+            return self._call(name, messages, model, max_tokens, temperature)
+        tokens = PromptCompiler.count_messages(messages) + max_tokens
+        with self.limiter.slot(tokens, priority):
+            return self._call(name, messages, model, max_tokens, temperature)
+
+    def _available(self, names):
+        """Yield the names whose circuit lets a call through."""
+        for name in names:
+            if self.breakers[name].allow():
+                yield name
+            else:
+                self._count('rejected')
+
+    def _next_available(self, names: list):
+        """Take names off the front of `names` until one whose circuit lets a call through."""
+        while names:
+            name = names.pop(0)
+            if self.breakers[name].allow():
+                return name
+            self._count('rejected')
+        return None
+
+    def complete(self, task, messages, model, max_tokens, temperature) -> str:
+        self._count('requests')
+        args = (messages, model, max_tokens, temperature)
+        remaining = list(self.route(task))
+        error = None
+        while True:
+            name = self._next_available(remaining)
+            if name is None:
+                break
+            if error is not None:
+                self._count('fallbacks')
+            hedge_after = None
+            # Without a provider to hedge with there's nothing to gain from the pool
+            if self.hedge and any(self.breakers[other].state != OPEN for other in remaining):
+                hedge_after = self.latency[name].percentile(0.95, self.min_samples)
+            if hedge_after is None:
+                try:
+                    return self._call(name, *args)
+                except Exception as e:
+                    print(f"Model provider {name} failed for {task}: {e}")
+                    error = e
+                    continue
+
+            primary = self._executor.submit(self._call, name, *args)
+            done, _ = wait([primary], timeout=hedge_after)
+            futures = [primary]
+            if not done:
+                backup = self._next_available(remaining)
+                if backup is not None:
+                    self._count('hedges')
+                    futures.append(self._executor.submit(self._call_backup, backup, current_priority(), *args))
+            # The first answer wins, a slower one is dropped
+            pending = futures
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            self._count('hedge_wins')
+                        return future.result()
+                    error = future.exception()
+                    print(f"Model provider failed for {task}: {error}")
+        raise error or RuntimeError(f'No model provider available for {task}')
+
+    def stream(self, task, messages, model, max_tokens, temperature):
+        """Stream from the first provider that works. Once text was yielded there's no fallback."""
+        self._count('requests')
+        error = None
+        for name in self._available(self.route(task)):
+            if error is not None:
+                self._count('fallbacks')
+            started = False
+            try:
+                for text in self.providers[name].stream(messages, model, max_tokens, temperature):
+                    started = True
+                    yield text
+            except GeneratorExit:
+                # The caller stopped reading, the provider was fine
+                self.breakers[name].record_success()
+                raise
+            except Exception as e:
+                self.breakers[name].record_failure()
+                if started:
+                    raise
+                print(f"Model provider {name} failed for {task}: {e}")
+                error = e
+                continue
+            self.breakers[name].record_success()
+            return
+        raise error or RuntimeError(f'No model provider available for {task}')
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['providers'] = {
+            name: {'circuit': self.breakers[name].state, **self.latency[name].stats()} for name in self.providers
+        }
+        return stats
@@ -0,0 +1,177 @@
+import os
+import threading
+from openai import OpenAI
+from .bot import Bot
+from .ai import AIHandler
+from .providers import LLMRouter, OpenAIProvider, OllamaProvider, FakeProvider
+from app.utils.commands import CommandHandler
+from app.utils.content import ContentStore
+from app.utils.dispatcher import OutboundDispatcher
+from app.utils.advice_cache import AdviceCache
+from app.utils.semantic_cache import SemanticCache
+from app.utils.question_store import AdaptedQuestionStore
+from app.utils.speculation import Speculation
+from app.utils.single_flight import SingleFlight
+from app.utils.limiter import AdaptiveLimiter
+
+# Short tasks that a local model handles well, with OpenAI as the fallback
+DEFAULT_AI_ROUTES = 'follow_up_question=ollama,openai;irrelevant_question=ollama,openai'
+
+
+class Resources:
+    """Process-wide objects shared by every conversation turn.
+
+    Holds the content store and a single Bot, AIHandler and
+    CommandHandler. The Twilio and OpenAI clients keep their HTTP
+    connection pools alive between turns, so building a Conversation
+    doesn't read any files or open any connections.
+    """
+
+    def __init__(self, bot=None, ai=None, content=None):
+        self.content = content or ContentStore()
+
+        self.bot = bot or Bot(dispatcher=self.create_dispatcher())
+        limiter = self.create_limiter() if ai is None else None
+        self.ai = ai or AIHandler(content=self.content, advice_cache=self.create_advice_cache(),
+                                  followup_cache=self.create_followup_cache(),
+                                  question_store=self.create_question_store(),
+                                  question_wait=float(os.getenv('ADAPTED_QUESTION_WAIT', 2.0)),
+                                  speculation=self.create_speculation(),
+                                  single_flight=self.create_single_flight(),
+                                  router=self.create_llm_router(limiter),
+                                  limiter=limiter,
+                                  answer_budget=int(os.getenv('PROMPT_ANSWER_BUDGET', 300)))
+        self.command_handler = CommandHandler(self.bot)
+        self._background_bot = None
+        self._lock = threading.Lock()
+
+    @property
+    def background_bot(self):
+        """Bot for messages nobody is waiting on, such as the idle farewells.
+
+        It always queues on a rate-limited OutboundDispatcher: the shared
+        bot's if it has one, otherwise a small one of its own.
+        """
+        if self.bot.dispatcher is not None:
+            return self.bot
+        with self._lock:
+            if self._background_bot is None:
+                dispatcher = self.build_dispatcher(num_workers=int(os.getenv('BACKGROUND_OUTBOUND_WORKERS', 2)))
+                self._background_bot = Bot(self.bot.twilio_client, dispatcher, self.bot.coalescer)
+            return self._background_bot
+
+    @staticmethod
+    def create_dispatcher():
+        """Background outbound sender, enabled with OUTBOUND_DISPATCHER=true."""
+        if os.getenv('OUTBOUND_DISPATCHER', 'false').lower() != 'true':
+            return None
+        return Resources.build_dispatcher(int(os.getenv('OUTBOUND_WORKERS', 8)))
+
+    @staticmethod
+    def build_dispatcher(num_workers: int):
+        return OutboundDispatcher(
+            os.getenv('ACCOUNT_SID'),
+            os.getenv('AUTH_TOKEN'),
+            base_url=os.getenv('TWILIO_API_URL', 'https://api.twilio.com'),
+            num_workers=num_workers,
+            rate_per_second=float(os.getenv('OUTBOUND_RATE_PER_SECOND', 20))
+        )
+
+    @staticmethod
+    def create_advice_cache():
+        """Pools of pre-generated advice, disabled with ADVICE_CACHE=false."""
+        if os.getenv('ADVICE_CACHE', 'true').lower() != 'true':
+            return None
+        return AdviceCache(
+            os.getenv('ADVICE_CACHE_PATH', 'app/data/advice_cache.json'),
+            pool_size=int(os.getenv('ADVICE_POOL_SIZE', 5)),
+            ttl=float(os.getenv('ADVICE_TTL', 24 * 3600))
+        )
+
+    @staticmethod
+    def create_followup_cache():
+        """Semantic cache of advice follow-up answers, disabled with FOLLOWUP_CACHE=false."""
+        if os.getenv('FOLLOWUP_CACHE', 'true').lower() != 'true':
+            return None
+        return SemanticCache(
+            threshold=float(os.getenv('FOLLOWUP_CACHE_THRESHOLD', 0.85)),
+            max_entries=int(os.getenv('FOLLOWUP_CACHE_SIZE', 256))
+        )
+
+    @staticmethod
+    def create_question_store():
+        """Interview questions adapted to each role ahead of time, disabled with QUESTION_STORE=false."""
+        if os.getenv('QUESTION_STORE', 'true').lower() != 'true':
+            return None
+        return AdaptedQuestionStore(
+            os.getenv('QUESTION_STORE_PATH', 'app/data/adapted_questions.json'),
+            max_entries=int(os.getenv('QUESTION_STORE_SIZE', 5000)),
+            warm_roles=int(os.getenv('QUESTION_STORE_WARM_ROLES', 50))
+        )
+
+    @staticmethod
+    def create_speculation():
+        """Model calls made ahead of the user's next reply, disabled with SPECULATION=false."""
+        if os.getenv('SPECULATION', 'true').lower() != 'true':
+            return None
+        return Speculation(workers=int(os.getenv('SPECULATION_WORKERS', 4)))
+
+    @staticmethod
+    def create_single_flight():
+        """Sharing of identical concurrent model requests, disabled with AI_SINGLE_FLIGHT=false."""
+        if os.getenv('AI_SINGLE_FLIGHT', 'true').lower() != 'true':
+            return None
+        return SingleFlight()
+
+    @staticmethod
+    def create_llm_router(limiter=None):
+        """Model providers and which tasks go where, None for OpenAI only.
+
+        AI_PROVIDER=fake answers everything in-process (for offline load
+        tests). With OLLAMA_MODEL set, the tasks in AI_ROUTES go to the
+        local model first, written as 'task=provider,provider;...'.
+        `limiter` also counts the backup requests of hedges.
+        """
+        hedge = os.getenv('AI_HEDGE', 'true').lower() == 'true'
+        if os.getenv('AI_PROVIDER', 'openai').lower() == 'fake':
+            return LLMRouter({'fake': FakeProvider(latency=float(os.getenv('AI_FAKE_LATENCY', 0)))}, hedge=hedge,
+                             limiter=limiter)
+        if not os.getenv('OLLAMA_MODEL'):
+            return None
+
+        providers = {
+            'openai': OpenAIProvider(OpenAI(api_key=os.getenv('OPENAI_API_KEY'))),
+            'ollama': OllamaProvider(os.getenv('OLLAMA_MODEL'), os.getenv('OLLAMA_URL')),
+        }
+        routes = {}
+        for rule in os.getenv('AI_ROUTES', DEFAULT_AI_ROUTES).split(';'):
+            if rule.strip():
+                task, names = rule.split('=', 1)
+                routes[task.strip()] = [name.strip() for name in names.split(',')]
+        return LLMRouter(providers, routes, default=['openai'], hedge=hedge, limiter=limiter)
+
+    @staticmethod
+    def create_limiter():
+        """Adaptive limit on model requests shared by all of them, disabled with AI_LIMITER=false."""
+        if os.getenv('AI_LIMITER', 'true').lower() != 'true':
+            return None
+        return AdaptiveLimiter(
+            initial_limit=float(os.getenv('AI_CONCURRENCY', 8)),
+            max_limit=float(os.getenv('AI_MAX_CONCURRENCY', 32)),
+            tokens_per_minute=float(os.getenv('AI_TOKENS_PER_MINUTE', 200_000)),
+            target_latency=float(os.getenv('AI_TARGET_LATENCY', 10)),
+            queue_timeout=float(os.getenv('AI_QUEUE_TIMEOUT', 60))
+        )
+
+
+_resources = None
+_resources_lock = threading.Lock()
+
+def get_resources() -> Resources:
+    """Return the process-wide Resources, creating them on first use."""
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = Resources()
+    return _resources
@@ -0,0 +1,118 @@
+"""Local stand-in for the OpenAI chat completions API, for tests and offline benchmarks.
+
+    server = FakeOpenAIServer('*Strengths*\\n\\n• ...', token_delay=0.02)
+    server.start()
+    client = OpenAI(api_key='fake', base_url=f'{server.url}/v1')
+    ...
+    server.stop()
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def tokenize(text: str) -> list:
+    """Split `text` into word-sized pieces, roughly like the model streams them."""
+    return re.findall(r'\s*\S+|\s+', text)
+
+
+class FakeOpenAIServer:
+    """Answers POST /v1/chat/completions with `reply`, streamed or not.
+
+    Each token takes `token_delay` seconds after a `first_token_delay`, so a
+    full answer takes as long as a streamed one but starts arriving early.
+    `reply` can also be a function of the request's messages.
+    """
+
+    def __init__(self, reply='Tell me about a project you are proud of.', token_delay: float = 0.0,
+                 first_token_delay: float = 0.0, port: int = 0):
+        self.reply = reply
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _text_for(self, body):
+        return self.reply(body['messages']) if callable(self.reply) else self.reply
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length))
+                with fake._lock:
+                    fake.requests.append(body)
+                tokens = tokenize(fake._text_for(body))[:body.get('max_tokens') or None]
+                if body.get('stream'):
+                    self._stream(body, tokens)
+                else:
+                    time.sleep(fake.first_token_delay + fake.token_delay * len(tokens))
+                    self._reply(body, ''.join(tokens))
+
+            def _reply(self, body, text):
+                data = json.dumps({
+                    'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()),
+                    'model': body.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': text}}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body, tokens):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(fake.first_token_delay)
+                for token in tokens:
+                    self._event(body, {'content': token}, None)
+                    time.sleep(fake.token_delay)
+                self._event(body, {}, 'stop')
+                self._write(b'data: [DONE]\n\n')
+                self._write(b'')
+
+            def _event(self, body, delta, finish_reason):
+                chunk = {
+                    'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                    'model': body.get('model'),
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                }
+                self._write(f'data: {json.dumps(chunk)}\n\n'.encode())
+
+            def _write(self, data):
+                # One HTTP chunk, flushed straight away
+                self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass  # Keep test and benchmark output quiet
+
+        return Handler
@@ -0,0 +1,84 @@
+"""Local stand-in for the Twilio Messages API, for tests and offline benchmarks.
+
+    server = FakeTwilioServer(latency=0.05, error_rate=0.1)
+    server.start()
+    dispatcher = OutboundDispatcher('ACfake', 'token', base_url=server.url)
+    ...
+    server.stop()
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTwilioServer:
+    """Accepts POST .../Messages.json and records the messages it received.
+
+    `latency` adds a delay to every response and a fraction `error_rate`
+    of requests fail with `error_status` (429 by default).
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 429, port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.messages = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-twilio', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                with fake._lock:
+                    fake.requests += 1
+                    failed = random.random() < fake.error_rate
+                    if not failed:
+                        fake.messages.append(form)
+                        sid = f'SM{len(fake.messages):032d}'
+
+                if failed:
+                    self._reply(fake.error_status, {'code': 20429, 'message': 'Too Many Requests'})
+                else:
+                    self._reply(201, {'sid': sid, 'status': 'queued', 'to': form.get('To'), 'body': form.get('Body')})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep test and benchmark output quiet
+
+        return Handler
@@ -0,0 +1,166 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from .limiter import PREFETCH, request_priority
+
+
+class AdviceCache:
+    """Pools of pre-generated answers to prompts that don't depend on the user.
+
+    Each key (an advice category and its prompt) has a pool of up to
+    `pool_size` variants, and `get` returns a random one without calling the
+    model. Variants expire after `ttl` seconds. When fewer than `min_fresh`
+    are fresh, the pool is refilled on a background thread, and meanwhile
+    the stale variants are still served. Only a key that has never been
+    generated waits for the model, and users asking for it at the same time
+    share a single call.
+
+    The pools are saved to `path` after every refill and loaded on start,
+    so a restarted process has warm content straight away. Variants older
+    than `max_age` are dropped there, which also clears out the pools of
+    prompts that have since changed.
+    """
+
+    def __init__(self, path: str = 'app/data/advice_cache.json', pool_size: int = 5, ttl: float = 24 * 3600,
+                 min_fresh: int = 2, max_age: float = 7 * 24 * 3600, refill_workers: int = 2):
+        self.path = path
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self.min_fresh = min_fresh
+        self.max_age = max_age
+        self._pools = {}  # key -> list of [text, created_at]
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One writer of the temporary file at a time
+        self._refilling = set()
+        self._first_variant = {}  # key -> Future of the variant being generated for an empty pool
+        self._refill_executor = ThreadPoolExecutor(max_workers=refill_workers, thread_name_prefix='advice-refill')
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._refills = 0
+        self._load()
+
+    def get(self, key: str, generate) -> str:
+        """Return a variant for `key`. `generate()` makes a new one with the model."""
+        now = time.time()
+        with self._lock:
+            pool = self._pools.get(key, [])
+            fresh = [text for text, created_at in pool if now - created_at < self.ttl]
+            if pool:
+                if fresh:
+                    self._hits += 1
+                else:
+                    self._stale_hits += 1
+                if len(fresh) < self.min_fresh:
+                    self._schedule_refill(key, generate)
+                return random.choice(fresh or [text for text, _ in pool])
+
+            # Nothing cached at all, so these users have to wait for the model.
+            # Only the first one calls it, the others share its answer.
+            self._misses += 1
+            future = self._first_variant.get(key)
+            owner = future is None
+            if owner:
+                future = self._first_variant[key] = Future()
+
+        if not owner:
+            return future.result()
+        try:
+            text = generate()
+        except BaseException as e:
+            with self._lock:
+                del self._first_variant[key]
+            future.set_exception(e)
+            raise
+        self._add(key, text)
+        with self._lock:
+            del self._first_variant[key]
+            # Fill the rest of the pool in the background
+            self._schedule_refill(key, generate)
+        future.set_result(text)
+        return text
+
+    def _schedule_refill(self, key, generate):
+        # Called with the lock held
+        if key in self._refilling:
+            return
+        self._refilling.add(key)
+        self._refill_executor.submit(self._refill, key, generate)
+
+    def _refill(self, key, generate):
+        try:
+            now = time.time()
+            with self._lock:
+                fresh = [entry for entry in self._pools.get(key, []) if now - entry[1] < self.ttl]
+            with request_priority(PREFETCH):
+                for _ in range(self.pool_size - len(fresh)):
+                    self._add(key, generate())
+            with self._lock:
+                self._refills += 1
+            self.save()
+        except Exception as e:
+            print(f"Error refilling advice for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def _add(self, key, text):
+        with self._lock:
+            pool = self._pools.setdefault(key, [])
+            pool.append([text, time.time()])
+            # Keep the newest variants
+            del pool[:-self.pool_size]
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self._pools = self._prune(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable advice cache {self.path}: {e}")
+
+    def _prune(self, pools):
+        now = time.time()
+        pools = {key: [list(entry) for entry in pool if now - entry[1] < self.max_age] for key, pool in pools.items()}
+        return {key: pool for key, pool in pools.items() if pool}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._pools = self._prune(self._pools)
+            data = json.dumps(self._pools)
+        # Write a temporary file first, so a crash never leaves half a file behind
+        tmp_path = f'{self.path}.tmp'
+        with self._save_lock:
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+    def wait_for_refills(self):
+        """Block until the refills scheduled so far are done (for tests and benchmarks)."""
+        while True:
+            with self._lock:
+                if not self._refilling:
+                    return
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._stale_hits + self._misses
+            return {
+                'keys': len(self._pools),
+                'variants': sum(len(pool) for pool in self._pools.values()),
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'misses': self._misses,
+                'hit_rate': round((self._hits + self._stale_hits) / lookups, 3) if lookups else 0.0,
+                'refills': self._refills,
+            }
+
+    def shutdown(self):
+        self._refill_executor.shutdown(wait=True)
@@ -0,0 +1,63 @@
+# A section needs at least this many characters to be sent on its own
+MIN_SECTION_LENGTH = 80
+# A paragraph without a blank line is cut at a line break past this length
+MAX_SECTION_LENGTH = 700
+# A single line up to this long on its own paragraph is a heading
+MAX_HEADING_LENGTH = 80
+
+
+def is_heading(paragraph: str) -> bool:
+    return '\n' not in paragraph and len(paragraph) <= MAX_HEADING_LENGTH and not paragraph.startswith(('•', '-', '*  '))
+
+
+class SectionChunker:
+    """Cuts a streamed completion into sections that can be sent right away.
+
+    Text is fed in as the model produces it and split into paragraphs at
+    blank lines. Paragraphs are sent together as a section once they have
+    at least `min_length` characters, and a heading always stays with the
+    bullets under it. A paragraph longer than `max_length` is cut at its
+    last line break.
+    """
+
+    def __init__(self, min_length: int = MIN_SECTION_LENGTH, max_length: int = MAX_SECTION_LENGTH):
+        self.min_length = min_length
+        self.max_length = max_length
+        self._buffer = ''  # The paragraph still being streamed
+        self._pending = []  # Complete paragraphs not sent yet
+
+    def feed(self, text: str) -> list:
+        """Add streamed text. Returns the sections it completed."""
+        self._buffer += text
+        sections = []
+        while True:
+            index = self._buffer.find('\n\n')
+            if index < 0:
+                break
+            paragraph, self._buffer = self._buffer[:index].strip(), self._buffer[index + 2:]
+            if paragraph:
+                sections += self._add(paragraph)
+
+        if len(self._buffer) > self.max_length:
+            index = self._buffer.rfind('\n')
+            if index > 0:
+                paragraph, self._buffer = self._buffer[:index].strip(), self._buffer[index + 1:]
+                sections += self._add(paragraph, force=True)
+        return sections
+
+    def _add(self, paragraph, force=False):
+        self._pending.append(paragraph)
+        if is_heading(paragraph) and not force:
+            return []
+        if not force and sum(len(p) for p in self._pending) < self.min_length:
+            return []
+        section, self._pending = '\n\n'.join(self._pending), []
+        return [section]
+
+    def flush(self) -> list:
+        """End of the stream. Returns what's left as the last section."""
+        if self._buffer.strip():
+            self._pending.append(self._buffer.strip())
+        self._buffer = ''
+        section, self._pending = '\n\n'.join(self._pending), []
+        return [section] if section else []
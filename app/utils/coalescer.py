@@ -0,0 +1,75 @@
+import threading
+
+# Twilio rejects WhatsApp message bodies longer than this
+WHATSAPP_MAX_LENGTH = 1600
+
+# Preferred places to split a long message, best first
+SPLIT_SEPARATORS = ('\n\n', '\n', '. ', ' ')
+MERGE_SEPARATOR = '\n\n'
+
+
+def split_message(body: str, limit: int = WHATSAPP_MAX_LENGTH) -> list:
+    """Split `body` into parts of at most `limit` characters.
+
+    Splits at paragraph breaks, then line breaks (bullet points), then
+    sentences, then words. Paragraph and line breaks in the first half of a
+    part are skipped, so a long message isn't cut into a string of tiny ones.
+    """
+    parts = []
+    while len(body) > limit:
+        for separator in SPLIT_SEPARATORS:
+            index = body.rfind(separator, 0, limit)
+            if index > 0 and (separator == ' ' or index >= limit // 2):
+                # A sentence keeps its full stop
+                head_end = index + 1 if separator == '. ' else index
+                parts.append(body[:head_end].rstrip())
+                body = body[index + len(separator):]
+                break
+        else:
+            parts.append(body[:limit])
+            body = body[limit:]
+    if body.strip():
+        parts.append(body)
+    return parts
+
+
+class MessageCoalescer:
+    """Merges consecutive messages to one user into as few sends as possible.
+
+    Messages are joined with a blank line as long as the result fits in one
+    WhatsApp message. Oversized messages are split first (see split_message).
+    """
+
+    def __init__(self, limit: int = WHATSAPP_MAX_LENGTH):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._messages_in = 0
+        self._messages_out = 0
+        self._splits = 0
+
+    def coalesce(self, messages: list) -> list:
+        coalesced = []
+        splits = 0
+        for body in messages:
+            parts = split_message(body, self.limit)
+            splits += len(parts) - 1
+            for part in parts:
+                if coalesced and len(coalesced[-1]) + len(MERGE_SEPARATOR) + len(part) <= self.limit:
+                    coalesced[-1] += MERGE_SEPARATOR + part
+                else:
+                    coalesced.append(part)
+
+        with self._lock:
+            self._messages_in += len(messages)
+            self._messages_out += len(coalesced)
+            self._splits += splits
+        return coalesced
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'messages_in': self._messages_in,
+                'messages_out': self._messages_out,
+                'sends_saved': self._messages_in - self._messages_out,
+                'oversized_splits': self._splits,
+            }
@@ -1,52 +1,81 @@
+from .stages import Stage
+from .state_machine import Intent, Transition
+
+# The word of each command
+COMMANDS = {
+    'exit': Intent.EXIT,
+    'restart': Intent.RESTART,
+    'options': Intent.OPTIONS,
+    'help': Intent.HELP,
+}
+
+HELP_MESSAGE = (
+    "You can use the following commands at any time:\n"
+    "- 'exit': Quit the chat.\n"
+    "- 'restart': Restart the current section of the conversation.\n"
+    "- 'options': Go back to the main menu to select interview preparation or general advice.\n"
+    "- 'help': Show this help message."
+)
+
+# Where 'restart' takes the user from each stage. Other stages go back to the main menu.
+RESTART_TARGETS = {
+    Stage.INITIAL: Stage.INITIAL,
+    Stage.AWAITING_NAME: Stage.INITIAL,
+    Stage.AWAITING_INTERVIEW_TYPE: Stage.AWAITING_INTERVIEW_TYPE,
+    Stage.AWAITING_INTERVIEW_ROLE: Stage.AWAITING_INTERVIEW_TYPE,
+    Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE: Stage.AWAITING_INTERVIEW_TYPE,
+    Stage.AWAITING_ADVICE_CATEGORY: Stage.AWAITING_ADVICE_CATEGORY,
+    Stage.AWAITING_ADVICE_FOLLOWUP: Stage.AWAITING_ADVICE_CATEGORY,
+}
+
+RESTART_MESSAGES = {
+    Stage.INITIAL: "Restarting onboarding...",
+    Stage.AWAITING_INTERVIEW_TYPE: "Restarting interview preparation...",
+    Stage.AWAITING_ADVICE_CATEGORY: "Restarting this section...",
+    Stage.ONBOARDED: "Returning to the main menu...",
+}
+
+COMMAND_REPLIES = {
+    'exit': "Thank you for using our service! Goodbye!",
+    'options': "Returning to options...",
+    'help': HELP_MESSAGE,
+}
+
+
+def restart_target(stage) -> Stage:
+    return RESTART_TARGETS.get(stage, Stage.ONBOARDED)
+
+
+# The commands' part of the transition table, see app/model/conversation.py
+COMMAND_TRANSITIONS = [
+    Transition(None, Intent.EXIT, 'run_command', Stage.ONBOARDED),
+    Transition(None, Intent.OPTIONS, 'run_command', Stage.ONBOARDED),
+    Transition(None, Intent.HELP, 'run_command', None),
+] + [Transition(stage, Intent.RESTART, 'run_command', restart_target(stage)) for stage in Stage]
+
+COMMAND_WORDS = {intent: (word,) for word, intent in COMMANDS.items()}
 
 
 class CommandHandler:
-    def __init__(self, bot, user):
+    """Handles the commands a user can send at any stage.
+
+    One instance is shared by all conversations, so the user is passed
+    in with every call instead of being stored on the handler. The stage
+    a command leads to is in COMMAND_TRANSITIONS.
+    """
+
+    def __init__(self, bot):
         self.bot = bot
-        self.user = user
-
-    def check_for_commands(self, user_input):
-        commands = ['exit', 'restart', 'options', 'help']
-        user_input_clean = user_input.strip().lower()
-        if user_input_clean in commands:
-            return user_input_clean
-        else:
-            return None
-
-    def handle_command(self, command):
-        to_number = self.user.get_user_number()
-        if command == 'exit':
-            self.bot.say(to_number, "Thank you for using our service! Goodbye!")
-            self.user.set_conversation_stage('onboarded')
-        elif command == 'restart':
-            self.restart_conversation()
-        elif command == 'options':
-            self.user.set_conversation_stage('onboarded')
-            self.bot.say(to_number, "Returning to options...")
-            # Possibly call a method to display options
-        elif command == 'help':
-            help_message = (
-                "You can use the following commands at any time:\n"
-                "- 'exit': Quit the chat.\n"
-                "- 'restart': Restart the current section of the conversation.\n"
-                "- 'options': Go back to the main menu to select interview preparation or general advice.\n"
-                "- 'help': Show this help message."
-            )
-            self.bot.say(to_number, help_message)
-
-    def restart_conversation(self):
-        to_number = self.user.get_user_number()
-        current_stage = self.user.get_conversation_stage()
-        if current_stage in ['awaiting_name', 'initial']:
-            self.user.set_conversation_stage('initial')
-            self.bot.say(to_number, "Restarting onboarding...")
-            # You might need to call methods from Conversation class
-        elif current_stage.startswith('awaiting_interview'):
-            self.user.set_conversation_stage('awaiting_interview_type')
-            self.bot.say(to_number, "Restarting interview preparation...")
-        elif current_stage.startswith('awaiting_advice'):
-            self.user.set_conversation_stage('awaiting_advice_category')
-            self.bot.say(to_number, "Restarting this section...")
-        else:
-            self.user.set_conversation_stage('onboarded')
-            self.bot.say(to_number, "Returning to the main menu...")
+
+    def handle_command(self, command, user):
+        to_number = user.get_user_number()
+        if command == 'restart':
+            self.restart_conversation(user)
+        elif command in COMMAND_REPLIES:
+            self.bot.say(to_number, COMMAND_REPLIES[command])
+
+    def restart_conversation(self, user):
+        """Tell the user where 'restart' takes them from their current stage."""
+        to_number = user.get_user_number()
+        target = restart_target(user.get_conversation_stage())
+        self.bot.say(to_number, RESTART_MESSAGES[target])
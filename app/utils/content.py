@@ -0,0 +1,108 @@
+import os
+import json
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+
+DATA_DIR = './app/data'
+
+
+def load_messages(path: str = f'{DATA_DIR}/messages.json'):
+    """Load messages from JSON."""
+    with open(path) as f:
+        return json.load(f)  # Return the entire messages dictionary
+
+
+def load_interview_questions(path: str = f'{DATA_DIR}/questions.json'):
+    with open(path) as f:
+        data = json.load(f)
+        # Extract the list of questions
+        return [item['question'] for item in data['behavioral_questions']]
+
+
+def load_prompts(path: str = f'{DATA_DIR}/prompts.json'):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def freeze(value):
+    """Return a read-only copy of parsed JSON (dicts become mapping proxies, lists tuples)."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ContentSnapshot(NamedTuple):
+    """Immutable view of the content files. `version` goes up on every reload."""
+    version: int
+    messages: MappingProxyType
+    interview_questions: tuple
+    prompts: MappingProxyType
+
+
+class ContentStore:
+    """Keeps the parsed content files in memory and reloads them when they change.
+
+    `snapshot()` returns the current ContentSnapshot without copying it. At most
+    once every `check_interval` seconds it compares the files' mtimes and swaps
+    in a new snapshot if one of them changed, so prompts can be edited without
+    a restart. A file that fails to load keeps its last good version.
+    """
+
+    LOADERS = {
+        'messages': ('messages.json', load_messages),
+        'interview_questions': ('questions.json', load_interview_questions),
+        'prompts': ('prompts.json', load_prompts),
+    }
+
+    def __init__(self, data_dir: str = DATA_DIR, check_interval: float = 2.0):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtimes = {}
+        self._next_check = 0.0
+
+        # Nothing to fall back to yet, so the first load has to succeed
+        content = {}
+        for name, (filename, loader) in self.LOADERS.items():
+            path = os.path.join(data_dir, filename)
+            self._mtimes[name] = os.path.getmtime(path)
+            content[name] = freeze(loader(path))
+        self._snapshot = ContentSnapshot(version=1, **content)
+        self._next_check = time.monotonic() + check_interval
+
+    def snapshot(self) -> ContentSnapshot:
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return self._snapshot
+
+    def reload(self, force: bool = False) -> ContentSnapshot:
+        """Reload the files whose mtime changed (or all of them when `force` is set)."""
+        # Another thread is already checking, the current snapshot is good enough
+        if not self._lock.acquire(blocking=force):
+            return self._snapshot
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            changed = {}
+            for name, (filename, loader) in self.LOADERS.items():
+                path = os.path.join(self.data_dir, filename)
+                try:
+                    mtime = os.path.getmtime(path)
+                    if not force and mtime == self._mtimes[name]:
+                        continue
+                    # Remember the mtime even if loading fails, so a broken
+                    # file isn't parsed again until it's saved again
+                    self._mtimes[name] = mtime
+                    changed[name] = freeze(loader(path))
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"Error reloading {filename}, keeping the last good version: {e}")
+
+            if changed:
+                self._snapshot = self._snapshot._replace(version=self._snapshot.version + 1, **changed)
+                print(f"Reloaded content: {', '.join(changed)} (version {self._snapshot.version})")
+            return self._snapshot
+        finally:
+            self._lock.release()
@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+
+USERS_DB_PATH = 'app/data/users.db'
+
+# Applied to every new connection. WAL lets readers run alongside the writer,
+# and with WAL synchronous=NORMAL only fsyncs at checkpoints.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -8000',  # 8 MB page cache
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+
+class ConnectionManager:
+    """Keeps one open SQLite connection per thread and database file.
+
+    sqlite3 connections can't be shared between threads, but a worker thread
+    handles many turns, so each thread reuses its own connection (and its
+    prepared statement cache) instead of connecting for every query.
+    """
+
+    def __init__(self, cached_statements: int = 256):
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def get(self, db_path: str) -> sqlite3.Connection:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        conn = connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(db_path, timeout=5, cached_statements=self.cached_statements)
+            conn.row_factory = sqlite3.Row  # Access columns by name
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            connections[db_path] = conn
+        return conn
+
+    def close(self):
+        """Close the connections opened by the calling thread."""
+        for conn in getattr(self._local, 'connections', {}).values():
+            conn.close()
+        self._local.connections = {}
+
+
+connection_manager = ConnectionManager()
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Return the calling thread's connection to `db_path`."""
+    return connection_manager.get(db_path)
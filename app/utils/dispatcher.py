@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from .executor import KeyedExecutor
+from .rate_limit import TokenBucket
+
+TWILIO_API_URL = 'https://api.twilio.com'
+
+
+class TwilioAPIError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Twilio API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class OutboundDispatcher:
+    """Sends messages through the Twilio Messages API from background threads.
+
+    - Messages wait in a bounded queue; `send` blocks for at most
+      `queue_timeout` seconds when it's full.
+    - Messages to the same recipient go out in the order they were queued.
+    - Each sender number has a token bucket of `rate_per_second`.
+    - 429 and 5xx responses and connection errors are retried with jittered
+      exponential backoff, honouring Retry-After.
+    - All workers share one keep-alive HTTP session.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, base_url: str = TWILIO_API_URL,
+                 num_workers: int = 8, max_queue: int = 1000, queue_timeout: float = 5,
+                 rate_per_second: float = 20, max_retries: int = 4, backoff_base: float = 0.5,
+                 request_timeout: float = 10):
+        self.url = f'{base_url}/2010-04-01/Accounts/{account_sid}/Messages.json'
+        self.rate_per_second = rate_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.request_timeout = request_timeout
+        self.queue_timeout = queue_timeout
+
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=num_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = KeyedExecutor(num_workers=num_workers, name='outbound')
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stats = {'queued': 0, 'sent': 0, 'failed': 0, 'retries': 0}
+
+    def send(self, from_: str, to: str, body: str):
+        """Queue a message and return a Future holding its SID."""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise RuntimeError('Outbound queue is full')
+        self._count('queued')
+        future = self.executor.submit(to, self._deliver, from_, to, body)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        self._slots.release()
+        if future.exception() is not None:
+            self._count('failed')
+            print(f"Error sending message: {future.exception()}")
+        else:
+            self._count('sent')
+
+    def _bucket(self, from_: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(from_)
+            if bucket is None:
+                bucket = self._buckets[from_] = TokenBucket(self.rate_per_second)
+            return bucket
+
+    def _deliver(self, from_: str, to: str, body: str) -> str:
+        bucket = self._bucket(from_)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            retry_after = None
+            try:
+                response = self.session.post(
+                    self.url,
+                    data={'From': from_, 'To': to, 'Body': body},
+                    timeout=self.request_timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = TwilioAPIError(0, str(e))
+            else:
+                if response.status_code < 300:
+                    return response.json()['sid']
+                error = TwilioAPIError(response.status_code, response.text[:200])
+                if response.status_code != 429 and response.status_code < 500:
+                    raise error  # Retrying won't fix a bad request
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt == self.max_retries:
+                raise error
+            self._count('retries')
+            time.sleep(self._backoff(attempt, retry_after))
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        """Full-jitter exponential backoff, at least as long as Retry-After."""
+        delay = random.uniform(0, self.backoff_base * 2 ** attempt)
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['in_flight'] = stats['queued'] - stats['sent'] - stats['failed']
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait)
+        self.session.close()
@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class KeyedExecutor:
+    """Thread pool that runs tasks in order per key and in parallel across keys.
+
+    Tasks submitted with the same key (a user's phone number) never overlap and
+    run in submission order. Tasks for different keys are spread over the
+    worker threads. Only one task per key is ever in the ready queue, so a slow
+    user never blocks a worker while their next turn waits.
+    """
+
+    def __init__(self, num_workers: int = 8, name: str = 'conversation', stats_window: int = 1000):
+        self.num_workers = num_workers
+        self._ready = queue.Queue()
+        self._pending = {}  # key -> deque of tasks waiting behind the running one
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+        # Stats
+        self._queued = 0
+        self._busy = 0
+        self._submitted = 0
+        self._completed = 0
+        self._wait_times = deque(maxlen=stats_window)
+
+        self._threads = []
+        for i in range(num_workers):
+            thread = threading.Thread(target=self._run, name=f'{name}-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        """Schedule `fn(*args, **kwargs)` behind any earlier task with the same key."""
+        future = Future()
+        task = (fn, args, kwargs, future, time.monotonic())
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit to an executor that was shut down')
+            self._submitted += 1
+            self._queued += 1
+            waiting = self._pending.get(key)
+            if waiting is None:
+                # Nothing running for this key, so it's ready right away
+                self._pending[key] = deque()
+                self._ready.put((key, task))
+            else:
+                waiting.append(task)
+        return future
+
+    def _run(self):
+        while True:
+            item = self._ready.get()
+            if item is None:
+                return
+            key, (fn, args, kwargs, future, submitted_at) = item
+
+            with self._lock:
+                self._queued -= 1
+                self._busy += 1
+                self._wait_times.append(time.monotonic() - submitted_at)
+
+            outcome = None
+            if future.set_running_or_notify_cancel():
+                try:
+                    outcome = (fn(*args, **kwargs), None)
+                except BaseException as e:
+                    outcome = (None, e)
+
+            # Counted before the future resolves, so its waiters see it in stats()
+            with self._lock:
+                self._busy -= 1
+                self._completed += 1
+            if outcome is not None:
+                result, error = outcome
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            with self._lock:
+                waiting = self._pending[key]
+                if waiting:
+                    self._ready.put((key, waiting.popleft()))
+                else:
+                    del self._pending[key]
+
+    def stats(self) -> dict:
+        """Queue depth and wait time figures used to size the pool."""
+        with self._lock:
+            wait_times = sorted(self._wait_times)
+            stats = {
+                'workers': self.num_workers,
+                'busy_workers': self._busy,
+                'queue_depth': self._queued,
+                'active_keys': len(self._pending),
+                'submitted': self._submitted,
+                'completed': self._completed,
+            }
+
+        if wait_times:
+            stats['avg_wait_ms'] = round(1000 * sum(wait_times) / len(wait_times), 2)
+            stats['p95_wait_ms'] = round(1000 * wait_times[int(0.95 * (len(wait_times) - 1))], 2)
+            stats['max_wait_ms'] = round(1000 * wait_times[-1], 2)
+        else:
+            stats['avg_wait_ms'] = stats['p95_wait_ms'] = stats['max_wait_ms'] = 0.0
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            self._shutdown = True
+        for _ in self._threads:
+            self._ready.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -1,30 +1,51 @@
-import sqlite3
-import datetime
-from model.bot import Bot
-from utils.user import User
-
-def check_idle_conversations():
-    conn = sqlite3.connect('app/data/users.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    threshold_minutes = 15  # Define your inactivity threshold
-    threshold_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=threshold_minutes)
-
-    cursor.execute(
-        "SELECT phone_number, conversation_stage FROM users WHERE last_interaction < ? AND conversation_stage NOT IN ('initial', 'onboarded')",
-        (threshold_time.strftime('%Y-%m-%d %H:%M:%S.%f'),)
-    )
-    idle_users = cursor.fetchall()
-
-    for user_data in idle_users:
-        phone_number = user_data['phone_number']
-        conversation_stage = user_data['conversation_stage']
-        user = User(phone_number)
-        to_number = user.get_user_number()
-        # Send a thank you message
-        bot = Bot()
-        bot.say(to_number, "Thank you for chatting with us! Seems like we have disconnected. If you need anything else, just send a message.")
-        # Reset conversation stage
-        user.set_conversation_stage('onboarded')
-
-    conn.close()
+import os
+import time
+from app.model.resources import get_resources
+from app.utils.session_store import get_session_store
+
+IDLE_THRESHOLD_MINUTES = 15  # Define your inactivity threshold
+IDLE_CHECK_INTERVAL = 60  # Seconds between sweeps
+
+FAREWELL_MESSAGE = "Thank you for chatting with us! Seems like we have disconnected. If you need anything else, just send a message."
+
+
+def check_idle_conversations(store=None, threshold_minutes: int = IDLE_THRESHOLD_MINUTES, bot=None):
+    """Reset the sessions idle for longer than the threshold and say goodbye.
+
+    Returns the phone numbers that were reset. The session store resets
+    them all at once. The farewells are queued on the background Bot's
+    rate-limited OutboundDispatcher, so the sweep doesn't wait for Twilio.
+    """
+    store = store or get_session_store()
+    threshold_time = int(time.time()) - threshold_minutes * 60
+
+    idle_numbers = store.reset_idle(threshold_time)
+    if not idle_numbers:
+        return idle_numbers
+
+    bot = bot or get_resources().background_bot
+    for phone_number in idle_numbers:
+        # Send a thank you message. The sessions are already reset, so one
+        # failed farewell mustn't stop the others.
+        try:
+            bot.say(phone_number, FAREWELL_MESSAGE)
+        except Exception as e:
+            print(f"Error sending farewell to {phone_number}: {e}")
+    print(f"Reset {len(idle_numbers)} idle conversations")
+    return idle_numbers
+
+
+def schedule_idle_checks(scheduler, interval: float = IDLE_CHECK_INTERVAL, store=None):
+    scheduler.call_every(interval, check_idle_conversations, store)
+
+
+if __name__ == '__main__':
+    # Run the sweep as its own worker process instead of inside the web app
+    from app.utils.scheduler import Scheduler
+
+    get_session_store().migrate()
+    scheduler = Scheduler(name='idle-checker')
+    schedule_idle_checks(scheduler, float(os.getenv('IDLE_CHECK_INTERVAL', IDLE_CHECK_INTERVAL)))
+    scheduler.start()
+    while True:
+        time.sleep(3600)
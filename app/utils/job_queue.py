@@ -0,0 +1,189 @@
+import json
+import sqlite3
+import threading
+import time
+from .db import get_connection
+
+
+class JobQueue:
+    """Durable SQLite-backed queue for inbound webhook messages.
+
+    A claimed job stays invisible to other workers for `visibility_timeout`
+    seconds. If the worker doesn't ack it in that time (crash, hang) the job
+    becomes visible again and is retried, up to `max_attempts` times.
+    """
+
+    def __init__(self, db_path: str = 'app/data/jobs.db', visibility_timeout: float = 120, max_attempts: int = 5):
+        self.db_path: str = db_path
+        self.visibility_timeout: float = visibility_timeout
+        self.max_attempts: int = max_attempts
+
+        # Ensure the table exists
+        self._create_jobs_table()
+
+    def _connect(self):
+        return get_connection(self.db_path)
+
+    def _create_jobs_table(self):
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                message_sid TEXT UNIQUE,
+                                payload TEXT NOT NULL,
+                                status TEXT NOT NULL DEFAULT 'pending',
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                visible_at REAL NOT NULL,
+                                last_error TEXT DEFAULT NULL,
+                                created_at REAL NOT NULL
+                            );''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (status, visible_at)")
+
+    def enqueue(self, payload: dict, message_sid: str = None):
+        """Store a job and return its id.
+
+        Twilio retries a webhook it thinks has timed out, so jobs carrying an
+        already seen `message_sid` are ignored and None is returned.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (message_sid, payload, visible_at, created_at) VALUES (?, ?, ?, ?)",
+                (message_sid, json.dumps(payload), now, now)
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def claim(self):
+        """Claim the oldest visible job, or return None if there is nothing to do."""
+        now = time.time()
+        with self._connect() as conn:
+            # A job that used up its attempts without calling fail() crashed or
+            # hung its worker. Give up on it instead of handing it out forever.
+            cursor = conn.execute(
+                """UPDATE jobs SET status = 'dead', last_error = coalesce(last_error, 'visibility timeout expired')
+                   WHERE status = 'pending' AND visible_at <= ? AND attempts >= ?""",
+                (now, self.max_attempts)
+            )
+            if cursor.rowcount:
+                print(f"Gave up on {cursor.rowcount} jobs that never finished")
+            row = conn.execute(
+                """UPDATE jobs SET attempts = attempts + 1, visible_at = ?
+                   WHERE id = (SELECT id FROM jobs WHERE status = 'pending' AND visible_at <= ? AND attempts < ?
+                               ORDER BY id LIMIT 1)
+                   RETURNING id, payload, attempts""",
+                (now + self.visibility_timeout, now, self.max_attempts)
+            ).fetchone()
+
+        if row is None:
+            return None
+        return {'id': row['id'], 'payload': json.loads(row['payload']), 'attempts': row['attempts']}
+
+    def extend(self, job_ids: list):
+        """Keep jobs that are still being processed invisible for another visibility timeout."""
+        if not job_ids:
+            return
+        placeholders = ', '.join('?' * len(job_ids))
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET visible_at = ? WHERE status = 'pending' AND id IN ({placeholders})",
+                (time.time() + self.visibility_timeout, *job_ids)
+            )
+
+    def ack(self, job_id: int):
+        """Remove a job that was processed successfully."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def fail(self, job_id: int, attempts: int, error: str):
+        """Schedule a failed job for retry with exponential backoff, or mark it dead."""
+        with self._connect() as conn:
+            if attempts >= self.max_attempts:
+                conn.execute("UPDATE jobs SET status = 'dead', last_error = ? WHERE id = ?", (error, job_id))
+                print(f"Job {job_id} failed {attempts} times, giving up: {error}")
+            else:
+                retry_at = time.time() + min(2 ** attempts, 60)
+                conn.execute("UPDATE jobs SET visible_at = ?, last_error = ? WHERE id = ?", (retry_at, error, job_id))
+
+    def pending_count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+
+class JobWorkerPool:
+    """Claims jobs from a JobQueue and runs `handler` on their payload.
+
+    Jobs are handed to a KeyedExecutor keyed by the sender's number, so one
+    user's messages are processed in order while different users run in
+    parallel. At most `max_in_flight` jobs are claimed at once, so claimed
+    jobs don't sit in the executor long enough to hit their visibility timeout.
+    While a job runs, its visibility is extended every half timeout, so a
+    slow turn isn't handed to a second worker.
+    """
+
+    def __init__(self, job_queue: JobQueue, handler, executor, max_in_flight: int = 16, poll_interval: float = 0.5):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.executor = executor
+        self.poll_interval = poll_interval
+        self._slots = threading.Semaphore(max_in_flight)
+        self._in_flight = {}  # job id -> time.monotonic() of the last claim or extension
+        self._in_flight_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='job-dispatcher', daemon=True)
+        self._thread.start()
+        print(f'Started job dispatcher on {self.executor.num_workers} workers')
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _extend_in_flight(self):
+        now = time.monotonic()
+        with self._in_flight_lock:
+            due = [job_id for job_id, extended_at in self._in_flight.items()
+                   if now - extended_at >= self.job_queue.visibility_timeout / 2]
+            for job_id in due:
+                self._in_flight[job_id] = now
+        try:
+            self.job_queue.extend(due)
+        except sqlite3.Error as e:
+            print(f"Error extending jobs: {e}")
+
+    def _done(self, job_id):
+        with self._in_flight_lock:
+            self._in_flight.pop(job_id, None)
+        self._slots.release()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._extend_in_flight()
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+
+            try:
+                job = self.job_queue.claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                self._slots.release()
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            with self._in_flight_lock:
+                self._in_flight[job['id']] = time.monotonic()
+            future = self.executor.submit(job['payload'].get('From'), self._process, job)
+            future.add_done_callback(lambda _, job_id=job['id']: self._done(job_id))
+
+    def _process(self, job):
+        try:
+            self.handler(job['payload'])
+        except Exception as e:
+            print(f"Error processing job {job['id']}: {e}")
+            self.job_queue.fail(job['id'], job['attempts'], str(e))
+        else:
+            self.job_queue.ack(job['id'])
@@ -0,0 +1,35 @@
+import threading
+from collections import deque
+
+
+class LatencyWindow:
+    """The last `size` durations of something, summarised for /stats."""
+
+    def __init__(self, size: int = 1000):
+        self._durations = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._durations.append(seconds)
+
+    def percentile(self, fraction: float, min_count: int = 1):
+        """The given percentile in seconds, or None with fewer than `min_count` durations."""
+        with self._lock:
+            if len(self._durations) < max(min_count, 1):
+                return None
+            durations = sorted(self._durations)
+        return durations[int(fraction * (len(durations) - 1))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            durations = sorted(self._durations)
+        if not durations:
+            return {'count': 0, 'avg_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': len(durations),
+            'avg_ms': round(1000 * sum(durations) / len(durations), 2),
+            'p50_ms': round(1000 * durations[(len(durations) - 1) // 2], 2),
+            'p95_ms': round(1000 * durations[int(0.95 * (len(durations) - 1))], 2),
+            'max_ms': round(1000 * durations[-1], 2),
+        }
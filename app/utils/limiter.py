@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from .latency import LatencyWindow
+from .rate_limit import TokenBucket
+
+# Request priorities, most urgent first
+INTERACTIVE = 0  # A user is waiting for the answer
+PREFETCH = 1  # Prepared ahead of time: adapted questions, advice pools, speculation
+OFFLINE = 2  # Batch work such as data augmentation
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', PREFETCH: 'prefetch', OFFLINE: 'offline'}
+
+_priority = threading.local()
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Model requests made by this thread inside the block get `priority`."""
+    previous = getattr(_priority, 'value', INTERACTIVE)
+    _priority.value = priority
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+
+def current_priority() -> int:
+    return getattr(_priority, 'value', INTERACTIVE)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, 'status_code', None) == 429
+
+
+class LimiterTimeout(Exception):
+    pass
+
+
+class AdaptiveLimiter:
+    """Bounds the model requests in flight and the tokens they use per minute.
+
+    The concurrency limit adapts (AIMD): it grows by one for every `limit`
+    requests that succeed within `target_latency`, and halves on a 429 or
+    shrinks by a tenth on a slow answer, at most once per `cooldown`
+    seconds. A token bucket holds `tokens_per_minute`, and each request
+    takes its estimated tokens before it's sent.
+
+    Requests that can't go yet wait in a queue ordered by priority, so a
+    user's turn goes ahead of prefetching and offline work.
+    """
+
+    def __init__(self, initial_limit: float = 8, min_limit: float = 1, max_limit: float = 32,
+                 tokens_per_minute: float = 200_000, target_latency: float = 10.0, cooldown: float = 1.0,
+                 queue_timeout: float = 60.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.queue_timeout = queue_timeout
+        self.tokens_per_minute = tokens_per_minute
+        self._bucket = TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute)
+        self._queue = []  # Heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._waits = {priority: LatencyWindow() for priority in PRIORITY_NAMES}
+        self._stats = {'requests': 0, 'rate_limited': 0, 'slow': 0, 'timeouts': 0}
+
+    @contextmanager
+    def slot(self, tokens: int, priority: int = None, measure_latency: bool = True):
+        """Hold a request slot for the block. A 429 raised inside it lowers the limit."""
+        self.acquire(tokens, priority)
+        start = time.monotonic()
+        rate_limited = False
+        try:
+            yield
+        except Exception as e:
+            rate_limited = is_rate_limited(e)
+            raise
+        finally:
+            self.release(time.monotonic() - start if measure_latency else None, rate_limited)
+
+    def acquire(self, tokens: int, priority: int = None):
+        """Wait for a slot and `tokens`. Raises LimiterTimeout after `queue_timeout` seconds."""
+        priority = current_priority() if priority is None else priority
+        entry = (priority, next(self._sequence))
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    wait = deadline - time.monotonic()
+                    if self._queue[0] == entry and self._in_flight < int(self.limit):
+                        # Next in line with a free slot, so only the token budget can hold it back
+                        tokens_wait = self._bucket.try_acquire(min(tokens, self.tokens_per_minute))
+                        if not tokens_wait:
+                            break
+                        wait = min(wait, tokens_wait)
+                    if wait <= 0:
+                        self._stats['timeouts'] += 1
+                        raise LimiterTimeout(f'No model request slot within {self.queue_timeout} s')
+                    self._condition.wait(wait)
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                # Whoever is next in line now has to check for itself
+                self._condition.notify_all()
+            self._in_flight += 1
+            self._stats['requests'] += 1
+        self._waits[priority].add(time.monotonic() - start)
+
+    def release(self, latency: float = None, rate_limited: bool = False):
+        """Give the slot back. `latency` is how long the request took, None to not judge it."""
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            slow = latency is not None and latency > self.target_latency
+            if rate_limited or slow:
+                self._stats['rate_limited' if rate_limited else 'slow'] += 1
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * (0.5 if rate_limited else 0.9))
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'limit': round(self.limit, 2),
+                'in_flight': self._in_flight,
+                'queued': len(self._queue),
+            })
+        stats['wait'] = {name: self._waits[priority].stats() for priority, name in PRIORITY_NAMES.items()}
+        return stats
@@ -0,0 +1,181 @@
+"""Versioned schema migrations for the users database.
+
+Each migration is a function taking an open connection. The number of
+migrations applied so far is stored in `PRAGMA user_version`, so `migrate`
+only runs the steps a database hasn't seen yet. Add new steps to the end of
+MIGRATIONS and never change one that has shipped.
+"""
+from .db import get_connection, USERS_DB_PATH
+from .stages import STAGE_CODES
+
+USER_COLUMNS = [
+    ('name', 'TEXT', 'NULL'),
+    ('conversation_stage', 'TEXT', "'initial'"),
+    ('last_advice', 'TEXT', 'NULL'),
+    ('last_interaction', 'TIMESTAMP', 'CURRENT_TIMESTAMP'),
+    ('interview_type', 'TEXT', 'NULL'),
+    ('interview_role', 'TEXT', 'NULL'),
+    ('last_interview_question', 'TEXT', 'NULL'),
+    ('last_adapted_question', 'TEXT', 'NULL'),
+    ('interview_response', 'TEXT', 'NULL'),
+    ('last_follow_up_question', 'TEXT', 'NULL'),
+    ('follow_up_response', 'TEXT', 'NULL'),
+]
+
+
+def create_users_table(conn):
+    """Create the users table, or bring a table from before migrations up to date."""
+    columns = ''.join(f",\n                        {name} {data_type} DEFAULT {default}" for name, data_type, default in USER_COLUMNS)
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        phone_number TEXT UNIQUE NOT NULL{columns}
+                    );''')
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+    for column_name, data_type, default_value in USER_COLUMNS:
+        if column_name in existing:
+            continue
+        # ALTER TABLE can't add a column with a non-constant default
+        if default_value == 'CURRENT_TIMESTAMP':
+            default_value = 'NULL'
+        conn.execute(f"ALTER TABLE users ADD COLUMN {column_name} {data_type} DEFAULT {default_value}")
+
+
+def add_user_version(conn):
+    """Row version, bumped on every write, used to keep the user cache consistent."""
+    conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def last_interaction_epoch(conn):
+    """Store last_interaction as integer epoch seconds and index idle sessions.
+
+    The partial index only holds users in the middle of a conversation, so
+    the idle sweep is a range scan over them, and it covers the columns the
+    sweep reads. Its WHERE clause has to match the one in idle_chat_checker
+    for SQLite to use it.
+    """
+    conn.execute(
+        "UPDATE users SET last_interaction = CAST(strftime('%s', last_interaction) AS INTEGER) "
+        "WHERE typeof(last_interaction) = 'text'"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_idle ON users (last_interaction, conversation_stage, phone_number) "
+        "WHERE conversation_stage NOT IN ('initial', 'onboarded')"
+    )
+
+
+def last_interaction_not_null(conn):
+    """Backfill a missing last_interaction and stop new rows from leaving it empty.
+
+    `NULL < ?` is never true, so users without a last_interaction were
+    never swept. They count as active from now on. SQLite can't change a
+    column's default in place, so the table is rebuilt with an integer
+    default and NOT NULL on last_interaction.
+    """
+    conn.execute(
+        "UPDATE users SET last_interaction = CAST(strftime('%s', 'now') AS INTEGER) "
+        "WHERE last_interaction IS NULL OR typeof(last_interaction) != 'integer'"
+    )
+
+    column_types = {name: f"{data_type} DEFAULT {default}" for name, data_type, default in USER_COLUMNS}
+    column_types['last_interaction'] = "INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))"
+    column_types['version'] = "INTEGER NOT NULL DEFAULT 0"
+    existing = [row['name'] for row in conn.execute("PRAGMA table_info(users)")
+                if row['name'] not in ('id', 'phone_number')]
+    # Keep any column a database from before migrations might have as well
+    columns = ''.join(f",\n                        {name} {column_types.get(name, '')}" for name in existing)
+    conn.execute(f'''CREATE TABLE users_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        phone_number TEXT UNIQUE NOT NULL{columns}
+                    );''')
+    copied = ', '.join(['id', 'phone_number'] + existing)
+    conn.execute(f"INSERT INTO users_new ({copied}) SELECT {copied} FROM users")
+    conn.execute("DROP TABLE users")
+    conn.execute("ALTER TABLE users_new RENAME TO users")
+    conn.execute(
+        "CREATE INDEX idx_users_idle ON users (last_interaction, conversation_stage, phone_number) "
+        "WHERE conversation_stage NOT IN ('initial', 'onboarded')"
+    )
+
+
+def add_advice_category(conn):
+    """Category of the last advice, which keys the follow-up answer cache."""
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+    if 'advice_category' not in existing:
+        conn.execute("ALTER TABLE users ADD COLUMN advice_category TEXT DEFAULT NULL")
+
+
+def conversation_stage_codes(conn):
+    """Store conversation_stage as the stage's small integer code (see stages.py).
+
+    The table is rebuilt with an INTEGER column, as a TEXT column would
+    turn the codes back into text. A stage name we don't know becomes 0,
+    'unknown'. The idle index is rebuilt with the codes of 'initial' and
+    'onboarded', matching RESET_IDLE_USERS in session_store.py.
+    """
+    columns, copied, selected = [], [], []
+    for row in conn.execute("PRAGMA table_info(users)"):
+        name = row['name']
+        copied.append(name)
+        if name in ('id', 'phone_number'):
+            selected.append(name)
+            continue
+        if name == 'conversation_stage':
+            columns.append(f"{name} INTEGER NOT NULL DEFAULT {STAGE_CODES['initial']}")
+            cases = ' '.join(f"WHEN '{stage}' THEN {code}" for stage, code in STAGE_CODES.items())
+            selected.append(f"CASE WHEN typeof({name}) = 'integer' THEN {name} "
+                            f"WHEN {name} GLOB '[0-9]*' THEN CAST({name} AS INTEGER) "
+                            f"ELSE CASE {name} {cases} ELSE 0 END END")
+            continue
+        not_null = ' NOT NULL' if row['notnull'] else ''
+        default = f" DEFAULT ({row['dflt_value']})" if row['dflt_value'] is not None else ''
+        columns.append(f"{name} {row['type']}{not_null}{default}")
+        selected.append(name)
+
+    column_definitions = ''.join(f",\n                        {column}" for column in columns)
+    conn.execute(f'''CREATE TABLE users_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        phone_number TEXT UNIQUE NOT NULL{column_definitions}
+                    );''')
+    conn.execute(f"INSERT INTO users_new ({', '.join(copied)}) SELECT {', '.join(selected)} FROM users")
+    conn.execute("DROP TABLE users")
+    conn.execute("ALTER TABLE users_new RENAME TO users")
+    conn.execute(
+        "CREATE INDEX idx_users_idle ON users (last_interaction, conversation_stage, phone_number) "
+        f"WHERE conversation_stage NOT IN ({STAGE_CODES['initial']}, {STAGE_CODES['onboarded']})"
+    )
+
+
+MIGRATIONS = [
+    create_users_table,
+    add_user_version,
+    last_interaction_epoch,
+    last_interaction_not_null,
+    add_advice_category,
+    conversation_stage_codes,
+]
+
+
+def schema_version(db_path: str = USERS_DB_PATH) -> int:
+    return get_connection(db_path).execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path: str = USERS_DB_PATH) -> int:
+    """Apply the pending migrations and return the schema version.
+
+    Runs in one write transaction, so processes starting at the same time
+    wait for each other instead of applying a step twice.
+    """
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for step in MIGRATIONS[version:]:
+            step(conn)
+            version += 1
+            print(f"Applied migration {version}: {step.__name__}")
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
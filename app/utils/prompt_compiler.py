@@ -0,0 +1,162 @@
+import hashlib
+import re
+import threading
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import NamedTuple
+
+# Appended to every advice prompt
+ADVICE_FORMAT = (
+    "1. Please provide the advice in clear, concise bullet points suitable for a WhatsApp message. "
+    "2.1 Please use emojis to give advice better in this case, either by using it in bullets or heading."
+    "2.2 Format your output in bullet points and headings."
+    "3. Use whatsapp formatting to ensure the advice looks professional and easy to read."
+    "4. Give advice in sections."
+    "5. The advice should be concise and less than 200 words. or 15 lines of content"
+    "6. Avoid using Markdown or HTML formatting. Make the advice engaging and easy to read. Can also add emojis that make it look more professional."
+    "7. The final message will be sent to the user and it should be displayed to just show the infomation rather you acknowledging these prompts"
+)
+
+# Appended to the feedback prompt
+FEEDBACK_FORMAT = (
+    "1. Please provide the advice in clear, concise bullet points suitable for a WhatsApp message. "
+    "2.1 Please use emojis to give advice better in this case, either by using it in bullets or heading."
+    "2.2 Format your output in bullet points and headings."
+    "3. Use whatsapp formatting to ensure the advice looks professional and easy to read."
+    "4. Give advice in sections."
+    "5. The advice should be concise and less than 200 words."
+    "6. Avoid using Markdown or HTML formatting. Make the advice engaging and easy to read. Can also add emojis that make it look more professional."
+    "7. The final message will be sent to the user and it should be displayed to just show the infomation rather you acknowledging these prompts"
+)
+
+# Words, and every other non-space character on its own, roughly like BPE tokens
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+TRUNCATION_MARK = ' […] '
+
+
+def _weight(piece: str) -> int:
+    # Long words are split into several tokens
+    return 1 + len(piece) // 8
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """Estimate of the tokens in `text`, without a tokenizer. Cached, as prompts repeat."""
+    return sum(_weight(piece) for piece in TOKEN_PATTERN.findall(text))
+
+
+def truncate(text: str, budget: int) -> str:
+    """Shorten `text` to about `budget` tokens, keeping its start and its end."""
+    if count_tokens(text) <= budget:
+        return text
+    pieces = list(TOKEN_PATTERN.finditer(text))
+    head_budget = budget * 2 // 3
+    tail_budget = budget - head_budget
+
+    used, head_end = 0, 0
+    for piece in pieces:
+        used += _weight(piece.group())
+        if used > head_budget:
+            break
+        head_end = piece.end()
+    used, tail_start = 0, len(text)
+    for piece in reversed(pieces):
+        used += _weight(piece.group())
+        if used > tail_budget:
+            break
+        tail_start = piece.start()
+    return text[:head_end].rstrip() + TRUNCATION_MARK + text[tail_start:].lstrip()
+
+
+class SystemPrompt(NamedTuple):
+    text: str
+    tokens: int
+    key: str  # Short hash of the text, changes when the prompt is edited
+
+
+def system_prompt(text: str) -> SystemPrompt:
+    return SystemPrompt(text, count_tokens(text), hashlib.sha1(text.encode('utf-8')).hexdigest()[:12])
+
+
+class CompiledPrompts(NamedTuple):
+    """The system prompts of one content version, built once."""
+    version: int
+    advice: MappingProxyType  # category -> SystemPrompt
+    feedback: SystemPrompt
+
+
+class PromptCompiler:
+    """Builds the system prompts once per content version and keeps prompts bounded.
+
+    `compiled()` returns the advice and feedback prompts with their
+    formatting instructions already appended, rebuilt only when the
+    ContentStore's version changes. `fit` truncates a user's text to
+    `answer_budget` tokens before it goes into a prompt. `record` keeps
+    the prompt size of each request per task, for /stats.
+    """
+
+    def __init__(self, content, answer_budget: int = 300, stats_window: int = 1000):
+        self.content = content
+        self.answer_budget = answer_budget
+        self._compiled = None
+        self._lock = threading.Lock()
+        self._stats_window = stats_window
+        self._tokens = {}  # task -> deque of prompt tokens per request
+        self._truncated = 0
+
+    def compiled(self) -> CompiledPrompts:
+        snapshot = self.content.snapshot()
+        compiled = self._compiled
+        if compiled is None or compiled.version != snapshot.version:
+            compiled = self._compile(snapshot)
+            with self._lock:
+                self._compiled = compiled
+        return compiled
+
+    @staticmethod
+    def _compile(snapshot) -> CompiledPrompts:
+        prompts = snapshot.prompts
+        advice = {category: system_prompt(entry.get('prompt', '') + ADVICE_FORMAT)
+                  for category, entry in prompts['advice_prompts'].items() if entry.get('prompt')}
+        feedback = system_prompt(prompts['interview_prompts']['feedback_prompt']['prompt'] + FEEDBACK_FORMAT)
+        return CompiledPrompts(snapshot.version, MappingProxyType(advice), feedback)
+
+    def fit(self, text: str) -> str:
+        """`text` cut down to the answer budget."""
+        if not text:
+            return text
+        fitted = truncate(text, self.answer_budget)
+        if fitted is not text:
+            with self._lock:
+                self._truncated += 1
+        return fitted
+
+    @staticmethod
+    def count_messages(messages) -> int:
+        # A few tokens of overhead per message for the role and separators
+        return sum(count_tokens(message['content']) + 4 for message in messages)
+
+    def record(self, task: str, messages) -> int:
+        """Note the prompt size of a request. Returns its tokens."""
+        tokens = self.count_messages(messages)
+        with self._lock:
+            window = self._tokens.get(task)
+            if window is None:
+                window = self._tokens[task] = deque(maxlen=self._stats_window)
+            window.append(tokens)
+        return tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            windows = {task: sorted(window) for task, window in self._tokens.items()}
+            truncated = self._truncated
+        stats = {'truncated_inputs': truncated, 'answer_budget': self.answer_budget, 'prompt_tokens': {}}
+        for task, tokens in windows.items():
+            stats['prompt_tokens'][task] = {
+                'requests': len(tokens),
+                'avg': round(sum(tokens) / len(tokens), 1),
+                'p95': tokens[int(0.95 * (len(tokens) - 1))],
+                'max': tokens[-1],
+            }
+        return stats
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+def normalize_role(role: str) -> str:
+    """'  Software-Engineer ' and 'software engineer' are the same role."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', role.lower()).split())
+
+
+def question_id(question: str) -> str:
+    """Stable id of a question. An edited question gets a new one."""
+    return hashlib.sha1(question.encode('utf-8')).hexdigest()[:10]
+
+
+class AdaptedQuestionStore:
+    """Interview questions adapted to an interview type and role.
+
+    Entries are keyed by (interview type, normalized role, question id).
+    `prefetch` adapts all the questions of a role in the background as
+    soon as the role is known, so asking a question is usually a lookup.
+    At most `max_entries` are kept and the least recently used go first.
+
+    `save` writes the questions of the `warm_roles` most requested roles
+    to `path`, and a restarted process loads them back.
+    """
+
+    def __init__(self, path: str = 'app/data/adapted_questions.json', max_entries: int = 5000,
+                 warm_roles: int = 50, workers: int = 2):
+        self.path = path
+        self.max_entries = max_entries
+        self.warm_roles = warm_roles
+        self._entries = OrderedDict()  # (type, role, question id) -> adapted text
+        self._in_flight = {}  # key -> Future of the adaptation being generated
+        self._popularity = Counter()  # (type, role) -> times the role was chosen
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One writer of the temporary file at a time
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='question-prefetch')
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load()
+
+    @staticmethod
+    def key(interview_type: str, role: str, question: str) -> tuple:
+        return (interview_type.lower(), normalize_role(role), question_id(question))
+
+    def ready(self, interview_type: str, role: str, questions) -> list:
+        """The questions that have an adapted version ready."""
+        with self._lock:
+            return [question for question in questions if self.key(interview_type, role, question) in self._entries]
+
+    def get_or_adapt(self, interview_type: str, role: str, question: str, adapt, timeout: float):
+        """Return the adapted question, waiting up to `timeout` seconds for it.
+
+        `adapt(question)` generates it if nobody is already doing so. After
+        a timeout (or an error) this returns None, but the adaptation still
+        lands in the store for the next time.
+        """
+        key = self.key(interview_type, role, question)
+        with self._lock:
+            adapted = self._entries.get(key)
+            if adapted is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return adapted
+            self._misses += 1
+            future = self._submit(key, question, adapt)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            return None
+        except Exception as e:
+            print(f"Error adapting question for {key[0]} {key[1]}: {e}")
+            return None
+
+    def prefetch(self, interview_type: str, role: str, questions, adapt):
+        """Adapt every question for this role in the background."""
+        keys = [(self.key(interview_type, role, question), question) for question in questions]
+        with self._lock:
+            self._popularity[(interview_type.lower(), normalize_role(role))] += 1
+            futures = [self._submit(key, question, adapt) for key, question in keys if key not in self._entries]
+        if futures:
+            # Save once the whole role is done
+            remaining = [len(futures)]
+            def done(_):
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    self.save()
+            for future in futures:
+                future.add_done_callback(done)
+        return futures
+
+    def _submit(self, key, question, adapt):
+        # Called with the lock held
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._in_flight[key] = self._executor.submit(self._adapt, key, question, adapt)
+        return future
+
+    def _adapt(self, key, question, adapt):
+        try:
+            adapted = adapt(question)
+            self._add(key, adapted)
+            return adapted
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _add(self, key, adapted):
+        with self._lock:
+            self._entries[key] = adapted
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._popularity = Counter({tuple(role.split('|', 1)): count for role, count in data['roles'].items()})
+            for key, adapted in data['questions'].items():
+                interview_type, role, qid = key.split('|')
+                self._entries[(interview_type, role, qid)] = adapted
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable adapted questions {self.path}: {e}")
+
+    def save(self):
+        """Write the questions of the most requested roles to `path`."""
+        if not self.path:
+            return
+        with self._lock:
+            warm = {role for role, _ in self._popularity.most_common(self.warm_roles)}
+            data = {
+                # A few more counts than roles, so a rising role can take over
+                'roles': {'|'.join(role): count for role, count in self._popularity.most_common(4 * self.warm_roles)},
+                'questions': {'|'.join(key): adapted for key, adapted in self._entries.items() if key[:2] in warm},
+            }
+        # Write a temporary file first, so a crash never leaves half a file behind
+        tmp_path = f'{self.path}.tmp'
+        with self._save_lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def wait_for_prefetch(self):
+        """Block until the adaptations scheduled so far are done (for tests and benchmarks)."""
+        while True:
+            with self._lock:
+                futures = list(self._in_flight.values())
+            if not futures:
+                return
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'roles': len({key[:2] for key in self._entries}),
+                'in_flight': len(self._in_flight),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
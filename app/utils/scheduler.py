@@ -0,0 +1,72 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class Scheduler:
+    """Runs functions at a deadline or periodically on one background thread.
+
+    Pending calls sit in a heap keyed by deadline, so the thread sleeps
+    until the earliest one is due however many tasks are scheduled.
+    """
+
+    def __init__(self, name: str = 'scheduler'):
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()  # Tie-breaker for equal deadlines
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def call_later(self, delay: float, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` once after `delay` seconds."""
+        self._push(time.monotonic() + delay, None, fn, args, kwargs)
+
+    def call_every(self, interval: float, fn, *args, first_delay: float = None, **kwargs):
+        """Run `fn(*args, **kwargs)` every `interval` seconds, the first time after `first_delay`."""
+        delay = interval if first_delay is None else first_delay
+        self._push(time.monotonic() + delay, interval, fn, args, kwargs)
+
+    def _push(self, deadline, interval, fn, args, kwargs):
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._counter), interval, fn, args, kwargs))
+            # Wake the thread in case this is now the earliest deadline
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+                if self._stopped:
+                    return
+                deadline, _, interval, fn, args, kwargs = heapq.heappop(self._heap)
+
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Error in scheduled task {getattr(fn, '__name__', fn)}: {e}")
+
+            if interval is not None:
+                # Keep the period fixed, but don't try to catch up on missed runs
+                self._push(max(deadline + interval, time.monotonic()), interval, fn, args, kwargs)
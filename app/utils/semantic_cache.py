@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+# Words that flip or pin down the meaning of a question while hardly
+# changing its n-grams. Two questions only match if they have the same ones.
+GUARD_WORDS = frozenset(['not', 'no', 'never', 'dont', 'don', 'doesn', 'isn', 'shouldn', 'without', 'avoid'])
+
+
+class HashingVectorizer:
+    """Turns short texts into unit vectors without any model or network.
+
+    Character n-grams and words are hashed into `dim` buckets, so similar
+    wordings ("how long should my answer be" and "how long should answers
+    be?") end up with a high cosine similarity.
+    """
+
+    def __init__(self, dim: int = 1024, ngram_sizes=(3, 4, 5)):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(re.sub(r"[^\w\s]", ' ', text.lower()).split())
+
+    def guard_terms(self, text: str) -> frozenset:
+        """Negations and numbers in `text`, see GUARD_WORDS."""
+        return frozenset(word for word in self.normalize(text).split() if word in GUARD_WORDS or word.isdigit())
+
+    def features(self, text: str):
+        text = self.normalize(text)
+        yield from text.split()
+        padded = f' {text} '
+        for n in self.ngram_sizes:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+
+    def vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            # The sign bit keeps colliding features from only adding up
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _Partition:
+    """Vectors and answers of one key, preallocated to `max_entries` rows."""
+
+    def __init__(self, max_entries: int, dim: int):
+        self.vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self.answers = [None] * max_entries
+        self.guards = [None] * max_entries
+        self.costs = [0.0] * max_entries  # Seconds it took to generate each answer
+        self.last_used = np.zeros(max_entries, dtype=np.float64)
+        self.size = 0
+
+
+class SemanticCache:
+    """Answers to free-text questions, found again for similar questions.
+
+    Questions are embedded with a HashingVectorizer and kept in one NumPy
+    matrix per key (the advice category), so a lookup is a single
+    matrix-vector product. A question gets the stored answer of a question
+    with a cosine similarity of at least `threshold` and the same negations
+    and numbers. Each key holds at most `max_entries` answers and replaces
+    the least recently used one when full.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 256, dim: int = 1024):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vectorizer = HashingVectorizer(dim)
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._seconds_saved = 0.0
+
+    def lookup(self, key: str, question: str):
+        """Return the cached answer to a question like `question`, or None."""
+        vector = self.vectorizer.vector(question)
+        guard = self.vectorizer.guard_terms(question)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is not None and partition.size:
+                similarities = partition.vectors[:partition.size] @ vector
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                for slot in candidates[np.argsort(-similarities[candidates])]:
+                    if partition.guards[slot] == guard:
+                        partition.last_used[slot] = time.monotonic()
+                        self._hits += 1
+                        self._seconds_saved += partition.costs[slot]
+                        return partition.answers[slot]
+            self._misses += 1
+            return None
+
+    def store(self, key: str, question: str, answer: str, cost: float = 0.0):
+        """Remember `answer` to `question`. `cost` is how long generating it took."""
+        vector = self.vectorizer.vector(question)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(self.max_entries, self.vectorizer.dim)
+            if partition.size < self.max_entries:
+                slot = partition.size
+                partition.size += 1
+            else:
+                slot = int(np.argmin(partition.last_used))
+                self._evictions += 1
+            partition.vectors[slot] = vector
+            partition.answers[slot] = answer
+            partition.guards[slot] = self.vectorizer.guard_terms(question)
+            partition.costs[slot] = cost
+            partition.last_used[slot] = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': sum(partition.size for partition in self._partitions.values()),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions,
+                'seconds_saved': round(self._seconds_saved, 3),
+            }
@@ -0,0 +1,275 @@
+"""Where User keeps the conversation state of each user.
+
+A SessionStore loads, creates and writes user records (plain dicts with
+the columns of the users table) and resets idle sessions. Three engines
+are available, chosen with the SESSION_STORE environment variable:
+
+- 'sqlite' (default): app/data/users.db, with the process-wide user cache
+- 'memory': in-process dicts, for tests and single-node deployments
+- 'sharded': SESSION_SHARDS SQLite files in SESSION_SHARD_DIR, so users
+  on different shards don't wait for each other's write lock
+
+Every record carries a `version` that goes up on each write. `write` is
+given the record the caller started from, so it can tell when someone
+else changed the row in the meantime.
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from .db import get_connection, USERS_DB_PATH
+from .migrations import USER_COLUMNS, migrate
+from .stages import Stage
+from .user_cache import user_cache
+
+# Resets every idle session in one statement and returns who was reset.
+# Two processes sweeping at once can't both claim the same user. The stage
+# filter has to match the WHERE clause of idx_users_idle (see migrations.py).
+RESET_IDLE_USERS = (
+    f"UPDATE users SET conversation_stage = {Stage.ONBOARDED:d}, version = version + 1 "
+    f"WHERE conversation_stage NOT IN ({Stage.INITIAL:d}, {Stage.ONBOARDED:d}) AND last_interaction < ? "
+    "RETURNING phone_number"
+)
+
+# Stages outside of a conversation, which the idle sweep leaves alone
+SETTLED_STAGES = (Stage.INITIAL, Stage.ONBOARDED)
+
+
+class SessionStore(ABC):
+    """Interface of the session engines."""
+
+    def migrate(self):
+        """Prepare the storage, called once at startup."""
+
+    @abstractmethod
+    def load(self, phone_number: str, validate: bool = False):
+        """Return the user's record, possibly from a cache, or None.
+
+        With `validate`, a cached record is first checked against the
+        storage, so changes made by other processes are seen. User does
+        this once per turn.
+        """
+
+    def fetch(self, phone_number: str):
+        """Return the user's record from the storage itself, or None."""
+        return self.load(phone_number, validate=True)
+
+    @abstractmethod
+    def create(self, phone_number: str) -> bool:
+        """Add a new user. Returns False if the user already exists."""
+
+    @abstractmethod
+    def write(self, phone_number: str, fields: dict, record: dict) -> dict:
+        """Write `fields` and return the record as stored now.
+
+        `record` is the caller's copy with `fields` applied, at the version
+        it was read. If the stored row has moved on, `fields` are still
+        written and the returned record has the other changes too.
+        """
+
+    @abstractmethod
+    def reset_idle(self, before: int) -> list:
+        """Move the users inactive since before `before` (epoch seconds) back to Stage.ONBOARDED.
+
+        Returns their phone numbers.
+        """
+
+
+class SQLiteSessionStore(SessionStore):
+    """The users table of one SQLite file, read through the user cache."""
+
+    def __init__(self, db_path: str = USERS_DB_PATH, cache=user_cache):
+        self.db_path: str = db_path
+        self.cache = cache
+
+    def _connect(self):
+        # Pooled per thread, so it must not be closed after use
+        return get_connection(self.db_path)
+
+    def migrate(self):
+        migrate(self.db_path)
+
+    def load(self, phone_number: str, validate: bool = False):
+        record = self.cache.get(self.db_path, phone_number)
+        if record is not None and validate:
+            # Much cheaper than reading the row, and enough to catch a write
+            # by another worker process
+            row = self._connect().execute(
+                "SELECT version FROM users WHERE phone_number = ?", (phone_number,)
+            ).fetchone()
+            if row is None or row['version'] != record.get('version', 0):
+                self.cache.invalidate(self.db_path, phone_number)
+                record = None
+        if record is None:
+            record = self.fetch(phone_number)
+            if record is not None:
+                self.cache.put(self.db_path, phone_number, record)
+        return record
+
+    def fetch(self, phone_number: str):
+        row = self._connect().execute("SELECT * FROM users WHERE phone_number = ?", (phone_number,)).fetchone()
+        return dict(row) if row else None
+
+    def create(self, phone_number: str) -> bool:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO users (phone_number, name, conversation_stage, last_interaction) VALUES (?, ?, ?, ?)",
+                    (phone_number, 'User', int(Stage.INITIAL), int(time.time()))
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def write(self, phone_number: str, fields: dict, record: dict) -> dict:
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        version = record.get('version', 0)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE users SET {assignments}, version = version + 1 WHERE phone_number = ? AND version = ?",
+                (*fields.values(), phone_number, version)
+            )
+            conflict = cursor.rowcount == 0
+            if conflict:
+                # Another process wrote the row since we read it. Our columns
+                # still win, but the rest of the record may be stale.
+                conn.execute(
+                    f"UPDATE users SET {assignments}, version = version + 1 WHERE phone_number = ?",
+                    (*fields.values(), phone_number)
+                )
+
+        if conflict:
+            self.cache.invalidate(self.db_path, phone_number)
+            return self.load(phone_number)
+        record = dict(record, version=version + 1)
+        self.cache.put(self.db_path, phone_number, record)
+        return record
+
+    def reset_idle(self, before: int) -> list:
+        conn = self._connect()
+        with conn:
+            phone_numbers = [row['phone_number'] for row in conn.execute(RESET_IDLE_USERS, (before,))]
+        for phone_number in phone_numbers:
+            self.cache.invalidate(self.db_path, phone_number)
+        return phone_numbers
+
+
+class MemorySessionStore(SessionStore):
+    """Records kept in dicts, nothing survives a restart.
+
+    Users are spread over `stripes` dicts, each with its own lock, so
+    threads working on different users rarely wait for each other.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+
+    def _stripe(self, phone_number: str):
+        return self._stripes[hash(phone_number) % len(self._stripes)]
+
+    def load(self, phone_number: str, validate: bool = False):
+        records, lock = self._stripe(phone_number)
+        with lock:
+            record = records.get(phone_number)
+            return dict(record) if record is not None else None
+
+    def create(self, phone_number: str) -> bool:
+        records, lock = self._stripe(phone_number)
+        with lock:
+            if phone_number in records:
+                return False
+            record = {name: None for name, _, _ in USER_COLUMNS}
+            # advice_category is added by a later migration, not by USER_COLUMNS
+            record.update(phone_number=phone_number, name='User', conversation_stage=int(Stage.INITIAL),
+                          last_interaction=int(time.time()), advice_category=None, version=0)
+            records[phone_number] = record
+            return True
+
+    def write(self, phone_number: str, fields: dict, record: dict) -> dict:
+        records, lock = self._stripe(phone_number)
+        with lock:
+            stored = records[phone_number]
+            stored.update(fields)
+            stored['version'] += 1
+            return dict(stored)
+
+    def reset_idle(self, before: int) -> list:
+        phone_numbers = []
+        for records, lock in self._stripes:
+            with lock:
+                for record in records.values():
+                    if (record['conversation_stage'] not in SETTLED_STAGES
+                            and record['last_interaction'] < before):
+                        record['conversation_stage'] = int(Stage.ONBOARDED)
+                        record['version'] += 1
+                        phone_numbers.append(record['phone_number'])
+        return phone_numbers
+
+
+class ShardedSQLiteSessionStore(SessionStore):
+    """Users split over several SQLite files by a hash of their phone number.
+
+    SQLite allows one writer per file, so with N shards up to N turns can
+    commit at the same time. The hash is CRC32, which unlike hash() is the
+    same in every process, and the number of shards must not change once
+    there is data.
+    """
+
+    def __init__(self, directory: str = 'app/data/users', shards: int = 8, cache=user_cache):
+        os.makedirs(directory, exist_ok=True)
+        self.shards = [
+            SQLiteSessionStore(os.path.join(directory, f'users-{i:02d}.db'), cache)
+            for i in range(shards)
+        ]
+
+    def shard(self, phone_number: str) -> SQLiteSessionStore:
+        return self.shards[zlib.crc32(phone_number.encode('utf-8')) % len(self.shards)]
+
+    def migrate(self):
+        for shard in self.shards:
+            shard.migrate()
+
+    def load(self, phone_number: str, validate: bool = False):
+        return self.shard(phone_number).load(phone_number, validate)
+
+    def fetch(self, phone_number: str):
+        return self.shard(phone_number).fetch(phone_number)
+
+    def create(self, phone_number: str) -> bool:
+        return self.shard(phone_number).create(phone_number)
+
+    def write(self, phone_number: str, fields: dict, record: dict) -> dict:
+        return self.shard(phone_number).write(phone_number, fields, record)
+
+    def reset_idle(self, before: int) -> list:
+        return [phone_number for shard in self.shards for phone_number in shard.reset_idle(before)]
+
+
+def create_session_store(engine: str = None) -> SessionStore:
+    """Build the engine named by `engine`, or by SESSION_STORE when not given."""
+    engine = (engine or os.getenv('SESSION_STORE', 'sqlite')).lower()
+    if engine == 'sqlite':
+        return SQLiteSessionStore(os.getenv('USERS_DB', USERS_DB_PATH))
+    if engine == 'memory':
+        return MemorySessionStore()
+    if engine == 'sharded':
+        return ShardedSQLiteSessionStore(os.getenv('SESSION_SHARD_DIR', 'app/data/users'),
+                                         int(os.getenv('SESSION_SHARDS', 8)))
+    raise ValueError(f"Unknown SESSION_STORE {engine!r}")
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store, creating it on first use."""
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = create_session_store()
+    return _session_store
@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key share one execution.
+
+    The first caller of `do(key, fn)` runs `fn()`. Callers with the same key
+    that arrive while it runs wait for it and get its result (or its
+    exception) instead of running `fn` again. Nothing is cached: once the
+    call is over, the next caller runs `fn` afresh.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the call in flight
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+                self._executed += 1
+            else:
+                self._shared += 1
+
+        if not owner:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self._executed,
+                'requests_saved': self._shared,
+            }
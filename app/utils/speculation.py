@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from .limiter import PREFETCH, request_priority
+
+
+class Speculation:
+    """Work started for a user before they ask for it.
+
+    A turn can `start` tasks whose results the user's next turn will
+    probably need, such as preparing the next interview question while the
+    feedback is generated. They run on a small thread pool alongside the
+    turn. The next turn `take`s the result, or gets None if it isn't there.
+    `cancel` discards everything started for a user, e.g. when they leave
+    the interview. Tasks that haven't started are cancelled, results of
+    running ones are dropped. Results older than `max_age` are dropped too.
+    """
+
+    def __init__(self, workers: int = 4, max_age: float = 15 * 60):
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='speculation')
+        self._tasks = {}  # (owner, name) -> (Future, started_at)
+        self._lock = threading.Lock()
+        self._started = 0
+        self._used = 0
+        self._discarded = 0
+
+    def start(self, owner: str, name: str, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` in the background, replacing any earlier task with that name."""
+        with self._lock:
+            self._prune()
+            self._discard((owner, name))
+            future = self._executor.submit(self._run, fn, args, kwargs)
+            self._tasks[(owner, name)] = (future, time.monotonic())
+            self._started += 1
+        return future
+
+    @staticmethod
+    def _run(fn, args, kwargs):
+        # Nobody is waiting for it yet, so users' model requests go first
+        with request_priority(PREFETCH):
+            return fn(*args, **kwargs)
+
+    def take(self, owner: str, name: str, timeout: float = 0):
+        """Return the task's result, waiting up to `timeout` seconds, or None."""
+        with self._lock:
+            task = self._tasks.pop((owner, name), None)
+        if task is None:
+            return None
+        future, started_at = task
+        if time.monotonic() - started_at > self.max_age:
+            self._count_discarded(future)
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except TimeoutError:
+            self._count_discarded(future)
+            return None
+        except Exception as e:
+            print(f"Speculative {name} for {owner} failed: {e}")
+            self._count_discarded(future)
+            return None
+        with self._lock:
+            self._used += 1
+        return result
+
+    def cancel(self, owner: str):
+        """Discard everything started for `owner`."""
+        with self._lock:
+            for key in [key for key in self._tasks if key[0] == owner]:
+                self._discard(key)
+
+    def _discard(self, key):
+        # Called with the lock held
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task[0].cancel()
+            self._discarded += 1
+
+    def _count_discarded(self, future):
+        future.cancel()
+        with self._lock:
+            self._discarded += 1
+
+    def _prune(self):
+        # Called with the lock held
+        now = time.monotonic()
+        for key in [key for key, (_, started_at) in self._tasks.items() if now - started_at > self.max_age]:
+            self._discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending': len(self._tasks),
+                'started': self._started,
+                'used': self._used,
+                'discarded': self._discarded,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
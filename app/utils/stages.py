@@ -0,0 +1,53 @@
+"""Conversation stages and their integer codes.
+
+Stored data such as the users table and the transcript uses the codes
+instead of the stage names. A code must never be reused or renumbered, so
+new stages go at the end of Stage.
+"""
+from enum import IntEnum
+
+
+class Stage(IntEnum):
+    UNKNOWN = 0
+    INITIAL = 1
+    AWAITING_NAME = 2
+    ONBOARDED = 3
+    AWAITING_PURPOSE = 4
+    AWAITING_INTERVIEW_TYPE = 5
+    AWAITING_INTERVIEW_ROLE = 6
+    AWAITING_INTERVIEW_QUESTION_RESPONSE = 7
+    AWAITING_FOLLOW_UP_RESPONSE = 8
+    AWAITING_MORE_INTERVIEW = 9
+    AWAITING_ADVICE_CATEGORY = 10
+    AWAITING_ADVICE_FOLLOWUP = 11
+    AWAITING_MORE_ADVICE_FOLLOWUP = 12
+    AWAITING_MORE_ADVICE = 13
+
+    @property
+    def label(self) -> str:
+        """The stage's name as it was stored before the codes, e.g. 'awaiting_name'."""
+        return self.name.lower()
+
+    @classmethod
+    def of(cls, value) -> 'Stage':
+        """The stage for a code or a name, UNKNOWN for anything else."""
+        if isinstance(value, str):
+            value = int(value) if value.isdigit() else cls.__members__.get(value.upper(), cls.UNKNOWN)
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN
+
+
+STAGES = tuple(stage.label for stage in Stage)
+
+STAGE_CODES = {stage.label: int(stage) for stage in Stage}
+
+
+def stage_code(stage) -> int:
+    """Code of `stage`, 0 for a stage we don't know."""
+    return int(Stage.of(stage))
+
+
+def stage_name(code: int) -> str:
+    return Stage.of(code).label
@@ -0,0 +1,130 @@
+"""Table-driven conversation flow.
+
+A Transition says what happens when a reply with a given intent arrives
+at a stage: which handler runs, and which stage comes next. StateMachine
+checks a table of them once and compiles it into a dict keyed by
+(stage, reply word), so routing a turn is a single lookup.
+"""
+from enum import IntEnum
+from typing import NamedTuple, Optional
+from .stages import Stage
+
+# Where conversations start: new users, users reset by the idle sweep,
+# and users whose stored stage can't be read
+ENTRY_STAGES = (Stage.INITIAL, Stage.ONBOARDED, Stage.UNKNOWN)
+
+
+class Intent(IntEnum):
+    """What a reply means. OTHER is any reply no other intent of the stage matches."""
+    OTHER = 0
+    YES = 1
+    NO = 2
+    INTERVIEW = 3
+    ADVICE = 4
+    COLLEGE = 5
+    JOB = 6
+    CATEGORY = 7
+    EXIT = 8
+    RESTART = 9
+    OPTIONS = 10
+    HELP = 11
+
+
+# Replies that work at every stage, see app/utils/commands.py
+COMMAND_INTENTS = frozenset([Intent.EXIT, Intent.RESTART, Intent.OPTIONS, Intent.HELP])
+
+
+class Transition(NamedTuple):
+    stage: Optional[Stage]  # None for every stage, like the commands
+    intent: Intent
+    handler: Optional[str]  # Name of the Conversation method to run, None for nothing
+    next_stage: Optional[Stage]  # None to stay at the stage
+
+
+def normalize(reply: str) -> str:
+    return reply.strip().lower()
+
+
+def expand(transitions) -> list:
+    """The transitions with the ones for every stage spelled out per stage."""
+    return [transition._replace(stage=stage) if transition.stage is None else transition
+            for transition in transitions
+            for stage in (Stage if transition.stage is None else (transition.stage,))]
+
+
+def validate(transitions, words: dict, entry=ENTRY_STAGES) -> list:
+    """Return the problems of a transition table, an empty list if there are none.
+
+    Every stage needs a transition for OTHER replies, must be reachable
+    from an entry stage, and must not be a dead end that only a command
+    can leave. A (stage, intent) or (stage, word) may only lead one way.
+    """
+    problems = []
+    by_stage = {stage: [] for stage in Stage}
+    seen = {}
+    for transition in expand(transitions):
+        key = (transition.stage, transition.intent)
+        if key in seen:
+            problems.append(f'{transition.stage.label}: {transition.intent.name} is handled twice')
+        seen[key] = transition
+        by_stage[transition.stage].append(transition)
+        if transition.intent != Intent.OTHER and not words.get(transition.intent):
+            problems.append(f'{transition.stage.label}: {transition.intent.name} has no words')
+
+    for stage, stage_transitions in by_stage.items():
+        taken = {}
+        for transition in stage_transitions:
+            for word in words.get(transition.intent, ()):
+                if taken.setdefault(word, transition.intent) != transition.intent:
+                    problems.append(f'{stage.label}: {word!r} means both {taken[word].name} and {transition.intent.name}')
+        if not any(transition.intent == Intent.OTHER for transition in stage_transitions):
+            problems.append(f'{stage.label}: no transition for other replies')
+
+    # Stages the conversation can get to
+    reachable = set(entry)
+    pending = list(entry)
+    while pending:
+        stage = pending.pop()
+        for transition in by_stage[stage]:
+            if transition.next_stage is not None and transition.next_stage not in reachable:
+                reachable.add(transition.next_stage)
+                pending.append(transition.next_stage)
+    for stage in Stage:
+        if stage not in reachable:
+            problems.append(f'{stage.label}: unreachable')
+
+    # Commands work everywhere, so they don't count as a way out
+    for stage, stage_transitions in by_stage.items():
+        ways_out = [transition for transition in stage_transitions
+                    if transition.next_stage not in (None, stage) and transition.intent not in COMMAND_INTENTS]
+        if not ways_out:
+            problems.append(f'{stage.label}: dead end, only commands leave it')
+    return problems
+
+
+class StateMachine:
+    """A validated transition table, compiled for lookups by (stage, reply).
+
+    `words` maps each intent except OTHER to the replies that mean it.
+    Raises ValueError if the table has problems, see `validate`.
+    """
+
+    def __init__(self, transitions, words: dict, entry=ENTRY_STAGES):
+        problems = validate(transitions, words, entry)
+        if problems:
+            raise ValueError('Invalid transition table: ' + '; '.join(problems))
+        self.transitions = tuple(transitions)
+        self._dispatch = {}
+        for transition in expand(transitions):
+            if transition.intent == Intent.OTHER:
+                self._dispatch[(transition.stage, None)] = transition
+            for word in words.get(transition.intent, ()):
+                self._dispatch[(transition.stage, word)] = transition
+
+    def dispatch(self, stage, reply: str) -> Transition:
+        """The transition for `reply` at `stage`. Unknown stages are handled as UNKNOWN."""
+        dispatch = self._dispatch
+        transition = dispatch.get((stage, normalize(reply)))
+        if transition is None:
+            transition = dispatch.get((stage, None)) or dispatch[(Stage.UNKNOWN, None)]
+        return transition
@@ -0,0 +1,231 @@
+import time
+import zlib
+from typing import NamedTuple
+from .db import get_connection
+from .stages import stage_code, stage_name
+
+INBOUND = 0
+OUTBOUND = 1
+
+# The first byte of a stored body says how the rest is encoded. A codec
+# must keep decoding the rows written with it, so to change the dictionary
+# add a new codec instead of editing ZDICT.
+CODEC_RAW = 0
+CODEC_DEFLATE = 1  # Raw deflate with ZDICT_V1 as preset dictionary
+CODEC_DEFLATE_MESSAGES = 2  # Raw deflate with ZDICT, what new rows are written with
+
+# Common words of users' answers, and a guess at the bot's replies
+ZDICT_V1 = (
+    "Thank you for chatting with us! Seems like we have disconnected. If you need anything else, just send a message. "
+    "Restarting interview preparation... Returning to the main menu... Returning to options... "
+    "Would you like to practice another interview question? Would you like more advice? "
+    "Behavioral Interview Tips Virtual/Phone Interview Advice Post-interview Tips Pre-interview Preparation General Tips "
+    "college university school student admissions officer extracurricular activity community project team leadership "
+    "challenge experience responsibilities passion goal major career future learn grow improve strengths weaknesses "
+    "Tell me about a time when you Describe a situation where you Can you give an example of Why do you want to "
+    "Interview Practice General Advice What would you like to do today? Please choose one of the options below "
+    "Feedback: Your answer is a good start. Consider adding a specific example to show how you "
+    "I think that I would like to because I have been I am interested in my the and to of a in that is for it with "
+).encode('utf-8')
+
+# The words of users' answers, then the bot's own messages as they are in
+# app/data/messages.json, commands.py, idle_chat_checker.py and the fixed
+# replies of conversation.py (without the {name} placeholders). Most
+# common last, as deflate finds closer matches cheaper.
+ZDICT = ''.join([
+    "college university school student admissions officer extracurricular activity community project team leadership "
+    "challenge experience responsibilities passion goal major career future learn grow improve strengths weaknesses "
+    "I think that I would like to because I have been I am interested in my the and to of a in that is for it with ",
+    "Hey there, Thanks for reaching out for assistance. As we grow, we want to help more and more people. As of now, we are not operational in your location. However, stay tuned, we might have something cooking.",
+    "We’d love to hear your feedback. Please take a moment to share your experience.",
+    "Thank you for providing feedback!",
+    "What would you like to do today?\n1. Interview Pratice\n2. General Advice",
+    "Hi there! 🎓 I’m here to help you practice for your upcoming college interviews and boost your confidence. Here’s how I can help you prepare:\n\n🎤 *Simulate College Interviews:*\nI'll ask you a variety of real interview questions commonly used by admissions officers.\n\n💬 *Get Instant Feedback:*\nAfter each answer, I’ll provide you with personalized feedback to help improve your responses.\n\nOver time, I can help you refine your answers to make sure you're interview-ready!",
+    "Before we jump in, what do I call you? Full name:",
+    "Nice to meet you, ",
+    "We couldn't find your information. Please start by saying 'Hello'.",
+    "You can use the following commands at any time:\n- 'exit': Quit the chat.\n- 'restart': Restart the current section of the conversation.\n- 'options': Go back to the main menu to select interview preparation or general advice.\n- 'help': Show this help message.",
+    "Restarting onboarding...",
+    "Restarting interview preparation...",
+    "Restarting this section...",
+    "Returning to the main menu...",
+    "Returning to options...",
+    "Thank you for using our service! Goodbye!",
+    "Awesome, you have selected ",
+    "Thank you for chatting with us! Seems like we have disconnected. If you need anything else, just send a message.",
+    "Sorry, I couldn't understand your selection. Please reply with 1 for Interview Preparation or 2 for General Advice.",
+    "Sorry, I didn't understand that. Please reply with a number between 1 and 5.",
+    "Thank you for using our service! If you need anything else, just send a message.",
+    "Thank you for practicing. Start another conversation by sending another message.",
+    "Are you preparing for a college interview or a job interview? Please reply with 'college' or 'job'.",
+    "Please specify the college or program you're applying to so I can tailor the interview questions accordingly.",
+    "Please specify the job role you're applying for so I can tailor the interview questions accordingly.",
+    "Great! Let's start the interview for a ",
+    " position.",
+    "Please ask your question.",
+    "Would you like advice on another topic? Reply 'yes' or 'no'.",
+    "Do you have any questions about this advice? Please feel free to ask or reply 'no' to continue.",
+    "Do you have any more questions about this advice? Reply 'yes' or 'no'.",
+    "Sorry, I didn't understand that. Please reply with 'yes' or 'no'.",
+    "Would you like to practice another question? Reply 'yes' or 'no'.",
+    "*What specific advice are you looking for?*\nPlease select one of the following options by replying with the corresponding number:\n\n1️⃣ *General Tips* \n2️⃣ *Pre-interview Preparation* \n3️⃣ *Behavioral Interview Tips* \n4️⃣ *Virtual/Phone Interview Advice* \n5️⃣ *Post-interview Tips*",
+    "*👋 Welcome back, ",
+    "*What would you like to do today?*\nPlease choose one of the options below by replying with the corresponding number:\n\n1️⃣ *Interview Practice*\n2️⃣ *General Advice*",
+]).encode('utf-8')
+
+ZDICTS = {CODEC_DEFLATE: ZDICT_V1, CODEC_DEFLATE_MESSAGES: ZDICT}
+
+# Shorter bodies rarely shrink enough to pay for decompressing them
+MIN_COMPRESS_LENGTH = 32
+
+
+def encode_text(text: str) -> bytes:
+    raw = text.encode('utf-8')
+    if len(raw) >= MIN_COMPRESS_LENGTH:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=ZDICT)
+        packed = compressor.compress(raw) + compressor.flush()
+        if len(packed) < len(raw):
+            return bytes([CODEC_DEFLATE_MESSAGES]) + packed
+    return bytes([CODEC_RAW]) + raw
+
+
+def decode_text(body: bytes) -> str:
+    codec, payload = body[0], body[1:]
+    if codec in ZDICTS:
+        decompressor = zlib.decompressobj(-15, zdict=ZDICTS[codec])
+        payload = decompressor.decompress(payload) + decompressor.flush()
+    elif codec != CODEC_RAW:
+        raise ValueError(f"Unknown transcript codec {codec}")
+    return payload.decode('utf-8')
+
+
+class Turn(NamedTuple):
+    id: int
+    phone_number: str
+    created_at: int
+    stage: str
+    direction: int
+    text: str
+
+
+class TranscriptStore:
+    """Append-only history of the messages exchanged with each user.
+
+    The users table only holds the state the conversation needs right now.
+    This keeps every message, with the stage it was sent in, for analytics
+    and for reusing earlier context. Rows are never updated. Ids only go up,
+    so readers page with `after_id` instead of OFFSET, and old rows are
+    removed by `purge` and their pages returned to the OS by `compact`.
+    """
+
+    def __init__(self, db_path: str = 'app/data/transcripts.db'):
+        self.db_path: str = db_path
+
+        # Ensure the table exists
+        self._create_turns_table()
+
+    def _connect(self):
+        return get_connection(self.db_path)
+
+    def _create_turns_table(self):
+        conn = self._connect()
+        if conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0] == 0:
+            # Auto vacuum can only be turned on in an empty database, and
+            # the WAL pragma already wrote its header, hence the VACUUM
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS turns (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                phone_number TEXT NOT NULL,
+                                created_at INTEGER NOT NULL,
+                                stage INTEGER NOT NULL,
+                                direction INTEGER NOT NULL,
+                                body BLOB NOT NULL
+                            );''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_turns_user ON turns (phone_number, id)")
+
+    def append(self, phone_number: str, messages: list):
+        """Store `(stage, direction, text)` messages of one turn in one transaction."""
+        if not messages:
+            return
+        now = int(time.time())
+        rows = [
+            (phone_number, now, stage_code(stage), direction, encode_text(text))
+            for stage, direction, text in messages
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO turns (phone_number, created_at, stage, direction, body) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def read(self, phone_number: str, after_id: int = 0, limit: int = 50) -> list:
+        """Return up to `limit` of the user's messages with an id above `after_id`, oldest first.
+
+        Pass the id of the last message returned to get the next page.
+        """
+        rows = self._connect().execute(
+            "SELECT * FROM turns WHERE phone_number = ? AND id > ? ORDER BY id LIMIT ?",
+            (phone_number, after_id, limit)
+        ).fetchall()
+        return [self._to_turn(row) for row in rows]
+
+    def recent(self, phone_number: str, limit: int = 10) -> list:
+        """Return the user's last `limit` messages, oldest first."""
+        rows = self._connect().execute(
+            "SELECT * FROM turns WHERE phone_number = ? ORDER BY id DESC LIMIT ?",
+            (phone_number, limit)
+        ).fetchall()
+        return [self._to_turn(row) for row in reversed(rows)]
+
+    def read_all(self, after_id: int = 0, limit: int = 1000) -> list:
+        """Page through the messages of all users in id order, e.g. for an export."""
+        rows = self._connect().execute(
+            "SELECT * FROM turns WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        ).fetchall()
+        return [self._to_turn(row) for row in rows]
+
+    @staticmethod
+    def _to_turn(row) -> Turn:
+        return Turn(row['id'], row['phone_number'], row['created_at'], stage_name(row['stage']),
+                    row['direction'], decode_text(row['body']))
+
+    def purge(self, max_age_days: float, batch_size: int = 5000) -> int:
+        """Delete the messages older than `max_age_days` and return how many were deleted.
+
+        Ids follow insertion time, so everything below the first id that is
+        new enough goes. Deleting in batches keeps each write transaction short.
+        """
+        cutoff = int(time.time() - max_age_days * 86400)
+        conn = self._connect()
+        row = conn.execute("SELECT id FROM turns WHERE created_at >= ? ORDER BY id LIMIT 1", (cutoff,)).fetchone()
+        if row is None:
+            row = conn.execute("SELECT max(id) + 1 AS id FROM turns").fetchone()
+        first_kept = row['id'] or 0
+
+        deleted = 0
+        while True:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM turns WHERE id IN (SELECT id FROM turns WHERE id < ? ORDER BY id LIMIT ?)",
+                    (first_kept, batch_size)
+                )
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+    def compact(self, max_pages: int = 0) -> int:
+        """Give the free pages left by `purge` back to the file system, at most `max_pages` (0 = all).
+
+        Returns the number of pages freed.
+        """
+        conn = self._connect()
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def run_retention(self, max_age_days: float):
+        deleted = self.purge(max_age_days)
+        pages = self.compact()
+        print(f"Transcript retention: deleted {deleted} messages, freed {pages} pages")
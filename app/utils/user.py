@@ -1,122 +1,106 @@
-import sqlite3
-import datetime
+import time
+from contextlib import contextmanager
+from .session_store import SQLiteSessionStore, get_session_store
+from .stages import Stage
 
 class User:
-    def __init__(self, phone_number: str, db_path: str = 'app/data/users.db'):
+    def __init__(self, phone_number: str, db_path: str = None, store=None):
         self.phone_number: str = phone_number
-        self.db_path: str = db_path
+
+        # Where the user's state lives, see app/utils/session_store.py.
+        # Passing a db_path uses that SQLite file instead of the configured store.
+        if store is None:
+            store = SQLiteSessionStore(db_path) if db_path else get_session_store()
+        self.store = store
 
         # Initialize user information
         self.user_info = None  # This will be a dictionary containing user data
 
-        # Ensure the table exists
-        self._create_users_db()
-        self._add_missing_columns()
+        # Columns changed inside a unit of work and not written yet
+        self._dirty = None
 
-        # Load user information or create a new user
-        self.user_info = self.get_user_info()
+        # Load user information or create a new user.
+        # The table is set up once at startup, see app/utils/migrations.py
+        self.user_info = self._load()
         if not self.user_info:
             self.create_user()
-            self.user_info = self.get_user_info()  # Fetch the user info after creation
-
-    def _create_users_db(self):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                phone_number TEXT UNIQUE NOT NULL,
-                                name TEXT,
-                                conversation_stage TEXT DEFAULT 'initial',
-                                last_advice TEXT DEFAULT NULL,
-                                last_interaction TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                interview_type TEXT DEFAULT NULL,
-                                interview_role TEXT DEFAULT NULL,
-                                last_interview_question TEXT DEFAULT NULL,
-                                last_adapted_question TEXT DEFAULT NULL,
-                                interview_response TEXT DEFAULT NULL,
-                                last_follow_up_question TEXT DEFAULT NULL,
-                                follow_up_response TEXT DEFAULT NULL
-                            );''')
-            conn.commit()
-        except sqlite3.Error as e:
-            print(f"An error occurred: {e}")
-        finally:
-            conn.close()
-
-    def _add_missing_columns(self):
-        conn = self._connect()
-        cursor = conn.cursor()
-        columns = [
-            ('interview_type', 'TEXT', 'NULL'),
-            ('interview_role', 'TEXT', 'NULL'),
-            ('last_interview_question', 'TEXT', 'NULL'),
-            ('interview_response', 'TEXT', 'NULL'),
-            ('last_follow_up_question', 'TEXT', 'NULL'),
-            ('follow_up_response', 'TEXT', 'NULL'),
-            ('last_interaction', 'TIMESTAMP', 'CURRENT_TIMESTAMP')
-        ]
-        for column_name, data_type, default_value in columns:
-            try:
-                cursor.execute(f"ALTER TABLE users ADD COLUMN {column_name} {data_type} DEFAULT {default_value};")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" in str(e):
-                    # Column already exists, ignore
-                    pass
-                else:
-                    print(f"An error occurred while adding column {column_name}: {e}")
-        conn.commit()
-        conn.close()
-
-
-    def _connect(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Access columns by name
-        return conn
+            self.user_info = self._load()  # Fetch the user info after creation
 
     def user_exists(self):
         # Use self.user_info to determine if the user exists
         return self.user_info is not None
 
     def create_user(self):
-        conn = self._connect()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "INSERT INTO users (phone_number, name, conversation_stage) VALUES (?, ?, ?)",
-                (self.phone_number, 'User', 'initial')
-            )
-            conn.commit()
+        if self.store.create(self.phone_number):
             print(f"User {self.phone_number} added successfully.")
-        except sqlite3.IntegrityError:
+        else:
             print(f"User {self.phone_number} already exists.")
-        finally:
-            conn.close()
 
     def get_user_info(self):
-        conn = self._connect()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE phone_number = ?", (self.phone_number,))
-        user_info = cursor.fetchone()
-        conn.close()
-
-        if user_info:
-            return dict(user_info)
+        return self.store.fetch(self.phone_number)
+
+    def _load(self):
+        """Return the user's record, from the store's cache when it has one."""
+        return self.store.load(self.phone_number)
+
+    def _refresh(self):
+        """Reload user info, keeping changes not written yet by the unit of work."""
+        user_info = self._load()
+        if user_info is not None and self._dirty:
+            user_info.update(self._dirty)
+        self.user_info = user_info
+
+    ################
+    # Unit of work #
+    ################
+    @contextmanager
+    def unit_of_work(self):
+        """Batch the writes made inside the block.
+
+        The cached row is checked against the database first, in case
+        another worker process changed it. Setters only change user_info and
+        mark the column dirty. At the end of the block all dirty columns are
+        written with a single UPDATE in one transaction. If the block raises,
+        nothing is written and user_info is reloaded from the database.
+        """
+        if self._dirty is not None:
+            # Already inside a unit of work, the outer one writes
+            yield self
+            return
+
+        self.user_info = self.store.load(self.phone_number, validate=True)
+        self._dirty = {}
+        try:
+            yield self
+        except BaseException:
+            self._dirty = None
+            self.user_info = self._load()
+            raise
+        dirty, self._dirty = self._dirty, None
+        self._write(dirty)
+
+    def _write(self, fields: dict):
+        """Write `fields` with the next row version and take the stored record."""
+        if not fields:
+            return
+        self.user_info = self.store.write(self.phone_number, fields, self.user_info)
+
+    def _set_field(self, column: str, value):
+        """Set one column, or mark it dirty when inside a unit of work."""
+        if not self.user_exists():
+            print(f"User {self.phone_number} does not exist.")
+            return False
+
+        self.user_info[column] = value
+        if self._dirty is not None:
+            self._dirty[column] = value
         else:
-            return None
+            self._write({column: value})
+        return True
 
     def update_user_name(self, user_name):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET name = ? WHERE phone_number = ?", (user_name, self.phone_number))
-            conn.commit()
-            conn.close()
+        if self._set_field('name', user_name):
             print(f"User {self.phone_number}'s name updated to {user_name}.")
-            # Update self.user_info
-            self.user_info['name'] = user_name
-        else:
-            print(f"User {self.phone_number} does not exist.")
 
     def get_user_name(self):
         if self.user_exists():
@@ -128,63 +112,30 @@ class User:
         return self.phone_number
 
     def update_last_interaction(self):
-        if self.user_exists():
-            current_time = datetime.datetime.utcnow()
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET last_interaction = ? WHERE phone_number = ?",
-                (current_time, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['last_interaction'] = current_time
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        # Epoch seconds, so the idle sweep can compare it as an integer
+        self._set_field('last_interaction', int(time.time()))
 
     def get_last_interaction(self):
-        self.user_info = self.get_user_info()  # Refresh user info
+        self._refresh()  # Refresh user info
         if self.user_exists():
             return self.user_info.get('last_interaction')
         else:
             return None
 
     def get_conversation_stage(self):
-        self.user_info = self.get_user_info() # Refresh user info
+        self._refresh() # Refresh user info
         if self.user_exists():
-            return self.user_info.get('conversation_stage')
+            return Stage.of(self.user_info.get('conversation_stage'))
         else:
             return None
 
     def set_conversation_stage(self, new_stage):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET conversation_stage = ? WHERE phone_number = ?",
-                (new_stage, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            # Update self.user_info
-            self.user_info['conversation_stage'] = new_stage
-        else:
+        # Stored as the stage's code, see app/utils/stages.py
+        if not self._set_field('conversation_stage', int(Stage.of(new_stage))):
             print(f"Can't change the conversation stage. User doesn't exist")
 
     def set_last_advice(self, advice):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET last_advice = ? WHERE phone_number = ?",
-                (advice, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            # Update self.user_info
-            self.user_info['last_advice'] = advice
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        self._set_field('last_advice', advice)
 
     def get_last_advice(self):
         if self.user_exists():
@@ -192,46 +143,33 @@ class User:
         else:
             return None
 
+    def set_advice_category(self, category):
+        self._set_field('advice_category', category)
+
+    def get_advice_category(self):
+        if self.user_exists():
+            return self.user_info.get('advice_category', None)
+        else:
+            return None
+
     #############################
     # Interview User Attributes #
     #############################
     def set_interview_type(self, interview_type):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET interview_type = ? WHERE phone_number = ?",
-                (interview_type, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['interview_type'] = interview_type
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        self._set_field('interview_type', interview_type)
 
     def get_interview_type(self):
-        self.user_info = self.get_user_info()  # Refresh the user info
+        self._refresh()  # Refresh the user info
         if self.user_exists():
             return self.user_info.get('interview_type', '')
         else:
             return ''
 
     def set_interview_role(self, role):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET interview_role = ? WHERE phone_number = ?",
-                (role, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['interview_role'] = role
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        self._set_field('interview_role', role)
 
     def get_interview_role(self):
-        self.user_info = self.get_user_info()  # Refresh the user info
+        self._refresh()  # Refresh the user info
         if self.user_exists():
             return self.user_info.get('interview_role', '')
         else:
@@ -239,84 +177,51 @@ class User:
 
 
     def set_last_interview_question(self, question):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET last_interview_question = ? WHERE phone_number = ?",
-                (question, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['last_interview_question'] = question
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        self._set_field('last_interview_question', question)
 
     def get_last_interview_question(self):
-        self.user_info = self.get_user_info()  # Refresh the user info
+        self._refresh()  # Refresh the user info
         if self.user_exists():
             return self.user_info.get('last_interview_question', '')
         else:
             return ''
 
-    def set_interview_response(self, user_response):
+    def set_last_adapted_question(self, question):
+        # The question as it was asked, adapted to the user's role
+        self._set_field('last_adapted_question', question)
+
+    def get_last_adapted_question(self):
+        self._refresh()  # Refresh the user info
         if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET interview_response = ? WHERE phone_number = ?",
-                (user_response, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['interview_response'] = user_response
+            return self.user_info.get('last_adapted_question') or ''
         else:
-            print(f"User {self.phone_number} does not exist.")
+            return ''
+
+    def set_interview_response(self, user_response):
+        self._set_field('interview_response', user_response)
 
     def get_last_interview_response(self):
-        self.user_info = self.get_user_info()  # Refresh the user info
+        self._refresh()  # Refresh the user info
         if self.user_exists():
             return self.user_info.get('interview_response', '')
         else:
             return ''
 
     def set_last_follow_up_question(self, follow_up_question):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET last_follow_up_question = ? WHERE phone_number = ?",
-                (follow_up_question, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['last_interview_question'] = follow_up_question
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        self._set_field('last_follow_up_question', follow_up_question)
 
     def get_last_follow_up_question(self):
-        self.user_info = self.get_user_info()  # Refresh the user info
+        self._refresh()  # Refresh the user info
         if self.user_exists():
             return self.user_info.get('last_follow_up_question', '')
         else:
             return ''
 
     def set_follow_up_response(self, user_response):
-        if self.user_exists():
-            conn = self._connect()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE users SET follow_up_response = ? WHERE phone_number = ?",
-                (user_response, self.phone_number)
-            )
-            conn.commit()
-            conn.close()
-            self.user_info['follow_up_response'] = user_response
-        else:
-            print(f"User {self.phone_number} does not exist.")
+        self._set_field('follow_up_response', user_response)
 
     def get_last_follow_up_response(self):
-        self.user_info = self.get_user_info()  # Refresh the user info
+        self._refresh()  # Refresh the user info
         if self.user_exists():
             return self.user_info.get('follow_up_response', '')
         else:
@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """Bounded LRU cache of user rows, shared by all threads of a process.
+
+    SQLiteSessionStore writes through it on every commit, so a process
+    always reads its own writes. Every row carries a `version` that goes up
+    on each write. At the start of each turn the cached version is compared
+    with the database (SQLiteSessionStore.load with validate), so a row
+    changed by another worker process is read again. A write based on an
+    old version is detected by SQLiteSessionStore.write, which then drops
+    the entry. Entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (db_path, phone_number) -> (record, expires_at)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, db_path: str, phone_number: str):
+        """Return a copy of the cached row, or None on a miss."""
+        key = (db_path, phone_number)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(entry[0])
+
+    def put(self, db_path: str, phone_number: str, record: dict):
+        key = (db_path, phone_number)
+        with self._lock:
+            # Only store rows that are at least as new as the cached one
+            entry = self._entries.get(key)
+            if entry is not None and entry[0].get('version', 0) > record.get('version', 0):
+                return
+            self._entries[key] = (dict(record), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, db_path: str, phone_number: str):
+        with self._lock:
+            self._entries.pop((db_path, phone_number), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+
+
+user_cache = UserCache()
@@ -0,0 +1,113 @@
+"""Idle-session sweep over a large synthetic users table.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_idle_sweep --users 1000000
+
+"before" stores last_interaction as text timestamps with no index, like the
+original schema, and sweeps like the original code: the idle SELECT, then
+one UPDATE per idle user. "after" is the migrated schema (integer epoch
+seconds, stage codes and the partial idx_users_idle index) with the
+single RESET_IDLE_USERS statement the sweep runs now. Each sweep is rolled back,
+so every repetition resets the same users.
+About 5% of the users are mid-conversation. Since the sweep runs every
+minute, their last message is at most 20 minutes old. Everyone else last
+wrote some time in the past week.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from app.utils.migrations import migrate
+from app.utils.session_store import RESET_IDLE_USERS
+from app.utils.stages import Stage
+
+STAGES = [Stage.AWAITING_PURPOSE, Stage.AWAITING_INTERVIEW_ROLE, Stage.AWAITING_FOLLOW_UP_RESPONSE,
+          Stage.AWAITING_ADVICE_FOLLOWUP]
+LEGACY_QUERY = (
+    "SELECT phone_number, conversation_stage FROM users "
+    "WHERE last_interaction < ? AND conversation_stage NOT IN ('initial', 'onboarded')"
+)
+
+
+def synthetic_users(count, now, as_text):
+    rng = random.Random(42)
+    for i in range(count):
+        if rng.random() < 0.05:
+            stage = rng.choice(STAGES)
+            last_interaction = now - rng.randint(0, 20 * 60)
+        else:
+            stage = Stage.ONBOARDED
+            last_interaction = now - rng.randint(0, 7 * 24 * 3600)
+        if as_text:
+            # The original schema stored stage names and text timestamps
+            yield (f'+1{i:010d}', 'User', stage.label, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(last_interaction)))
+        else:
+            yield (f'+1{i:010d}', 'User', int(stage), last_interaction)
+
+
+def build(db_path, users, now, legacy):
+    if legacy:
+        conn = sqlite3.connect(db_path)
+        conn.execute('''CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, phone_number TEXT UNIQUE NOT NULL,
+                        name TEXT, conversation_stage TEXT DEFAULT 'initial', last_interaction TIMESTAMP)''')
+    else:
+        migrate(db_path)
+        conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (phone_number, name, conversation_stage, last_interaction) VALUES (?, ?, ?, ?)",
+            synthetic_users(users, now, as_text=legacy)
+        )
+    conn.execute("ANALYZE")
+    return conn
+
+
+def legacy_sweep(conn, threshold):
+    rows = conn.execute(LEGACY_QUERY, (threshold,)).fetchall()
+    for phone_number, _ in rows:
+        conn.execute("UPDATE users SET conversation_stage = 'onboarded' WHERE phone_number = ?", (phone_number,))
+    return rows
+
+
+def bulk_sweep(conn, threshold):
+    return conn.execute(RESET_IDLE_USERS, (threshold,)).fetchall()
+
+
+def bench(label, conn, sweep, query, threshold, repeat):
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + query, (threshold,)).fetchall()[-1][-1]
+    elapsed = 0
+    for _ in range(repeat):
+        conn.execute('BEGIN')
+        start = time.perf_counter()
+        rows = sweep(conn, threshold)
+        elapsed += time.perf_counter() - start
+        conn.rollback()
+    elapsed /= repeat
+    print(f'{label:<7} {1000 * elapsed:9.2f} ms/sweep, {len(rows)} idle users  [{plan}]')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    now = int(time.time())
+    threshold = now - 15 * 60
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = build(os.path.join(tmp, 'legacy.db'), args.users, now, legacy=True)
+        before = bench('before', legacy, legacy_sweep, LEGACY_QUERY, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(threshold)), args.repeat)
+        legacy.close()
+
+        migrated = build(os.path.join(tmp, 'users.db'), args.users, now, legacy=False)
+        after = bench('after', migrated, bulk_sweep, RESET_IDLE_USERS, threshold, args.repeat)
+        migrated.close()
+    print(f'speedup: {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
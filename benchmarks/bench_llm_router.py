@@ -0,0 +1,61 @@
+"""Tail latency of model requests with and without hedging.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_llm_router
+    python -m benchmarks.bench_llm_router --slow-rate 0.1 --slow-latency 2
+
+Sends --requests follow-up question requests through an LLMRouter with
+two in-process FakeProviders. The primary usually answers in --latency
+seconds, but a fraction --slow-rate of its answers take --slow-latency.
+With hedging, a request still running at the primary's p95 is also sent
+to the backup. Reports p50, p95 and p99 latency and the hedges sent.
+"""
+import argparse
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from app.model.providers import FakeProvider, LLMRouter
+
+
+def run(hedge, args):
+    rng = random.Random(args.seed)
+    def primary_reply(messages):
+        time.sleep(args.slow_latency if rng.random() < args.slow_rate else args.latency)
+        return 'primary'
+
+    providers = {'local': FakeProvider(primary_reply), 'hosted': FakeProvider('hosted', latency=args.latency * 2)}
+    router = LLMRouter(providers, routes={'follow_up_question': ['local', 'hosted']}, hedge=hedge, min_samples=20)
+    messages = [{'role': 'system', 'content': 'Ask a follow-up question.'}]
+
+    def request(_):
+        start = time.perf_counter()
+        router.complete('follow_up_question', messages, 'gpt-4o-mini', 100, 0.7)
+        return time.perf_counter() - start
+
+    with redirect_stdout(io.StringIO()), ThreadPoolExecutor(args.concurrency) as pool:
+        latencies = sorted(pool.map(request, range(args.requests)))
+    return latencies, router.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--slow-rate', type=float, default=0.05)
+    parser.add_argument('--slow-latency', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for hedge in (False, True):
+        latencies, stats = run(hedge, args)
+        p = lambda q: latencies[int(q * (len(latencies) - 1))] * 1000
+        print(f'{"hedged" if hedge else "plain":<7} p50 {p(0.5):6.1f} ms   p95 {p(0.95):6.1f} ms   '
+              f'p99 {p(0.99):6.1f} ms   {stats["hedges"]} hedges, {stats["hedge_wins"]} won')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Outbound send throughput against a local fake Twilio endpoint.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_outbound
+
+Compares sending one message at a time, as Bot.say did, with the
+OutboundDispatcher. The fake endpoint answers after --latency seconds and
+fails a fraction --error-rate of requests with 429.
+"""
+import argparse
+import time
+import requests
+from app.testing.fake_twilio import FakeTwilioServer
+from app.utils.dispatcher import OutboundDispatcher
+
+
+def bench_sequential(server, messages):
+    session = requests.Session()
+    url = f'{server.url}/2010-04-01/Accounts/ACbench/Messages.json'
+    start = time.perf_counter()
+    for to, body in messages:
+        # No retry, like the old Bot.say: a 429 is simply an error
+        session.post(url, data={'From': 'whatsapp:+15550000', 'To': to, 'Body': body}, auth=('ACbench', 'token'))
+    return time.perf_counter() - start
+
+
+def bench_dispatcher(server, messages, workers, rate):
+    dispatcher = OutboundDispatcher('ACbench', 'token', base_url=server.url, num_workers=workers,
+                                    rate_per_second=rate, backoff_base=0.05)
+    start = time.perf_counter()
+    futures = [dispatcher.send('whatsapp:+15550000', to, body) for to, body in messages]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    stats = dispatcher.stats()
+    dispatcher.shutdown()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--recipients', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=1000)
+    args = parser.parse_args()
+
+    messages = [(f'whatsapp:+1555{i % args.recipients:07d}', f'message {i}') for i in range(args.messages)]
+    server = FakeTwilioServer(latency=args.latency, error_rate=args.error_rate).start()
+    try:
+        sequential = bench_sequential(server, messages)
+        print(f'sequential: {args.messages / sequential:8.1f} msg/s ({sequential:.2f}s)')
+        dispatched, stats = bench_dispatcher(server, messages, args.workers, args.rate)
+        print(f'dispatcher: {args.messages / dispatched:8.1f} msg/s ({dispatched:.2f}s) {stats}')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
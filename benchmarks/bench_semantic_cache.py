@@ -0,0 +1,101 @@
+"""Hit rate and saved model time of the follow-up answer cache.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_semantic_cache
+    python -m benchmarks.bench_semantic_cache --threshold 0.8 --llm-latency 2.5
+
+Replays families of paraphrased follow-up questions through a
+SemanticCache, the way AIHandler.generate_advice_followup uses it: a miss
+costs --llm-latency seconds of model time and stores the answer. Every
+answer carries its family, so a hit on another family's answer counts as
+a false hit. Reports the hit rate, false hits, lookup time and the model
+time the hits saved.
+"""
+import argparse
+import random
+import time
+from app.utils.semantic_cache import SemanticCache
+
+FAMILIES = {
+    'answer_length': [
+        'How long should my answer be?',
+        'how long should my answers be',
+        'How long should my answer be??',
+        'how long should the answer be?',
+        'How long should my answer be',
+    ],
+    'what_to_wear': [
+        'What should I wear to the interview?',
+        'what should i wear to the interview',
+        'What should I wear for the interview?',
+        'what should I wear to my interview?',
+    ],
+    'what_not_to_wear': [
+        'What should I not wear to the interview?',
+        'what should i not wear to the interview',
+        'What should I not wear for the interview?',
+    ],
+    'arrive_early': [
+        'How early should I arrive?',
+        'how early should i arrive',
+        'How early should I arrive for the interview?',
+    ],
+    'thank_you_note': [
+        'Should I send a thank you note after the interview?',
+        'should i send a thank-you note after the interview',
+        'Should I send a thank you email after the interview?',
+    ],
+    'questions_to_ask': [
+        'What questions should I ask the interviewer?',
+        'what questions should i ask the interviewers?',
+        'Which questions should I ask the interviewer?',
+    ],
+    'nervous': [
+        'How do I stop being nervous?',
+        'how do i stop being so nervous',
+        'How can I stop being nervous?',
+    ],
+    'five_minutes': [
+        'What if I am 5 minutes late?',
+        'what if i am 15 minutes late',
+    ],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=5000)
+    parser.add_argument('--threshold', type=float, default=0.85)
+    parser.add_argument('--max-entries', type=int, default=256)
+    parser.add_argument('--llm-latency', type=float, default=2.0, help='assumed seconds per model call')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    questions = [(family, rng.choice(wordings)) for family, wordings in
+                 rng.choices(list(FAMILIES.items()), k=args.questions)]
+
+    cache = SemanticCache(threshold=args.threshold, max_entries=args.max_entries)
+    false_hits = 0
+    lookup_time = 0.0
+    for family, question in questions:
+        start = time.perf_counter()
+        answer = cache.lookup('general_tips', question)
+        lookup_time += time.perf_counter() - start
+        if answer is None:
+            cache.store('general_tips', question, f'{family}: {question}', cost=args.llm_latency)
+        elif not answer.startswith(f'{family}:'):
+            false_hits += 1
+
+    stats = cache.stats()
+    model_time = args.questions * args.llm_latency
+    print(f'{args.questions} questions from {len(FAMILIES)} families, threshold {args.threshold}')
+    print(f'hit rate     {stats["hit_rate"]:.1%} ({stats["hits"]} hits, {false_hits} false)')
+    print(f'lookup       {lookup_time / args.questions * 1e6:.1f} us per question')
+    print(f'model time   {model_time - stats["seconds_saved"]:.0f} s instead of {model_time:.0f} s '
+          f'({stats["seconds_saved"]:.0f} s saved)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Session store engines under replayed webhook traffic.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_session_store
+    python -m benchmarks.bench_session_store --transcripts app/data/transcripts.db
+
+Every inbound message is replayed as a full Conversation turn (with a bot
+and AI that do nothing), so the engines see the reads and writes real
+turns make. Turns run on a KeyedExecutor like the webhook's. Without
+--transcripts, each user walks through a scripted onboarding, interview
+and advice session, and the users are interleaved.
+
+Reports turns per second, p99 turn latency, memory per user (traced
+Python allocations, including the user cache for the SQLite engines) and
+disk per user.
+"""
+import argparse
+import gc
+import io
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+os.environ.setdefault('ACCOUNT_SID', 'ACbench')
+os.environ.setdefault('AUTH_TOKEN', 'bench')
+os.environ.setdefault('TWILIO_FROM_NUMBER', '+15550000000')
+
+from app.model.conversation import Conversation
+from app.model.resources import Resources
+from app.utils.executor import KeyedExecutor
+from app.utils.session_store import MemorySessionStore, SQLiteSessionStore, ShardedSQLiteSessionStore
+from app.utils.transcripts import TranscriptStore, INBOUND
+from app.utils.user import User
+from app.utils.user_cache import user_cache
+
+SCRIPT = [
+    'hi', 'Sam', '1', 'college', 'engineering',
+    'I want to study engineering because I love building things.',
+    'I built a robot for the science fair.', 'yes',
+    'My favourite subject is physics.', 'It explains how everything works.', 'no',
+    'hello', '2', '1', 'no', 'no',
+]
+
+
+class NullBot:
+    def say(self, to_number, message_body):
+        pass
+
+    def say_now(self, to_number, message_body):
+        pass
+
+    def send_sequence_to(self, to_number, message_list):
+        pass
+
+
+class CannedAI:
+    question_wait = 0
+
+    def generate_response(self, *args, **kwargs):
+        return 'Tell me about a project you are proud of.'
+
+    def prefetch_adapted_questions(self, *args, **kwargs):
+        pass
+
+    def ready_adapted_questions(self, *args, **kwargs):
+        return []
+
+    def get_adapted_question(self, question, *args, **kwargs):
+        return question
+
+    def speculate(self, *args, **kwargs):
+        pass
+
+    def take_speculative(self, *args, **kwargs):
+        return None
+
+    def cancel_speculative(self, *args, **kwargs):
+        pass
+
+    def generate_follow_up_question(self, *args, **kwargs):
+        return 'What did you learn from it?'
+
+    def generate_interview_feedback(self, *args, on_section=None, **kwargs):
+        on_section('Good answer, add a concrete example.')
+        return 'Good answer, add a concrete example.'
+
+    def generate_advice(self, *args, **kwargs):
+        return 'Research the college before the interview.'
+
+    def generate_advice_followup(self, *args, **kwargs):
+        return 'Ask them about the course.'
+
+
+def synthetic_traffic(users):
+    return [(f'+1555{u:07d}', message) for message in SCRIPT for u in range(users)]
+
+
+def recorded_traffic(path):
+    store = TranscriptStore(path)
+    traffic, after_id = [], 0
+    while True:
+        page = store.read_all(after_id, limit=5000)
+        if not page:
+            return traffic
+        traffic += [(turn.phone_number, turn.text) for turn in page if turn.direction == INBOUND]
+        after_id = page[-1].id
+
+
+def replay(store, traffic, resources, workers):
+    executor = KeyedExecutor(num_workers=workers, name='bench')
+    latencies = []
+    lock = threading.Lock()
+
+    def run_turn(phone_number, body):
+        start = time.perf_counter()
+        Conversation(User(phone_number, store=store), resources).handle_conversation(body)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        futures = [executor.submit(phone_number, run_turn, phone_number, body) for phone_number, body in traffic]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+    executor.shutdown()
+    latencies.sort()
+    return len(traffic) / elapsed, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def memory_per_user(store, phone_numbers):
+    user_cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    with redirect_stdout(io.StringIO()):
+        for phone_number in phone_numbers:
+            User(phone_number, store=store)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return used / len(phone_numbers)
+
+
+def disk_usage(path):
+    if os.path.isdir(path):
+        return sum(disk_usage(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--transcripts', help='replay the inbound messages of a transcript database')
+    args = parser.parse_args()
+
+    traffic = recorded_traffic(args.transcripts) if args.transcripts else synthetic_traffic(args.users)
+    phone_numbers = sorted({phone_number for phone_number, _ in traffic})
+    resources = Resources(bot=NullBot(), ai=CannedAI())
+    print(f'{len(traffic)} turns from {len(phone_numbers)} users, {args.workers} workers')
+
+    engines = {
+        'memory': lambda directory: MemorySessionStore(),
+        'sqlite': lambda directory: SQLiteSessionStore(os.path.join(directory, 'users.db')),
+        'sharded': lambda directory: ShardedSQLiteSessionStore(directory, args.shards),
+    }
+    for name, make_store in engines.items():
+        with tempfile.TemporaryDirectory() as replay_dir, tempfile.TemporaryDirectory() as memory_dir:
+            user_cache.clear()
+            store = make_store(replay_dir)
+            with redirect_stdout(io.StringIO()):
+                store.migrate()
+            throughput, p99 = replay(store, traffic, resources, args.workers)
+            disk = disk_usage(replay_dir) / len(phone_numbers)
+
+            # Measured on a fresh store so only the users count
+            fresh = make_store(memory_dir)
+            with redirect_stdout(io.StringIO()):
+                fresh.migrate()
+            memory = memory_per_user(fresh, phone_numbers)
+
+        print(f'{name:<8} {throughput:8.0f} turns/s   p99 {p99:6.2f} ms   '
+              f'{memory:7.0f} B/user in memory   {disk:7.0f} B/user on disk')
+
+
+if __name__ == '__main__':
+    main()
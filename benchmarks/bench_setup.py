@@ -0,0 +1,68 @@
+"""Per-request setup cost of a conversation turn, before and after the shared Resources.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_setup
+
+"Before" repeats only what the old Conversation constructor did on every
+webhook hit: parse messages.json, questions.json and prompts.json, and
+create a new Twilio and OpenAI client. "After" builds a Conversation on
+top of the process-wide Resources. No network calls are made.
+"""
+import json
+import os
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'bench')
+os.environ.setdefault('ACCOUNT_SID', 'ACbench')
+os.environ.setdefault('AUTH_TOKEN', 'bench')
+os.environ.setdefault('TWILIO_FROM_NUMBER', '+15550000000')
+
+from openai import OpenAI
+from twilio.rest import Client
+from app.model.conversation import Conversation
+from app.model.resources import Resources
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def per_request_setup():
+    """What the original Conversation, Bot and AIHandler constructors did."""
+    messages = load_json('./app/data/messages.json')
+    questions = [item['question'] for item in load_json('./app/data/questions.json')['behavioral_questions']]
+    prompts = load_json('./app/data/prompts.json')
+    twilio_client = Client(os.getenv('ACCOUNT_SID'), os.getenv('AUTH_TOKEN'))
+    openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return messages, questions, prompts, twilio_client, openai_client
+
+
+class FakeUser:
+    def get_user_number(self):
+        return '+15550001'
+
+
+def bench(label, fn, iterations):
+    fn()  # Warm up imports and caches
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    per_call_us = 1e6 * elapsed / iterations
+    print(f'{label:<40} {per_call_us:>12.1f} us/request')
+    return per_call_us
+
+
+def main(iterations=200):
+    user = FakeUser()
+    shared = Resources()
+
+    before = bench('before: per-request construction', per_request_setup, iterations)
+    after = bench('after: shared Resources', lambda: Conversation(user, shared), iterations * 100)
+    print(f'speedup: {before / after:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
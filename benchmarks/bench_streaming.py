@@ -0,0 +1,76 @@
+"""Time to first message of interview feedback, streamed or not.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_streaming
+    python -m benchmarks.bench_streaming --token-delay 0.03 --turns 20
+
+Runs the feedback turn of Conversation.provide_feedback against a local
+fake OpenAI endpoint that produces a token every --token-delay seconds.
+Without streaming the user waits for the whole completion. With it, the
+first section goes out as soon as it's generated. Reports the time to
+first and last message as the bot records them.
+"""
+import argparse
+import io
+import os
+import time
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+
+os.environ.setdefault('ACCOUNT_SID', 'ACbench')
+os.environ.setdefault('AUTH_TOKEN', 'bench')
+os.environ.setdefault('TWILIO_FROM_NUMBER', '+15550000000')
+
+from openai import OpenAI
+from app.model.ai import AIHandler
+from app.model.bot import Bot, Outbox
+from app.testing.fake_openai import FakeOpenAIServer
+
+FEEDBACK = '\n\n'.join(
+    f'*{heading}*\n' + '\n'.join(f'• {heading} point {i}: say what you did and what happened as a result.'
+                                   for i in range(3))
+    for heading in ('Strengths 💪', 'To improve 🎯', 'Example answer ✍️', 'Next time 💡')
+)
+
+
+def run(ai, bot, turns):
+    last_message = []
+    for _ in range(turns):
+        outbox = Outbox('+15550001')
+        with bot.collect(outbox):
+            ai.generate_interview_feedback('Why this role?', 'I like it.', 'Why?', 'Because.', 'job', 'ENGINEER',
+                                           on_section=lambda section: bot.say_now('+15550001', section))
+            bot.say('+15550001', "Would you like to practice another question? Reply 'yes' or 'no'.")
+        last_message.append(time.monotonic() - outbox.started_at)
+    return bot.first_message_latency.stats(), 1000 * sum(last_message) / len(last_message)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    parser.add_argument('--first-token-delay', type=float, default=0.3)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(FEEDBACK, token_delay=args.token_delay, first_token_delay=args.first_token_delay).start()
+    client = OpenAI(api_key='bench', base_url=f'{server.url}/v1')
+    content = SimpleNamespace(snapshot=lambda: SimpleNamespace(prompts={'interview_prompts': {
+        'feedback_prompt': {'prompt': 'Give feedback on: {question} {user_response} {follow_up_question} '
+                                      '{follow_up_response} {interview_type} {role}'}}}))
+    messages = SimpleNamespace(create=lambda from_, to, body: SimpleNamespace(sid='SMbench'))
+    try:
+        print(f'{args.turns} feedback turns, {len(FEEDBACK)} characters each')
+        for streaming in (False, True):
+            ai = AIHandler(client=client, content=content, streaming=streaming)
+            bot = Bot(twilio_client=SimpleNamespace(messages=messages))
+            with redirect_stdout(io.StringIO()):
+                first, last = run(ai, bot, args.turns)
+            print(f'{"streamed" if streaming else "whole":<9} first message avg {first["avg_ms"]:7.1f} ms  '
+                  f'p95 {first["p95_ms"]:7.1f} ms   last message avg {last:7.1f} ms')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Turns per second of the User database access, before and after connection pooling.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_user_db
+
+Each "turn" replays the User calls Conversation makes when a user sends
+their interview role. Both runs work on their own copy of app/data/users.db.
+"Before" opens a new connection for every call in the default
+rollback-journal mode, as User did originally. "After" uses the pooled WAL
+connections from app/utils/db.py and the user cache. "unit of work" also
+batches the turn's writes into one UPDATE, like Conversation.handle_conversation
+does.
+"""
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import redirect_stdout
+from app.utils.migrations import migrate
+from app.utils.session_store import SQLiteSessionStore
+from app.utils.stages import Stage
+from app.utils.user import User
+
+
+class UnpooledStore(SQLiteSessionStore):
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def load(self, phone_number):
+        # No user cache either
+        return self.fetch(phone_number)
+
+
+def turn(store_class, db_path, phone_number, batched=False):
+    user = User(phone_number, store=store_class(db_path))
+    if batched:
+        with user.unit_of_work():
+            turn_calls(user)
+    else:
+        turn_calls(user)
+
+
+def turn_calls(user):
+    user.get_last_interaction()
+    user.update_last_interaction()
+    user.get_conversation_stage()
+    user.set_interview_role('SOFTWARE ENGINEER')
+    user.get_interview_type()
+    user.get_interview_type()
+    user.get_interview_role()
+    user.get_last_interview_question()
+    user.set_last_interview_question('Why do you want to attend this college?')
+    user.set_conversation_stage(Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE)
+
+
+def bench(label, store_class, turns, users, batched=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'users.db')
+        shutil.copy('app/data/users.db', db_path)
+        with redirect_stdout(io.StringIO()):
+            migrate(db_path)
+            for i in range(users):
+                User(f'+1555{i:07d}', store=store_class(db_path))
+
+        start = time.perf_counter()
+        for i in range(turns):
+            turn(store_class, db_path, f'+1555{i % users:07d}', batched)
+        elapsed = time.perf_counter() - start
+    print(f'{label:<15} {turns / elapsed:8.1f} turns/s ({1000 * elapsed / turns:.2f} ms/turn)')
+    return turns / elapsed
+
+
+def main(turns=300, users=50):
+    before = bench('before', UnpooledStore, turns, users)
+    after = bench('after', SQLiteSessionStore, turns, users)
+    batched = bench('unit of work', SQLiteSessionStore, turns, users, batched=True)
+    print(f'speedup: {after / before:.1f}x, with unit of work {batched / before:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
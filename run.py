@@ -1,6 +1,7 @@
 import os
-from app import app
+from app import app, startup
 
 if __name__ == '__main__':
+    startup()
     port = int(os.environ.get('PORT', 5001))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
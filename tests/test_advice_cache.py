@@ -0,0 +1,71 @@
+import itertools
+import threading
+from app.utils.advice_cache import AdviceCache
+
+
+def counter():
+    numbers = itertools.count()
+    return lambda: f'advice {next(numbers)}'
+
+
+def test_pool_fills_in_background_and_persists(tmp_path):
+    path = str(tmp_path / 'advice.json')
+    cache = AdviceCache(path, pool_size=3)
+    generate = counter()
+
+    # Only the very first call waits for the model
+    assert cache.get('general_tips', generate) == 'advice 0'
+    cache.wait_for_refills()
+    assert cache.stats()['variants'] == 3
+    assert cache.get('general_tips', generate) in {'advice 0', 'advice 1', 'advice 2'}
+    assert cache.stats()['hits'] == 1
+
+    # A new process starts warm from the file
+    restarted = AdviceCache(path, pool_size=3)
+    assert restarted.get('general_tips', lambda: 'not called') in {'advice 0', 'advice 1', 'advice 2'}
+    assert restarted.stats()['misses'] == 0
+
+
+def test_expired_variants_are_served_while_refilling(tmp_path):
+    cache = AdviceCache(str(tmp_path / 'advice.json'), pool_size=2, ttl=0)
+    cache.get('general_tips', counter())
+    cache.wait_for_refills()
+
+    release = threading.Event()
+    def slow():
+        release.wait(2)
+        return 'new advice'
+
+    # Everything is expired, yet the answer comes straight from the pool
+    assert cache.get('general_tips', slow).startswith('advice')
+    assert cache.stats()['stale_hits'] == 1
+    release.set()
+    cache.wait_for_refills()
+
+
+def test_concurrent_misses_share_one_call(tmp_path):
+    cache = AdviceCache(str(tmp_path / 'advice.json'), pool_size=3)
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return f'advice {len(calls)}'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('general_tips', slow))) for _ in range(8)]
+    threads[0].start()
+    started.wait(2)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    cache.wait_for_refills()
+
+    assert results == ['advice 1'] * 8
+    # One call for the waiting users, then the rest of the pool
+    assert len(calls) == 3
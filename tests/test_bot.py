@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+from app.model.bot import Bot, Outbox
+
+
+class FakeMessages:
+    def __init__(self):
+        self.sent = []
+
+    def create(self, from_, to, body):
+        self.sent.append((to, body))
+        return SimpleNamespace(sid=f'SM{len(self.sent)}')
+
+
+def make_bot():
+    messages = FakeMessages()
+    bot = Bot(twilio_client=SimpleNamespace(messages=messages))
+    bot.from_number = '+15550000'
+    return bot, messages.sent
+
+
+def test_collect_replies_instead_of_sending():
+    bot, sent = make_bot()
+    outbox = Outbox('+15550001', reply_in_response=True)
+    with bot.collect(outbox):
+        bot.say('+15550001', 'Welcome back!')
+        bot.say('+15550001', 'What would you like to do today?')
+        bot.say('+15550002', 'Someone else')
+
+    assert outbox.release() == ['Welcome back!', 'What would you like to do today?']
+    assert sent == [('whatsapp:+15550002', 'Someone else')]
+
+
+def test_released_outbox_falls_back_to_rest_in_order():
+    bot, sent = make_bot()
+    bot.coalescer.limit = 10  # Too small to merge anything
+    outbox = Outbox('+15550001', reply_in_response=True)
+    with bot.collect(outbox):
+        bot.say('+15550001', 'first')
+        # The webhook stopped waiting for this turn
+        assert outbox.release() is None
+        bot.say('+15550001', 'second')
+        bot.say('+15550001', 'third')
+
+    assert [body for _, body in sent] == ['first', 'second', 'third']
+
+
+def test_release_before_the_last_message_still_sends_it():
+    bot, sent = make_bot()
+    outbox = Outbox('+15550001', reply_in_response=True)
+    with bot.collect(outbox):
+        bot.say('+15550001', 'only')
+        outbox.release()
+
+    assert [body for _, body in sent] == ['only']
+
+
+def test_turn_replies_are_coalesced():
+    bot, sent = make_bot()
+    with bot.collect(Outbox('+15550001')):
+        bot.say('+15550001', 'Here is some advice.')
+        bot.say('+15550001', 'Do you have any questions about this advice?')
+
+    assert [body for _, body in sent] == ['Here is some advice.\n\nDo you have any questions about this advice?']
+    assert bot.coalescer.stats()['sends_saved'] == 1
@@ -0,0 +1,29 @@
+from app.utils.coalescer import MessageCoalescer, split_message
+
+
+def test_split_at_paragraphs():
+    paragraphs = ['*Section %d*\n' % i + 'x' * 300 for i in range(8)]
+    parts = split_message('\n\n'.join(paragraphs), limit=1000)
+    assert all(len(part) <= 1000 for part in parts)
+    # Every part starts at a section heading
+    assert all(part.startswith('*Section') for part in parts)
+    assert ''.join(parts).count('x') == 8 * 300
+
+
+def test_split_at_bullets_when_there_are_no_paragraphs():
+    body = '\n'.join('• tip number %d' % i for i in range(200))
+    parts = split_message(body, limit=500)
+    assert all(len(part) <= 500 for part in parts)
+    assert all(part.startswith('•') for part in parts)
+
+
+def test_split_without_any_separator():
+    parts = split_message('x' * 2500, limit=1000)
+    assert [len(part) for part in parts] == [1000, 1000, 500]
+
+
+def test_coalesce_merges_until_the_limit():
+    coalescer = MessageCoalescer(limit=30)
+    merged = coalescer.coalesce(['Welcome back!', 'Pick 1 or 2.', 'This one no longer fits'])
+    assert merged == ['Welcome back!\n\nPick 1 or 2.', 'This one no longer fits']
+    assert coalescer.stats()['sends_saved'] == 1
@@ -0,0 +1,54 @@
+import os
+import json
+import shutil
+import pytest
+from app.utils.content import ContentStore
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for filename in ['messages.json', 'questions.json', 'prompts.json']:
+        shutil.copy(os.path.join('app', 'data', filename), tmp_path / filename)
+    return tmp_path
+
+
+def touch_later(path):
+    """Bump the mtime, since two writes in a row can share one."""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_snapshot_is_read_only(data_dir):
+    store = ContentStore(str(data_dir))
+    snapshot = store.snapshot()
+    with pytest.raises(TypeError):
+        snapshot.messages['onboarding']['welcome'] = 'changed'
+    assert isinstance(snapshot.interview_questions, tuple)
+    # No copying between calls
+    assert store.snapshot() is snapshot
+
+
+def test_reload_on_change(data_dir):
+    store = ContentStore(str(data_dir), check_interval=0)
+    prompts_path = data_dir / 'prompts.json'
+    prompts = json.loads(prompts_path.read_text())
+    prompts['irrelevant_question']['prompt'] = 'Stay on topic.'
+    prompts_path.write_text(json.dumps(prompts))
+    touch_later(prompts_path)
+
+    snapshot = store.snapshot()
+    assert snapshot.version == 2
+    assert snapshot.prompts['irrelevant_question']['prompt'] == 'Stay on topic.'
+
+
+def test_malformed_file_keeps_last_good_version(data_dir):
+    store = ContentStore(str(data_dir), check_interval=0)
+    welcome = store.snapshot().messages['onboarding']['welcome']
+
+    messages_path = data_dir / 'messages.json'
+    messages_path.write_text('{"onboarding": ')
+    touch_later(messages_path)
+
+    snapshot = store.snapshot()
+    assert snapshot.version == 1
+    assert snapshot.messages['onboarding']['welcome'] == welcome
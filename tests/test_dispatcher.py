@@ -0,0 +1,31 @@
+import time
+from app.testing.fake_twilio import FakeTwilioServer
+from app.utils.dispatcher import OutboundDispatcher
+from app.utils.rate_limit import TokenBucket
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_retries_keep_per_recipient_order():
+    server = FakeTwilioServer(error_rate=0.3).start()
+    dispatcher = OutboundDispatcher('ACtest', 'token', base_url=server.url, num_workers=4,
+                                    rate_per_second=1000, max_retries=20, backoff_base=0.001)
+    try:
+        futures = [dispatcher.send('whatsapp:+15550000', f'whatsapp:+1555000{i % 3}', str(i)) for i in range(30)]
+        for future in futures:
+            assert future.result(timeout=10).startswith('SM')
+    finally:
+        dispatcher.shutdown()
+        server.stop()
+
+    for recipient in range(3):
+        bodies = [int(m['Body']) for m in server.messages if m['To'] == f'whatsapp:+1555000{recipient}']
+        assert bodies == sorted(bodies)
+    assert dispatcher.stats()['sent'] == 30
+    assert dispatcher.stats()['retries'] == server.requests - 30
@@ -0,0 +1,47 @@
+import threading
+import time
+from app.utils.executor import KeyedExecutor
+
+
+def test_same_key_runs_in_order():
+    executor = KeyedExecutor(num_workers=4)
+    results = []
+
+    def turn(i):
+        time.sleep(0.001 * (5 - i % 5))  # Later turns are faster, so a race would reorder them
+        results.append(i)
+
+    futures = [executor.submit('+15550001', turn, i) for i in range(20)]
+    for future in futures:
+        future.result(timeout=5)
+    executor.shutdown()
+
+    assert results == list(range(20))
+
+
+def test_different_keys_run_in_parallel():
+    executor = KeyedExecutor(num_workers=2)
+    barrier = threading.Barrier(2, timeout=5)
+
+    # Both turns only finish if they run at the same time
+    futures = [executor.submit(number, barrier.wait) for number in ['+15550001', '+15550002']]
+    for future in futures:
+        future.result(timeout=5)
+
+    stats = executor.stats()
+    executor.shutdown()
+    assert stats['completed'] == 2
+    assert stats['queue_depth'] == 0
+
+
+def test_exceptions_are_returned_on_the_future():
+    executor = KeyedExecutor(num_workers=1)
+
+    def boom():
+        raise ValueError('bad turn')
+
+    failed = executor.submit('+15550001', boom)
+    after = executor.submit('+15550001', lambda: 'next turn')
+    assert isinstance(failed.exception(timeout=5), ValueError)
+    assert after.result(timeout=5) == 'next turn'
+    executor.shutdown()
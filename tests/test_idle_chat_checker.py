@@ -0,0 +1,87 @@
+import threading
+import time
+from app.utils.db import get_connection
+from app.utils.idle_chat_checker import FAREWELL_MESSAGE, check_idle_conversations
+from app.utils.migrations import migrate
+from app.utils.scheduler import Scheduler
+from app.utils.session_store import RESET_IDLE_USERS, SQLiteSessionStore
+from app.utils.stages import Stage
+from app.utils.user import User
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    def say(self, to_number, message):
+        self.sent.append((to_number, message))
+
+
+def add_user(db_path, phone_number, stage, idle_minutes):
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO users (phone_number, conversation_stage, last_interaction) VALUES (?, ?, ?)",
+            (phone_number, int(stage), int(time.time()) - idle_minutes * 60)
+        )
+
+
+def test_sweep_resets_idle_users_in_bulk(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    migrate(db_path)
+    add_user(db_path, '+15550001', Stage.AWAITING_PURPOSE, 30)
+    add_user(db_path, '+15550002', Stage.AWAITING_PURPOSE, 1)  # Still active
+    add_user(db_path, '+15550003', Stage.ONBOARDED, 30)  # Nothing to reset
+    # Cache the idle user, the sweep has to drop the entry
+    idle_user = User('+15550001', db_path)
+
+    bot = RecordingBot()
+    assert check_idle_conversations(SQLiteSessionStore(db_path), 15, bot=bot) == ['+15550001']
+    assert bot.sent == [('+15550001', FAREWELL_MESSAGE)]
+    assert User('+15550001', db_path).get_conversation_stage() == Stage.ONBOARDED
+    assert User('+15550002', db_path).get_conversation_stage() == Stage.AWAITING_PURPOSE
+
+    # The user's next write sees the bumped version and isn't lost
+    idle_user.set_interview_role('engineer')
+    assert User('+15550001', db_path).get_interview_role() == 'engineer'
+
+    # A second sweep finds nothing left to do
+    assert check_idle_conversations(SQLiteSessionStore(db_path), 15, bot=bot) == []
+    assert len(bot.sent) == 1
+
+    plan = get_connection(db_path).execute("EXPLAIN QUERY PLAN " + RESET_IDLE_USERS, (0,)).fetchall()
+    assert any('idx_users_idle' in row['detail'] for row in plan)
+
+
+def test_scheduler_runs_tasks_by_deadline():
+    scheduler = Scheduler().start()
+    calls = []
+    done = threading.Event()
+    try:
+        scheduler.call_later(0.05, calls.append, 'late')
+        scheduler.call_later(0.01, calls.append, 'early')
+        scheduler.call_every(0.01, lambda: (calls.append('tick'), calls.count('tick') == 3 and done.set()))
+        assert done.wait(2)
+        time.sleep(0.1)
+    finally:
+        scheduler.stop()
+
+    assert calls.index('early') < calls.index('late')
+    assert calls.count('tick') >= 3
+
+
+def test_failed_farewell_does_not_stop_the_others(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    migrate(db_path)
+    for i in range(3):
+        add_user(db_path, f'+1555000{i}', Stage.AWAITING_PURPOSE, 30)
+
+    class FlakyBot(RecordingBot):
+        def say(self, to_number, message):
+            if to_number == '+15550000':
+                raise RuntimeError('Twilio is down')
+            super().say(to_number, message)
+
+    bot = FlakyBot()
+    assert len(check_idle_conversations(SQLiteSessionStore(db_path), 15, bot=bot)) == 3
+    assert sorted(to for to, _ in bot.sent) == ['+15550001', '+15550002']
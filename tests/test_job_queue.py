@@ -0,0 +1,94 @@
+import time
+from app.utils.executor import KeyedExecutor
+from app.utils.job_queue import JobQueue, JobWorkerPool
+
+
+def test_claim_ack(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'))
+    job_id = job_queue.enqueue({'From': '+15550001', 'Body': 'hi'}, message_sid='SM1')
+
+    job = job_queue.claim()
+    assert job['id'] == job_id
+    assert job['payload'] == {'From': '+15550001', 'Body': 'hi'}
+    # The claimed job is invisible to other workers
+    assert job_queue.claim() is None
+
+    job_queue.ack(job_id)
+    assert job_queue.pending_count() == 0
+
+
+def test_duplicate_message_sid_ignored(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'))
+    assert job_queue.enqueue({'Body': 'hi'}, message_sid='SM1') is not None
+    assert job_queue.enqueue({'Body': 'hi'}, message_sid='SM1') is None
+    assert job_queue.pending_count() == 1
+
+
+def test_visibility_timeout_and_dead_letter(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'), visibility_timeout=0, max_attempts=2)
+    job_queue.enqueue({'Body': 'hi'})
+
+    # A job that was never acked becomes visible again
+    first = job_queue.claim()
+    second = job_queue.claim()
+    assert second['id'] == first['id']
+    assert second['attempts'] == 2
+
+    job_queue.fail(second['id'], second['attempts'], 'boom')
+    assert job_queue.claim() is None
+    assert job_queue.pending_count() == 0
+
+
+def test_worker_pool_retries_failed_jobs(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'))
+    calls = []
+
+    def handler(payload):
+        calls.append(payload['Body'])
+        if len(calls) == 1:
+            raise RuntimeError('OpenAI timeout')
+
+    job_queue.enqueue({'From': '+15550001', 'Body': 'hi'})
+    executor = KeyedExecutor(num_workers=2)
+    pool = JobWorkerPool(job_queue, handler, executor, poll_interval=0.05)
+    pool.start()
+    deadline = time.time() + 10
+    while job_queue.pending_count() and time.time() < deadline:
+        time.sleep(0.05)
+    pool.stop()
+    executor.shutdown()
+
+    assert calls == ['hi', 'hi']
+    assert job_queue.pending_count() == 0
+
+
+def test_job_that_never_finishes_is_given_up(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'), visibility_timeout=0, max_attempts=2)
+    job_queue.enqueue({'Body': 'poison'})
+
+    # Each claim crashes the worker before fail() is called
+    assert job_queue.claim()['attempts'] == 1
+    assert job_queue.claim()['attempts'] == 2
+    assert job_queue.claim() is None
+    assert job_queue.pending_count() == 0
+
+
+def test_slow_job_stays_invisible_while_it_runs(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'jobs.db'), visibility_timeout=0.2)
+    calls = []
+
+    def handler(payload):
+        calls.append(payload['Body'])
+        time.sleep(0.6)
+
+    job_queue.enqueue({'From': '+15550001', 'Body': 'hi'})
+    executor = KeyedExecutor(num_workers=2)
+    pool = JobWorkerPool(job_queue, handler, executor, poll_interval=0.02)
+    pool.start()
+    deadline = time.time() + 10
+    while job_queue.pending_count() and time.time() < deadline:
+        time.sleep(0.05)
+    pool.stop()
+    executor.shutdown()
+
+    assert calls == ['hi']
@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+from app.model.ai import AIHandler
+from app.model.providers import FakeProvider, LLMRouter
+from app.utils.limiter import INTERACTIVE, OFFLINE, PREFETCH, AdaptiveLimiter, LimiterTimeout
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_queued_requests_go_by_priority():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    limiter.acquire(10, INTERACTIVE)
+    order = []
+
+    def request(priority):
+        limiter.acquire(10, priority)
+        order.append(priority)
+        limiter.release()
+
+    threads = []
+    for priority in (OFFLINE, PREFETCH, INTERACTIVE):
+        threads.append(threading.Thread(target=request, args=(priority,)))
+        threads[-1].start()
+        time.sleep(0.05)  # Queued in this order
+    limiter.release()
+    for thread in threads:
+        thread.join(2)
+
+    assert order == [INTERACTIVE, PREFETCH, OFFLINE]
+    assert limiter.stats()['wait']['offline']['count'] == 1
+
+
+def test_limit_halves_on_429_and_grows_back():
+    limiter = AdaptiveLimiter(initial_limit=8, cooldown=0)
+    with pytest.raises(RateLimitError):
+        with limiter.slot(10):
+            raise RateLimitError()
+    assert limiter.limit == 4
+
+    # About one more slot for every `limit` successes
+    for _ in range(4):
+        with limiter.slot(10):
+            pass
+    assert 4.9 < limiter.limit < 5
+
+    # Slow answers shrink it gently
+    limit = limiter.limit
+    limiter.acquire(10)
+    limiter.release(latency=limiter.target_latency + 1)
+    assert limiter.limit == pytest.approx(limit * 0.9)
+
+
+def test_token_budget_and_queue_timeout():
+    limiter = AdaptiveLimiter(tokens_per_minute=6000, queue_timeout=0.1)
+    limiter.acquire(6000)
+    limiter.release()
+    with pytest.raises(LimiterTimeout):
+        limiter.acquire(500)  # 5 seconds of budget away
+    assert limiter.stats()['timeouts'] == 1
+    assert limiter.stats()['queued'] == 0
+
+
+def test_model_429s_lower_the_shared_limit():
+    provider = FakeProvider()
+    ai = AIHandler(content=object(), router=LLMRouter({'openai': provider}), limiter=AdaptiveLimiter(initial_limit=8))
+    ai.generate_response([{'role': 'system', 'content': 'tip'}])
+
+    def rate_limited(*args):
+        raise RateLimitError()
+    provider.complete = rate_limited
+    with pytest.raises(RateLimitError):
+        ai.generate_response([{'role': 'system', 'content': 'another tip'}])
+    assert ai.limiter.limit < 8
+    assert ai.limiter.stats()['rate_limited'] == 1
+    assert ai.limiter.stats()['in_flight'] == 0
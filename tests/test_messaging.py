@@ -1,7 +1,8 @@
 import pytest
-# Todo: Import the messaging file to test the functions
+from app.utils.content import load_messages
 
 def test_load_messages():
-    # TODO: Complete this testing function for loading messages
     messages = load_messages()
-    print(messages)
\ No newline at end of file
+    print(messages)
+    assert 'welcome' in messages['onboarding']
+    assert 'options' in messages['welcome_back']
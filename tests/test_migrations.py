@@ -0,0 +1,79 @@
+import shutil
+from app.utils.db import get_connection
+from app.utils.migrations import MIGRATIONS, migrate, schema_version
+from app.utils.session_store import RESET_IDLE_USERS
+from app.utils.stages import Stage
+from app.utils.user import User
+
+
+def test_fresh_database(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    assert migrate(db_path) == len(MIGRATIONS)
+    # Running it again is a no-op
+    assert migrate(db_path) == len(MIGRATIONS)
+
+    user = User('+15550001', db_path)
+    assert user.get_conversation_stage() == Stage.INITIAL
+
+
+def test_database_from_before_migrations(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    shutil.copy('app/data/users.db', db_path)
+    assert schema_version(db_path) == 0
+
+    migrate(db_path)
+    columns = {row['name'] for row in get_connection(db_path).execute("PRAGMA table_info(users)")}
+    assert 'last_adapted_question' in columns
+    assert schema_version(db_path) == len(MIGRATIONS)
+
+
+def test_user_does_no_ddl(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    migrate(db_path)
+    statements = []
+    get_connection(db_path).set_trace_callback(statements.append)
+    try:
+        User('+15550001', db_path).set_conversation_stage(Stage.ONBOARDED)
+    finally:
+        get_connection(db_path).set_trace_callback(None)
+
+    assert statements
+    assert not any(s.lstrip().upper().startswith(('CREATE', 'ALTER')) for s in statements)
+
+
+def test_last_interaction_becomes_epoch_and_sweep_uses_index(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    migrate(db_path)
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute("PRAGMA user_version = 2")
+        conn.execute("INSERT INTO users (phone_number, conversation_stage, last_interaction) "
+                     "VALUES ('+15550001', 'awaiting_purpose', '2024-10-01 12:00:00.123456')")
+    migrate(db_path)
+
+    row = conn.execute("SELECT last_interaction, conversation_stage FROM users WHERE phone_number = '+15550001'").fetchone()
+    assert row['last_interaction'] == 1727784000
+    # Stage names become their codes
+    assert row['conversation_stage'] == Stage.AWAITING_PURPOSE
+
+    plan = conn.execute("EXPLAIN QUERY PLAN " + RESET_IDLE_USERS, (0,)).fetchall()
+    assert any('idx_users_idle' in row['detail'] for row in plan)
+
+
+def test_missing_last_interaction_is_backfilled(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    shutil.copy('app/data/users.db', db_path)
+    migrate(db_path)
+    conn = get_connection(db_path)
+
+    row = conn.execute("SELECT last_interaction FROM users WHERE phone_number = '+919826687066'").fetchone()
+    assert isinstance(row['last_interaction'], int)
+    assert conn.execute("SELECT count(*) FROM users").fetchone()[0] == 2
+
+    # New rows get an epoch default instead of NULL
+    with conn:
+        conn.execute("INSERT INTO users (phone_number) VALUES ('+15550001')")
+    row = conn.execute("SELECT last_interaction FROM users WHERE phone_number = '+15550001'").fetchone()
+    assert isinstance(row['last_interaction'], int)
+    plan = conn.execute("EXPLAIN QUERY PLAN " + RESET_IDLE_USERS, (0,)).fetchall()
+    assert any('idx_users_idle' in row['detail'] for row in plan)
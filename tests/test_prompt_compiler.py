@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from app.model.ai import AIHandler
+from app.model.providers import FakeProvider, LLMRouter
+from app.utils.content import ContentStore
+from app.utils.prompt_compiler import ADVICE_FORMAT, TRUNCATION_MARK, PromptCompiler, count_tokens, truncate
+
+LONG_ANSWER = 'I started the robotics club at my school. ' + 'We met every week and built robots. ' * 200 + 'We won the regional final.'
+
+
+class VersionedContent:
+    def __init__(self, prompts):
+        self.current = SimpleNamespace(version=1, prompts=prompts)
+
+    def snapshot(self):
+        return self.current
+
+
+def test_prompts_are_built_once_per_content_version():
+    prompts = ContentStore().snapshot().prompts
+    content = VersionedContent(prompts)
+    compiler = PromptCompiler(content)
+
+    compiled = compiler.compiled()
+    assert compiler.compiled() is compiled
+    assert compiled.advice['general_tips'].text == prompts['advice_prompts']['general_tips']['prompt'] + ADVICE_FORMAT
+    assert compiled.advice['general_tips'].tokens == count_tokens(compiled.advice['general_tips'].text)
+
+    content.current = SimpleNamespace(version=2, prompts=prompts)
+    assert compiler.compiled() is not compiled
+    assert compiler.compiled().version == 2
+
+
+def test_long_answers_keep_their_start_and_end():
+    short = 'I led the project.'
+    assert truncate(short, 50) is short
+
+    trimmed = truncate(LONG_ANSWER, 100)
+    assert count_tokens(trimmed) <= 100 + count_tokens(TRUNCATION_MARK)
+    assert trimmed.startswith('I started the robotics club')
+    assert trimmed.endswith('We won the regional final.')
+
+
+def test_feedback_prompt_is_bounded_and_measured():
+    provider = FakeProvider('Good answer.')
+    ai = AIHandler(content=ContentStore(), router=LLMRouter({'openai': provider}), answer_budget=100)
+    sent = []
+    provider.reply = lambda messages: sent.append(messages) or 'Good answer.'
+
+    ai.generate_interview_feedback('Tell me about a project.', LONG_ANSWER, 'What did you learn?', 'Teamwork.',
+                                   'college', 'ENGINEERING')
+    assert count_tokens(sent[0][0]['content']) < count_tokens(LONG_ANSWER) // 5
+
+    stats = ai.prompt_compiler.stats()
+    assert stats['truncated_inputs'] == 1
+    assert stats['prompt_tokens']['interview_feedback']['requests'] == 1
@@ -0,0 +1,90 @@
+import threading
+import time
+from app.model.ai import AIHandler
+from app.model.providers import FakeProvider, LLMRouter
+from app.utils.content import ContentStore
+from app.utils.limiter import AdaptiveLimiter
+
+MESSAGES = [{'role': 'system', 'content': 'Ask a follow-up question.'}]
+
+
+def make_router(**kwargs):
+    providers = {'hosted': FakeProvider('hosted answer'), 'local': FakeProvider('local answer')}
+    return LLMRouter(providers, routes={'follow_up_question': ['local', 'hosted']}, default=['hosted'], **kwargs)
+
+
+def test_tasks_are_routed_to_their_providers():
+    router = make_router()
+    ai = AIHandler(content=ContentStore(), router=router)
+
+    assert ai.generate_follow_up_question('I built a robot.', 'college', 'ENGINEERING') == 'local answer'
+    assert ai.handle_irrelevant_question() == 'hosted answer'
+    assert (router.providers['local'].calls, router.providers['hosted'].calls) == (1, 1)
+
+    # The fake provider is deterministic
+    fake = FakeProvider()
+    assert fake.complete(MESSAGES, None, 100, 0.7) == fake.complete(MESSAGES, None, 100, 0.7)
+
+
+def test_failing_provider_falls_back_and_trips_its_circuit():
+    router = make_router(failure_threshold=2, reset_timeout=0.1)
+    local = router.providers['local']
+    local.failing = True
+
+    for _ in range(4):
+        assert router.complete('follow_up_question', MESSAGES, 'gpt-4o-mini', 100, 0.7) == 'hosted answer'
+    # Two failures open the circuit, after that the local model isn't called
+    assert local.calls == 2
+    assert router.stats()['rejected'] == 2
+    assert router.stats()['providers']['local']['circuit'] == 'open'
+
+    # One trial call after the timeout closes it again
+    local.failing = False
+    time.sleep(0.15)
+    assert router.complete('follow_up_question', MESSAGES, 'gpt-4o-mini', 100, 0.7) == 'local answer'
+    assert router.stats()['providers']['local']['circuit'] == 'closed'
+
+
+def test_slow_request_is_hedged_past_p95():
+    router = make_router(min_samples=5)
+    local = router.providers['local']
+    local.latency = 0.01
+    for _ in range(5):
+        router.complete('follow_up_question', MESSAGES, 'gpt-4o-mini', 100, 0.7)
+
+    local.latency = 1.0
+    start = time.monotonic()
+    assert router.complete('follow_up_question', MESSAGES, 'gpt-4o-mini', 100, 0.7) == 'hosted answer'
+    assert time.monotonic() - start < 0.5
+    assert (router.stats()['hedges'], router.stats()['hedge_wins']) == (1, 1)
+
+
+def test_single_provider_calls_run_inline_past_min_samples():
+    router = LLMRouter({'hosted': FakeProvider('hosted answer', latency=0.2)}, min_samples=5)
+    for _ in range(5):
+        router.complete('advice', MESSAGES, 'gpt-4o-mini', 100, 0.7)
+
+    # Nothing to hedge with, so the pool's size doesn't bound the calls
+    threads = [threading.Thread(target=router.complete, args=('advice', MESSAGES, 'gpt-4o-mini', 100, 0.7))
+               for _ in range(40)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start < 0.35
+    assert router.stats()['hedges'] == 0
+
+
+def test_hedge_takes_a_limiter_slot():
+    limiter = AdaptiveLimiter()
+    router = make_router(min_samples=5, limiter=limiter)
+    local = router.providers['local']
+    local.latency = 0.01
+    for _ in range(5):
+        router.complete('follow_up_question', MESSAGES, 'gpt-4o-mini', 100, 0.7)
+
+    local.latency = 0.5
+    assert router.complete('follow_up_question', MESSAGES, 'gpt-4o-mini', 100, 0.7) == 'hosted answer'
+    # Only the backup went through the limiter, the caller holds the primary's slot
+    assert limiter.stats()['requests'] == 1
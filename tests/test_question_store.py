@@ -0,0 +1,118 @@
+import threading
+import time
+from app.model import conversation
+from app.model.ai import AIHandler
+from app.model.conversation import Conversation
+from app.model.resources import Resources
+from app.utils.content import ContentStore
+from app.utils.question_store import AdaptedQuestionStore
+from app.utils.session_store import MemorySessionStore
+from app.utils.stages import Stage
+from app.utils.user import User
+
+QUESTIONS = ['Why do you want this job?', 'Tell me about a challenge you overcame.', 'Where do you see yourself in five years?']
+
+
+def adapter(calls):
+    def adapt(question):
+        calls.append(question)
+        return f'[engineer] {question}'
+    return adapt
+
+
+def test_prefetched_questions_are_lookups_and_persist(tmp_path):
+    path = str(tmp_path / 'adapted.json')
+    store = AdaptedQuestionStore(path)
+    calls = []
+    store.prefetch('job', 'SOFTWARE ENGINEER', QUESTIONS, adapter(calls))
+    store.wait_for_prefetch()
+    store.save()
+
+    # Same role however it was typed, nothing left to generate
+    assert store.ready('Job', ' software-engineer ', QUESTIONS) == QUESTIONS
+    assert store.get_or_adapt('job', 'Software Engineer', QUESTIONS[0], adapter(calls), timeout=0) == f'[engineer] {QUESTIONS[0]}'
+    assert len(calls) == 3
+    assert store.stats()['hits'] == 1
+
+    restarted = AdaptedQuestionStore(path)
+    assert restarted.ready('job', 'software engineer', QUESTIONS) == QUESTIONS
+
+
+def test_slow_adaptation_falls_back_and_is_kept(tmp_path):
+    store = AdaptedQuestionStore(str(tmp_path / 'adapted.json'), max_entries=2)
+    release = threading.Event()
+    def slow(question):
+        release.wait(2)
+        return f'[nurse] {question}'
+
+    assert store.get_or_adapt('job', 'nurse', QUESTIONS[0], slow, timeout=0.01) is None
+    release.set()
+    store.wait_for_prefetch()
+    assert store.ready('job', 'nurse', QUESTIONS) == QUESTIONS[:1]
+
+    # The least recently used entry makes room
+    store.prefetch('job', 'nurse', QUESTIONS, lambda question: question)
+    store.wait_for_prefetch()
+    assert store.stats()['entries'] == 2
+    assert store.stats()['evictions'] == 1
+
+
+def test_asked_question_is_the_adapted_one(tmp_path):
+    ai = AIHandler(client=object(), content=object(), question_store=AdaptedQuestionStore(str(tmp_path / 'adapted.json')))
+    ai.generate_response = lambda messages, **kwargs: 'Why do you want to build bridges?'
+
+    ai.prefetch_adapted_questions('job', 'CIVIL ENGINEER', QUESTIONS)
+    ai.question_store.wait_for_prefetch()
+    assert ai.ready_adapted_questions('job', 'civil engineer', QUESTIONS) == QUESTIONS
+    assert ai.get_adapted_question(QUESTIONS[0], 'job', 'CIVIL ENGINEER') == 'Why do you want to build bridges?'
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    def say(self, to_number, message):
+        self.sent.append(message)
+
+
+def test_question_is_not_asked_twice_in_a_row():
+    ai = AIHandler(client=object(), content=ContentStore())
+    ai.generate_response = lambda messages, **kwargs: 'Adapted?'
+    conv = Conversation(User('+15550001', store=MemorySessionStore()), Resources(bot=RecordingBot(), ai=ai))
+    conv.interview_questions = QUESTIONS[:2]
+
+    last = QUESTIONS[0]
+    for _ in range(20):
+        question, adapted = conv.prepare_interview_question('job', 'ENGINEER', last)
+        assert question != last and adapted == 'Adapted?'
+        last = question
+
+
+def test_first_question_is_adapted_ahead_of_the_prefetch(tmp_path, monkeypatch):
+    questions = [f'Question {i}?' for i in range(10)]
+    ai = AIHandler(client=object(), content=ContentStore(), question_wait=2.0,
+                   question_store=AdaptedQuestionStore(str(tmp_path / 'adapted.json'), workers=2))
+    def slow_adapt(question, interview_type, role):
+        time.sleep(0.3)
+        return f'[engineer] {question}'
+    ai.adapt_interview_question = slow_adapt
+    # The last question of the list, which used to wait behind all the others
+    monkeypatch.setattr(conversation.random, 'choice', lambda candidates: candidates[-1])
+
+    bot = RecordingBot()
+    store = MemorySessionStore()
+    user = User('+15550001', store=store)
+    user.set_interview_type('job')
+    user.set_conversation_stage(Stage.AWAITING_INTERVIEW_ROLE)
+    conv = Conversation(User('+15550001', store=store), Resources(bot=bot, ai=ai))
+    conv.interview_questions = questions
+
+    start = time.monotonic()
+    conv.handle_conversation('engineer')
+    assert time.monotonic() - start < 1.0
+    assert bot.sent[-1] == '[engineer] Question 9?'
+
+    user = User('+15550001', store=store)
+    assert user.get_last_interview_question() == 'Question 9?'
+    assert user.get_last_adapted_question() == '[engineer] Question 9?'
+    ai.question_store.wait_for_prefetch()
@@ -0,0 +1,39 @@
+from app.model.ai import AIHandler
+from app.utils.semantic_cache import SemanticCache
+
+
+def test_paraphrases_hit_and_negations_miss():
+    cache = SemanticCache(threshold=0.85)
+    cache.store('general_tips', 'How long should my answer be?', 'About two minutes.', cost=2.0)
+    cache.store('general_tips', 'What should I wear to the interview?', 'Smart casual.')
+
+    assert cache.lookup('general_tips', 'how long should my answers be') == 'About two minutes.'
+    assert cache.lookup('general_tips', 'What should I not wear to the interview?') is None
+    assert cache.lookup('general_tips', 'Where is the nearest bus stop?') is None
+    # Each advice category has its own answers
+    assert cache.lookup('college_tips', 'How long should my answer be?') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['seconds_saved']) == (1, 3, 2.0)
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = SemanticCache(max_entries=2)
+    cache.store('general_tips', 'How long should my answer be?', 'length')
+    cache.store('general_tips', 'What should I wear to the interview?', 'clothes')
+    cache.lookup('general_tips', 'How long should my answer be?')
+    cache.store('general_tips', 'How early should I arrive?', 'early')
+
+    assert cache.lookup('general_tips', 'What should I wear to the interview?') is None
+    assert cache.lookup('general_tips', 'How long should my answer be?') == 'length'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_followups_only_call_the_model_once():
+    calls = []
+    ai = AIHandler(client=object(), content=object(), followup_cache=SemanticCache())
+    ai.generate_response = lambda messages, **kwargs: calls.append(messages) or 'About two minutes.'
+
+    assert ai.generate_advice_followup('advice', 'How long should my answer be?', 'general_tips') == 'About two minutes.'
+    assert ai.generate_advice_followup('advice', 'how long should my answers be', 'general_tips') == 'About two minutes.'
+    assert len(calls) == 1
@@ -0,0 +1,71 @@
+import time
+import pytest
+from app.utils.session_store import MemorySessionStore, SessionStore, SQLiteSessionStore, ShardedSQLiteSessionStore
+from app.utils.stages import Stage
+from app.utils.user import User
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'sharded'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = MemorySessionStore(stripes=4)
+    elif request.param == 'sqlite':
+        store = SQLiteSessionStore(str(tmp_path / 'users.db'))
+    else:
+        store = ShardedSQLiteSessionStore(str(tmp_path / 'users'), shards=4)
+    store.migrate()
+    return store
+
+
+def test_user_state_round_trip(store):
+    user = User('+15550001', store=store)
+    assert user.get_conversation_stage() == Stage.INITIAL
+    assert not store.create('+15550001')
+
+    with user.unit_of_work():
+        user.set_interview_role('ENGINEER')
+        user.set_conversation_stage(Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE)
+
+    record = User('+15550001', store=store).user_info
+    assert record['interview_role'] == 'ENGINEER'
+    assert record['conversation_stage'] == Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE
+    assert record['version'] == 1
+
+
+def test_stale_write_keeps_other_changes(store):
+    user = User('+15550001', store=store)
+    other = User('+15550001', store=store)
+    other.update_user_name('Sam')
+
+    user.set_conversation_stage(Stage.ONBOARDED)
+    assert user.get_user_name() == 'Sam'
+    assert store.fetch('+15550001')['version'] == 2
+
+
+def test_reset_idle(store):
+    for phone_number, stage in [('+15550001', Stage.AWAITING_PURPOSE), ('+15550002', Stage.AWAITING_NAME),
+                                ('+15550003', Stage.ONBOARDED)]:
+        User(phone_number, store=store).set_conversation_stage(stage)
+    User('+15550002', store=store).update_last_interaction()
+
+    assert sorted(store.reset_idle(int(time.time()) + 1)) == ['+15550001', '+15550002']
+    assert store.reset_idle(int(time.time()) + 1) == []
+    assert User('+15550001', store=store).get_conversation_stage() == Stage.ONBOARDED
+
+
+def test_shards_spread_users(tmp_path):
+    store = ShardedSQLiteSessionStore(str(tmp_path / 'users'), shards=4)
+    store.migrate()
+    for i in range(40):
+        User(f'+1555{i:07d}', store=store)
+    counts = [shard._connect().execute("SELECT count(*) FROM users").fetchone()[0] for shard in store.shards]
+    assert sum(counts) == 40 and min(counts) > 0
+
+
+def test_incomplete_engine_fails_on_creation():
+    class LoadOnly(SessionStore):
+        def load(self, phone_number, validate=False):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnly()
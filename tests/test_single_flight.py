@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+from app.model.ai import AIHandler
+from app.utils.single_flight import SingleFlight
+
+
+class SlowCompletions:
+    def __init__(self, error=None):
+        self.requests = []
+        self.error = error
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.requests.append(kwargs)
+        time.sleep(0.1)
+        if self.error:
+            raise self.error
+        message = SimpleNamespace(content=f" answer {len(self.requests)} ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def make_ai(completions):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return AIHandler(client=client, content=object(), single_flight=SingleFlight())
+
+
+def run_concurrently(fn, times):
+    with ThreadPoolExecutor(times) as pool:
+        return [future.result() for future in [pool.submit(fn) for _ in range(times)]]
+
+
+def test_identical_concurrent_requests_share_one_call():
+    completions = SlowCompletions()
+    ai = make_ai(completions)
+    messages = [{'role': 'system', 'content': 'Give one interview tip.'}]
+
+    answers = run_concurrently(lambda: ai.generate_response(messages, max_tokens=100), 8)
+    assert answers == ['answer 1'] * 8
+    assert len(completions.requests) == 1
+    assert ai.single_flight.stats() == {'in_flight': 0, 'executed': 1, 'requests_saved': 7}
+
+    # Different parameters or share=False are separate requests
+    run_concurrently(lambda: ai.generate_response(messages, max_tokens=200), 2)
+    run_concurrently(lambda: ai.generate_response(messages, max_tokens=100, share=False), 2)
+    assert len(completions.requests) == 4
+
+
+def test_waiting_callers_get_the_error():
+    ai = make_ai(SlowCompletions(error=RuntimeError('rate limited')))
+    messages = [{'role': 'system', 'content': 'Give one interview tip.'}]
+
+    def call():
+        with pytest.raises(RuntimeError):
+            ai.generate_response(messages)
+    run_concurrently(call, 4)
+    assert ai.single_flight.stats()['in_flight'] == 0
@@ -0,0 +1,75 @@
+import threading
+from app.model.ai import AIHandler
+from app.model.conversation import Conversation
+from app.model.resources import Resources
+from app.utils.content import ContentStore
+from app.utils.session_store import MemorySessionStore
+from app.utils.speculation import Speculation
+from app.utils.stages import Stage
+from app.utils.user import User
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    def say(self, to_number, message):
+        self.sent.append(message)
+
+    def say_now(self, to_number, message):
+        self.sent.append(message)
+
+
+def test_results_are_taken_once_and_cancelled_work_is_dropped():
+    speculation = Speculation(workers=1)
+    speculation.start('+15550001', 'next_question', lambda: 'Why engineering?')
+    assert speculation.take('+15550001', 'next_question', timeout=1) == 'Why engineering?'
+    assert speculation.take('+15550001', 'next_question') is None
+
+    started, release = threading.Event(), threading.Event()
+    def slow():
+        started.set()
+        return release.wait(2)
+    running = speculation.start('+15550001', 'slow', slow)
+    started.wait(1)
+    queued = speculation.start('+15550002', 'next_question', lambda: 'never')
+    speculation.cancel('+15550002')
+    speculation.cancel('+15550001')
+    release.set()
+
+    assert queued.cancelled()
+    assert speculation.take('+15550001', 'slow', timeout=1) is None
+    assert running.result(timeout=1)
+    assert speculation.stats() == {'pending': 0, 'started': 3, 'used': 1, 'discarded': 2}
+
+
+def test_next_question_is_prepared_during_the_feedback(tmp_path):
+    calls = []
+    def generate_response(messages, **kwargs):
+        calls.append(threading.current_thread().name)
+        if kwargs.get('on_section'):
+            kwargs['on_section']('Good answer.')
+        return 'Adapted question?'
+
+    ai = AIHandler(client=object(), content=ContentStore(), streaming=False, speculation=Speculation())
+    ai.generate_response = generate_response
+    bot = RecordingBot()
+    resources = Resources(bot=bot, ai=ai)
+
+    store = MemorySessionStore()
+    user = User('+15550001', store=store)
+    user.create_user()
+    user.set_interview_type('job')
+    user.set_interview_role('ENGINEER')
+    user.set_conversation_stage(Stage.AWAITING_FOLLOW_UP_RESPONSE)
+
+    Conversation(User('+15550001', store=store), resources).handle_conversation('I led the project.')
+    assert bot.sent[0] == 'Good answer.'
+    assert any(name.startswith('speculation') for name in calls)
+
+    calls.clear()
+    Conversation(User('+15550001', store=store), resources).handle_conversation('yes')
+    # The adapted question was ready, nothing was generated for this turn
+    assert bot.sent[-1] == 'Adapted question?'
+    assert calls == []
+    assert ai.speculation.stats()['used'] == 1
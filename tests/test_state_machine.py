@@ -0,0 +1,102 @@
+import pytest
+from app.model.ai import AIHandler
+from app.model.conversation import INTENT_WORDS, STATE_MACHINE, TRANSITIONS, Conversation
+from app.model.resources import Resources
+from app.utils.content import ContentStore
+from app.utils.session_store import MemorySessionStore
+from app.utils.stages import Stage, stage_code, stage_name
+from app.utils.state_machine import Intent, StateMachine, Transition, validate
+from app.utils.user import User
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    def say(self, to_number, message):
+        self.sent.append(message)
+
+    def say_now(self, to_number, message):
+        self.sent.append(message)
+
+
+def test_stage_codes_are_stable():
+    assert Stage.of('awaiting_purpose') is Stage.AWAITING_PURPOSE
+    assert Stage.of(4) is Stage.AWAITING_PURPOSE
+    assert Stage.of('4') is Stage.AWAITING_PURPOSE
+    assert Stage.of('no_such_stage') is Stage.UNKNOWN
+    assert Stage.of(None) is Stage.UNKNOWN
+    assert stage_code('awaiting_more_advice') == 13
+    assert stage_name(13) == 'awaiting_more_advice'
+
+
+def test_conversation_table_is_valid():
+    assert validate(TRANSITIONS, INTENT_WORDS) == []
+
+
+def test_validator_finds_unreachable_and_dead_end_stages():
+    words = {Intent.YES: ('yes',), Intent.EXIT: ('exit',)}
+    transitions = [Transition(stage, Intent.OTHER, None, None) for stage in Stage] + [
+        Transition(Stage.INITIAL, Intent.YES, None, Stage.AWAITING_NAME),
+        Transition(Stage.ONBOARDED, Intent.YES, None, Stage.INITIAL),
+        Transition(Stage.UNKNOWN, Intent.YES, None, Stage.ONBOARDED),
+        Transition(None, Intent.EXIT, None, Stage.ONBOARDED),
+    ]
+    problems = validate(transitions, words)
+    assert 'awaiting_purpose: unreachable' in problems
+    # Only 'exit' leaves it
+    assert 'awaiting_name: dead end, only commands leave it' in problems
+    assert 'initial: dead end, only commands leave it' not in problems
+
+    with pytest.raises(ValueError):
+        StateMachine(transitions, words)
+
+
+def test_validator_finds_missing_fallbacks_and_clashing_words():
+    transitions = [t for t in TRANSITIONS if t[:2] != (Stage.AWAITING_MORE_ADVICE, Intent.OTHER)]
+    assert validate(transitions, INTENT_WORDS) == ['awaiting_more_advice: no transition for other replies']
+
+    words = {**INTENT_WORDS, Intent.NO: ('no', 'y')}
+    assert "awaiting_more_interview: 'y' means both YES and NO" in validate(TRANSITIONS, words)
+
+
+def test_dispatch():
+    transition = STATE_MACHINE.dispatch(Stage.AWAITING_PURPOSE, ' General Advice ')
+    assert transition.intent == Intent.ADVICE and transition.next_stage == Stage.AWAITING_ADVICE_CATEGORY
+    assert STATE_MACHINE.dispatch(Stage.AWAITING_PURPOSE, 'what?').next_stage is None
+    assert STATE_MACHINE.dispatch(Stage.AWAITING_NAME, 'Help').intent == Intent.HELP
+    # A stage that isn't in the table is handled like UNKNOWN
+    assert STATE_MACHINE.dispatch(99, 'hi') == STATE_MACHINE.dispatch(Stage.UNKNOWN, 'hi')
+
+    restart = {stage: STATE_MACHINE.dispatch(stage, 'restart').next_stage for stage in Stage}
+    assert restart[Stage.AWAITING_NAME] == Stage.INITIAL
+    assert restart[Stage.AWAITING_INTERVIEW_ROLE] == Stage.AWAITING_INTERVIEW_TYPE
+    assert restart[Stage.AWAITING_ADVICE_FOLLOWUP] == Stage.AWAITING_ADVICE_CATEGORY
+    assert restart[Stage.AWAITING_MORE_INTERVIEW] == Stage.ONBOARDED
+
+
+def test_conversation_follows_the_table():
+    ai = AIHandler(client=object(), content=ContentStore(), streaming=False)
+    ai.generate_response = lambda messages, **kwargs: 'Some advice.'
+    bot = RecordingBot()
+    resources = Resources(bot=bot, ai=ai)
+    store = MemorySessionStore()
+
+    def reply(text):
+        user = User('+15550001', store=store)
+        Conversation(user, resources).handle_conversation(text)
+        return User('+15550001', store=store).get_conversation_stage()
+
+    assert reply('Hello') == Stage.AWAITING_NAME
+    assert reply('Sam') == Stage.AWAITING_PURPOSE
+    assert User('+15550001', store=store).get_user_name() == 'Sam'
+    assert reply('maybe') == Stage.AWAITING_PURPOSE
+    assert reply('2') == Stage.AWAITING_ADVICE_CATEGORY
+    assert reply('help') == Stage.AWAITING_ADVICE_CATEGORY
+    assert reply('1') == Stage.AWAITING_ADVICE_FOLLOWUP
+    assert 'Some advice.' in bot.sent
+    assert reply('no') == Stage.AWAITING_MORE_ADVICE
+    assert reply('restart') == Stage.ONBOARDED
+    assert bot.sent[-1] == "Returning to the main menu..."
+    # Stored as the code
+    assert store.load('+15550001')['conversation_stage'] == 3
@@ -0,0 +1,69 @@
+import time
+from types import SimpleNamespace
+from openai import OpenAI
+from app.model.ai import AIHandler
+from app.model.bot import Bot, Outbox
+from app.testing.fake_openai import FakeOpenAIServer
+from app.utils.chunker import SectionChunker
+
+FEEDBACK = (
+    "*Strengths* 💪\n\n"
+    "• You gave a clear example of teamwork in your robotics club.\n"
+    "• Your answer had a good structure.\n\n"
+    "*To improve* 🎯\n\n"
+    "• Say what you personally did.\n"
+    "• Mention the result with a number.\n\n"
+    "*Tip* 💡\nPractice the STAR method."
+)
+
+
+def test_chunker_keeps_headings_with_their_bullets():
+    chunker = SectionChunker()
+    sections = []
+    for i in range(0, len(FEEDBACK), 3):
+        sections += chunker.feed(FEEDBACK[i:i + 3])
+    sections += chunker.flush()
+
+    assert [section.split('\n')[0] for section in sections] == ['*Strengths* 💪', '*To improve* 🎯', '*Tip* 💡']
+    assert '\n\n'.join(sections) == FEEDBACK
+
+
+def test_sections_arrive_while_the_answer_is_generated():
+    server = FakeOpenAIServer(FEEDBACK, token_delay=0.01).start()
+    try:
+        ai = AIHandler(client=OpenAI(api_key='fake', base_url=f'{server.url}/v1'), content=object(), streaming=True)
+        start = time.perf_counter()
+        arrivals = []
+        feedback = ai.generate_response([{'role': 'system', 'content': 'feedback'}], max_tokens=500,
+                                        on_section=lambda section: arrivals.append(time.perf_counter() - start))
+        total = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    assert feedback == FEEDBACK
+    assert len(arrivals) == 3
+    # The first section is out long before the answer is complete
+    assert arrivals[0] < 0.75 * total
+    assert server.requests[0]['stream'] is True
+
+
+def test_say_now_sends_before_the_turn_is_over():
+    sent = []
+    messages = SimpleNamespace(create=lambda from_, to, body: sent.append(body) or SimpleNamespace(sid='SM1'))
+    bot = Bot(twilio_client=SimpleNamespace(messages=messages))
+    bot.from_number = '+15550000'
+
+    with bot.collect(Outbox('+15550001')):
+        bot.say('+15550001', 'Thanks for your answer.')
+        bot.say_now('+15550001', '*Strengths* 💪')
+        assert sent == ['Thanks for your answer.\n\n*Strengths* 💪']
+        bot.say('+15550001', 'Would you like to practice another question?')
+    assert len(sent) == 2
+    assert bot.first_message_latency.stats()['count'] == 1
+
+    # Replies returned as TwiML can't go out early
+    outbox = Outbox('+15550001', reply_in_response=True)
+    with bot.collect(outbox):
+        bot.say_now('+15550001', 'Feedback')
+    assert len(sent) == 2
+    assert outbox.release() == ['Feedback']
@@ -0,0 +1,68 @@
+import re
+import time
+import zlib
+from app.utils.commands import COMMAND_REPLIES, RESTART_MESSAGES
+from app.utils.content import load_messages
+from app.utils.idle_chat_checker import FAREWELL_MESSAGE
+from app.utils.transcripts import (TranscriptStore, INBOUND, OUTBOUND, CODEC_DEFLATE, ZDICT, ZDICT_V1,
+                                   encode_text, decode_text)
+
+
+def test_encoding_round_trip():
+    short = 'Hi'
+    long = 'Tell me about a time when you faced a challenge in school and how you overcame it. ' * 3
+    assert decode_text(encode_text(short)) == short
+    assert decode_text(encode_text(long)) == long
+    assert len(encode_text(long)) < len(long.encode()) / 3
+    assert decode_text(encode_text('Café ☕ ' * 20)) == 'Café ☕ ' * 20
+
+
+def test_dictionary_holds_the_bots_messages():
+    for reply in [*COMMAND_REPLIES.values(), *RESTART_MESSAGES.values(), FAREWELL_MESSAGE]:
+        assert reply.encode() in ZDICT
+    onboarding = load_messages()['onboarding']
+    for message in onboarding.values():
+        for piece in re.split(r'\{\w+\}', message):
+            assert piece.encode() in ZDICT
+    # A bot message is stored in a few bytes
+    assert len(encode_text(COMMAND_REPLIES['help'])) < 20
+
+
+def test_rows_of_the_first_dictionary_still_decode():
+    text = 'Restarting interview preparation... Would you like to practice another interview question?'
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=ZDICT_V1)
+    body = bytes([CODEC_DEFLATE]) + compressor.compress(text.encode()) + compressor.flush()
+    assert decode_text(body) == text
+
+
+def test_keyset_pages(tmp_path):
+    store = TranscriptStore(str(tmp_path / 'transcripts.db'))
+    for i in range(5):
+        store.append('+15550001', [('awaiting_purpose', INBOUND, f'message {i}'),
+                                   ('awaiting_interview_type', OUTBOUND, f'reply {i}')])
+    store.append('+15550002', [('initial', INBOUND, 'hello')])
+
+    first = store.read('+15550001', limit=4)
+    second = store.read('+15550001', after_id=first[-1].id, limit=4)
+    third = store.read('+15550001', after_id=second[-1].id, limit=4)
+    texts = [turn.text for turn in first + second + third]
+    assert texts == [text for i in range(5) for text in (f'message {i}', f'reply {i}')]
+    assert first[0].stage == 'awaiting_purpose' and first[0].direction == INBOUND
+    assert [turn.text for turn in store.recent('+15550001', 2)] == ['message 4', 'reply 4']
+    assert len(store.read_all()) == 11
+
+
+def test_retention_keeps_ids_increasing(tmp_path):
+    store = TranscriptStore(str(tmp_path / 'transcripts.db'))
+    store.append('+15550001', [('onboarded', INBOUND, 'x' * 500) for _ in range(200)])
+    last_id = store.read_all(limit=1000)[-1].id
+    conn = store._connect()
+    with conn:
+        conn.execute("UPDATE turns SET created_at = ?", (int(time.time()) - 10 * 86400,))
+
+    assert store.purge(max_age_days=7, batch_size=64) == 200
+    assert store.read_all() == []
+    assert store.compact() > 0
+
+    store.append('+15550001', [('onboarded', INBOUND, 'new')])
+    assert store.read_all()[0].id > last_id
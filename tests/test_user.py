@@ -0,0 +1,90 @@
+import pytest
+from app.utils.db import get_connection
+from app.utils.migrations import migrate
+from app.utils.stages import Stage
+from app.utils.user import User
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / 'users.db')
+    migrate(db_path)
+    return db_path
+
+
+def test_unit_of_work_writes_once(db_path):
+    user = User('+15550001', db_path)
+    statements = []
+    get_connection(db_path).set_trace_callback(statements.append)
+    try:
+        with user.unit_of_work():
+            user.set_interview_role('ANALYST')
+            user.set_last_interview_question('Why this job?')
+            # Getters that refresh from the database still see the pending writes
+            assert user.get_interview_role() == 'ANALYST'
+            user.set_conversation_stage(Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE)
+    finally:
+        get_connection(db_path).set_trace_callback(None)
+
+    updates = [s for s in statements if s.startswith('UPDATE')]
+    assert len(updates) == 1
+    assert User('+15550001', db_path).get_conversation_stage() == Stage.AWAITING_INTERVIEW_QUESTION_RESPONSE
+
+
+def test_unit_of_work_rolls_back_on_error(db_path):
+    user = User('+15550001', db_path)
+    with pytest.raises(RuntimeError):
+        with user.unit_of_work():
+            user.set_conversation_stage(Stage.AWAITING_NAME)
+            raise RuntimeError('OpenAI is down')
+
+    assert user.get_conversation_stage() == Stage.INITIAL
+    assert User('+15550001', db_path).get_conversation_stage() == Stage.INITIAL
+
+
+def test_setters_write_through_outside_unit_of_work(db_path):
+    User('+15550001', db_path).set_last_follow_up_question('What did you learn?')
+    assert User('+15550001', db_path).get_last_follow_up_question() == 'What did you learn?'
+
+
+def test_turn_reads_the_row_at_most_once(db_path):
+    User('+15550001', db_path)
+    statements = []
+    get_connection(db_path).set_trace_callback(statements.append)
+    try:
+        user = User('+15550001', db_path)
+        with user.unit_of_work():
+            user.get_conversation_stage()
+            user.get_interview_type()
+            user.get_last_interview_question()
+            user.get_last_follow_up_response()
+    finally:
+        get_connection(db_path).set_trace_callback(None)
+
+    # Only the check that the cached row is still current
+    assert [s for s in statements if s.startswith('SELECT')] == [
+        "SELECT version FROM users WHERE phone_number = '+15550001'"
+    ]
+
+
+def test_turn_sees_changes_made_by_another_process(db_path):
+    User('+15550001', db_path).set_conversation_stage(Stage.AWAITING_PURPOSE)
+    with get_connection(db_path) as conn:
+        conn.execute("UPDATE users SET conversation_stage = ?, version = version + 1 "
+                     "WHERE phone_number = '+15550001'", (int(Stage.AWAITING_INTERVIEW_TYPE),))
+
+    user = User('+15550001', db_path)
+    with user.unit_of_work():
+        assert user.get_conversation_stage() == Stage.AWAITING_INTERVIEW_TYPE
+
+
+def test_write_after_another_process_changed_the_row(db_path):
+    user = User('+15550001', db_path)
+    # Another process renames the user, our cached row is now one version behind
+    with get_connection(db_path) as conn:
+        conn.execute("UPDATE users SET name = 'Sam', version = version + 1 WHERE phone_number = '+15550001'")
+
+    user.set_conversation_stage(Stage.ONBOARDED)
+    assert user.get_user_name() == 'Sam'
+    assert user.get_conversation_stage() == Stage.ONBOARDED
+    assert User('+15550001', db_path).user_info['version'] == 2
@@ -0,0 +1,24 @@
+import app
+from app.model.bot import Bot
+from app.model.resources import Resources
+
+
+class FakeAI:
+    advice_cache = None
+
+
+def test_twiml_reply_returns_replies_made_before_an_error(monkeypatch):
+    bot = Bot(twilio_client=object())
+    monkeypatch.setattr('app.model.resources._resources', Resources(bot=bot, ai=FakeAI()))
+
+    def failing_turn(user_number, body, outbox):
+        with bot.collect(outbox):
+            bot.say(user_number, 'Nice to meet you, Sam!')
+            raise RuntimeError('OpenAI is down')
+
+    monkeypatch.setattr(app, 'handle_message', failing_turn)
+    body, status, headers = app.twiml_reply('+15550001', 'Sam')
+
+    assert status == 200
+    assert 'Nice to meet you, Sam!' in body
+    assert 'OpenAI' not in body